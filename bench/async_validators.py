@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+    async_validators
+    ~~~~~~~~~~~~~~~~
+
+    Compares `FormBase.validate` with `FormBase.validate_async` for a form
+    with validators that wait for a simulated remote service, and the same
+    validators marked as `io_bound`.
+
+    Run it from the project root::
+
+        $ python bench/async_validators.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+from threading import Thread
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import forms, utils
+
+
+FIELDS = 20
+DELAY = 0.05
+LIMITS = [1, 5, 10, 20]
+
+
+class ThreadResult(object):
+    """Runs a function in a thread, `result` waits for it."""
+
+    def __init__(self, func, *args):
+        self._thread = Thread(target=func, args=args)
+        self._thread.start()
+
+    def result(self, timeout=None):
+        self._thread.join(timeout)
+
+
+def slow_check(delay):
+    """A validator that waits `delay` seconds in a thread."""
+    def validator(form, value):
+        return forms.PendingResult(ThreadResult(time.sleep, delay))
+    return validator
+
+
+class ServiceForm(forms.FormBase):
+    names = forms.Multiple(forms.TextField(
+        validators=[slow_check(DELAY)]))
+
+
+def remote_check(form, value):
+    time.sleep(DELAY)
+
+
+def make_io_bound_form(pool_size):
+    class IOBoundForm(forms.FormBase):
+        names = forms.Multiple(forms.TextField(
+            validators=[forms.io_bound(remote_check)]))
+    IOBoundForm.validator_pool = utils.ThreadPool(pool_size)
+    return IOBoundForm
+
+
+def make_data():
+    return dict(('names.%d' % idx, u'name %d' % idx)
+                for idx in xrange(FIELDS))
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    assert func(*args, **kwargs)
+    return time.time() - start
+
+
+def main():
+    data = make_data()
+    print '%d fields, %d ms per validator' % (FIELDS, DELAY * 1000)
+    print '%-24s %8.1f ms' % ('validate', timed(ServiceForm().validate,
+                                                data) * 1000)
+    for limit in LIMITS:
+        print '%-24s %8.1f ms' % ('validate_async (%d)' % limit,
+                                  timed(ServiceForm().validate_async, data,
+                                        max_pending=limit) * 1000)
+
+    for size in LIMITS:
+        form_cls = make_io_bound_form(size)
+        form_cls().validate(data)
+        print '%-24s %8.1f ms' % ('io_bound (%d threads)' % size,
+                                  timed(form_cls().validate, data) * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    batch_validators
+    ~~~~~~~~~~~~~~~~
+
+    Compares a validator that looks up every row of a `Multiple` field on
+    its own with a `batch_validator` that looks up all rows at once.  The
+    lookups are done against a simulated database with a fixed cost per
+    query.
+
+    Run it from the project root::
+
+        $ python bench/batch_validators.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import forms
+from fungiform.exceptions import ValidationError, MultipleValidationErrors
+
+
+ROWS = 500
+QUERY_COST = 0.0005
+KNOWN_SKUS = set(u'sku-%d' % idx for idx in xrange(ROWS))
+queries = [0]
+
+
+def find_skus(skus):
+    queries[0] += 1
+    time.sleep(QUERY_COST)
+    return KNOWN_SKUS.intersection(skus)
+
+
+def sku_exists(form, value):
+    if not find_skus([value]):
+        raise ValidationError(u'Unknown SKU')
+
+
+@forms.batch_validator
+def skus_exist(form, values):
+    known = find_skus(values)
+    errors = dict((pos, ValidationError(u'Unknown SKU'))
+                  for pos, value in enumerate(values) if value not in known)
+    if errors:
+        raise MultipleValidationErrors(errors)
+
+
+def make_form(validator):
+    class OrderForm(forms.FormBase):
+        rows = forms.Multiple(forms.Mapping(
+            sku=forms.TextField(validators=[validator]),
+            quantity=forms.IntegerField()))
+    return OrderForm
+
+
+def make_data():
+    data = {}
+    for idx in xrange(ROWS):
+        data['rows.%d.sku' % idx] = u'sku-%d' % idx
+        data['rows.%d.quantity' % idx] = u'1'
+    return data
+
+
+def main():
+    data = make_data()
+    print '%d rows, %.1f ms per query' % (ROWS, QUERY_COST * 1000)
+    for name, validator in [('per row', sku_exists),
+                            ('batch', skus_exist)]:
+        form_cls = make_form(validator)
+        queries[0] = 0
+        start = time.time()
+        assert form_cls().validate(data)
+        print '%-10s %8.1f ms %6d queries' % (name, (time.time() - start)
+                                              * 1000, queries[0])
+
+
+if __name__ == '__main__':
+    main()
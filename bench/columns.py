@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+    columns
+    ~~~~~~~
+
+    Compares converting a column of values one by one (like `Multiple` did
+    before) with `Field.convert_column` in pure Python and with NumPy for
+    number and ISO date columns.
+
+    Run it from the project root::
+
+        $ python bench/columns.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import forms, utils
+from fungiform.tests.forms import convert_one_by_one
+
+
+ROWS = 200000
+
+
+def make_columns():
+    start = date(2000, 1, 1)
+    dates = [(start + timedelta(days=idx % 10000)).isoformat()
+             for idx in xrange(ROWS)]
+    return [
+        ('integer', forms.IntegerField(min_value=0, max_value=ROWS),
+         [unicode(idx) for idx in xrange(ROWS)]),
+        ('float', forms.FloatField(min_value=0.0, max_value=ROWS / 8.0),
+         [unicode(idx / 4.0) for idx in xrange(ROWS)]),
+        ('date', forms.DateField(), dates),
+        ('datetime', forms.DateTimeField(),
+         [x + u' 10:30' for x in dates]),
+    ]
+
+
+def timeit(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def main():
+    numpy = utils.numpy
+    print '%-10s %12s %12s %12s' % ('column', 'one by one', 'python',
+                                    'numpy')
+    for name, field, values in make_columns():
+        one_by_one = timeit(convert_one_by_one, field, values)
+        utils.numpy = None
+        python = timeit(field.convert_column, values)
+        utils.numpy = numpy
+        if numpy is not None:
+            vectorized = '%11.3fs' % timeit(field.convert_column, values)
+        else:
+            vectorized = 'n/a'.rjust(12)
+        print '%-10s %11.3fs %11.3fs %s' % (name, one_by_one, python,
+                                            vectorized)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+    dates
+    ~~~~~
+
+    Compares `parse_date` and `parse_datetime` with the old sequential
+    `strptime` trials for inputs in early matching, late matching and
+    invalid formats.  The "cold" column parses distinct strings, the
+    "warm" column parses the same strings again.
+
+    Run it from the project root::
+
+        $ python bench/dates.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import utils
+from fungiform.tests.utils import sequential_parse_date, \
+     sequential_parse_datetime
+
+
+COUNT = 2000
+
+
+def make_inputs(format):
+    start = date(2000, 1, 1)
+    return [(start + timedelta(days=idx)).strftime(format)
+            for idx in xrange(COUNT)]
+
+
+def timeit(func, inputs):
+    start = time.time()
+    for value in inputs:
+        try:
+            func(value)
+        except ValueError:
+            pass
+    return (time.time() - start) / len(inputs) * 1e6
+
+
+def main():
+    cases = [
+        ('date iso', sequential_parse_date, utils.parse_date,
+         make_inputs('%Y-%m-%d')),
+        ('date d. m. Y', sequential_parse_date, utils.parse_date,
+         make_inputs('%d. %m. %Y')),
+        ('date invalid', sequential_parse_date, utils.parse_date,
+         make_inputs('%d %b %Y')),
+        ('datetime system', sequential_parse_datetime, utils.parse_datetime,
+         make_inputs('%Y-%m-%d 10:30')),
+        ('datetime late', sequential_parse_datetime, utils.parse_datetime,
+         make_inputs('%y%m%d 10:30:15 PM')),
+        ('datetime invalid', sequential_parse_datetime, utils.parse_datetime,
+         make_inputs('%d %b %Y 10:30')),
+    ]
+    print '%-18s %14s %10s %10s' % ('input', 'sequential us', 'cold us',
+                                    'warm us')
+    for name, old, new, inputs in cases:
+        print '%-18s %14.1f %10.1f %10.1f' % (name, timeit(old, inputs),
+                                              timeit(new, inputs),
+                                              timeit(new, inputs[-1000:]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+    inputgroup
+    ~~~~~~~~~~
+
+    Measures the memory used by radio button groups with a lot of choices
+    depending on how much of the group a template uses.
+
+    Run it from the project root::
+
+        $ python bench/inputgroup.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fungiform import forms, widgets
+from memtools import measure, format_bytes
+
+
+CHOICE_COUNTS = [100, 1000, 5000]
+
+
+def make_form(size):
+    class ChoiceForm(forms.FormBase):
+        choice = forms.ChoiceField(choices=[(x, u'Choice %d' % x)
+                                            for x in xrange(size)],
+                                   widget=widgets.RadioButtonGroup)
+    form = ChoiceForm()
+    form.validate({'choice': '1'})
+    return form
+
+
+def errors_only(form):
+    widget = form.as_widget()['choice']
+    widget.errors
+    return widget
+
+
+def single_member(form):
+    widget = form.as_widget()['choice']
+    widget[1]()
+    return widget
+
+
+def full_render(form):
+    widget = form.as_widget()['choice']
+    widget.render()
+    return widget
+
+
+def main():
+    print '%-8s %-16s %12s %10s' % ('choices', 'usage', 'memory', 'objects')
+    for size in CHOICE_COUNTS:
+        form = make_form(size)
+        for func in errors_only, single_member, full_render:
+            widget, memory, objects = measure(func, form)
+            print '%-8d %-16s %12s %10d' % (size, func.__name__,
+                                            format_bytes(memory), objects)
+            del widget
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+    loadapp
+    ~~~~~~~
+
+    A small WSGI application for load tests.  It keeps sessions in memory
+    and serves two CSRF protected forms: a login form at ``/login`` and an
+    order form with nested rows at ``/order``.  A GET renders the form, a
+    valid POST redirects back to where the user came from (the referrer
+    or ``_redirect_target``) and an invalid POST renders the form with the
+    errors.
+
+    Serve it with a threaded wsgiref server::
+
+        $ python bench/loadapp.py 8000
+
+    `loadtest` starts it in process if no URL is given.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+from Cookie import SimpleCookie
+from SocketServer import ThreadingMixIn
+from threading import Lock
+from urlparse import parse_qs
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import forms
+from fungiform.csrf import random_token
+
+
+class SessionStore(object):
+    """Keeps the sessions of all clients in a dict."""
+
+    def __init__(self):
+        self.sessions = {}
+        self._lock = Lock()
+
+    def get(self, sid):
+        """Returns a ``(sid, session)`` tuple.  Unknown ids get a new
+        session.
+        """
+        self._lock.acquire()
+        try:
+            session = self.sessions.get(sid)
+            if session is None:
+                sid = random_token().encode('hex')
+                session = self.sessions[sid] = {}
+            return sid, session
+        finally:
+            self._lock.release()
+
+
+class Request(object):
+    """The request info passed to the forms."""
+
+    def __init__(self, environ, sessions):
+        self.environ = environ
+        cookie = SimpleCookie(environ.get('HTTP_COOKIE', ''))
+        sid = 'sid' in cookie and cookie['sid'].value or None
+        self.sid, self.session = sessions.get(sid)
+        self.new_session = self.sid != sid
+
+    @property
+    def form(self):
+        try:
+            length = int(self.environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        data = parse_qs(self.environ['wsgi.input'].read(length))
+        return dict((key, [value.decode('utf-8', 'replace')
+                           for value in values])
+                    for key, values in data.iteritems())
+
+
+class AppForm(forms.FormBase):
+    """Integrates the forms with the `Request`."""
+
+    def __init__(self, request, initial=None):
+        forms.FormBase.__init__(self, initial, request_info=request)
+
+    def _get_wsgi_environ(self):
+        return self.request_info.environ
+
+    def _get_session(self):
+        return self.request_info.session
+
+    def _autodiscover_data(self):
+        return self.request_info.form
+
+    def _redirect_to_url(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        return '303 See Other', [('Location', url)], ''
+
+
+class LoginForm(AppForm):
+    username = forms.TextField(u'Username', required=True, max_length=50)
+    password = forms.TextField(u'Password', required=True,
+                               widget=forms.widgets.PasswordInput)
+    remember = forms.BooleanField(u'Remember me')
+
+    def context_validate(self, data):
+        if data['password'] != u'secret':
+            raise forms.ValidationError(u'Wrong password.')
+
+
+class OrderForm(AppForm):
+    customer = forms.Mapping(
+        name=forms.TextField(u'Name', required=True),
+        email=forms.TextField(u'Email', required=True),
+        city=forms.TextField(u'City'))
+    rows = forms.Multiple(forms.Mapping(
+        sku=forms.TextField(u'SKU', required=True),
+        quantity=forms.IntegerField(u'Quantity', min_value=1)))
+
+
+def render_page(form):
+    return u'<!doctype html>\n<title>%s</title>\n%s' % (
+        form.__class__.__name__, form.as_widget().render())
+
+
+class LoadApp(object):
+    """The application.  GET requests render the form, POST requests
+    validate it.
+    """
+
+    forms = {'/login': LoginForm, '/order': OrderForm}
+
+    def __init__(self):
+        self.sessions = SessionStore()
+
+    def dispatch(self, request):
+        path = request.environ.get('PATH_INFO') or '/'
+        if path == '/':
+            return '200 OK', [], u'<!doctype html>\n<title>Index</title>\n' \
+                u'<a href="/login">Login</a> <a href="/order">Order</a>'
+        form_class = self.forms.get(path)
+        if form_class is None:
+            return '404 Not Found', [], u'Not Found'
+        form = form_class(request)
+        if request.environ['REQUEST_METHOD'] == 'POST':
+            if form.validate():
+                return form.redirect('/')
+            return '400 Bad Request', [], render_page(form)
+        return '200 OK', [], render_page(form)
+
+    def __call__(self, environ, start_response):
+        request = Request(environ, self.sessions)
+        status, headers, body = self.dispatch(request)
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+            headers.append(('Content-Type', 'text/html; charset=utf-8'))
+        headers.append(('Content-Length', str(len(body))))
+        if request.new_session:
+            headers.append(('Set-Cookie', 'sid=%s; Path=/' % request.sid))
+        start_response(status, headers)
+        return [body]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections of more clients
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_load_server(host='127.0.0.1', port=0):
+    """Returns a threaded server for the application.  The default port
+    0 picks a free one.
+    """
+    return make_server(host, port, LoadApp(), ThreadingWSGIServer,
+                       QuietHandler)
+
+
+if __name__ == '__main__':
+    server = make_load_server(port=int(sys.argv[1:] and sys.argv[1] or 8000))
+    print 'Serving on http://%s:%d/' % server.server_address
+    server.serve_forever()
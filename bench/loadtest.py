@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+    loadtest
+    ~~~~~~~~
+
+    Drives GET/POST cycles against the forms of `loadapp` and reports the
+    throughput and the 50th, 95th and 99th percentile of the latency.  A
+    cycle loads the form, takes the CSRF token from the HTML and submits
+    it.  Every worker thread is one client with its own session.
+
+    Run it from the project root.  Without a URL the application is
+    served in process on a free port::
+
+        $ python bench/loadtest.py --concurrency 10 --duration 10
+
+    In process, the server and the clients share one interpreter lock and
+    the numbers are lower than with a separate server::
+
+        $ python bench/loadapp.py 8000 &
+        $ python bench/loadtest.py --url http://127.0.0.1:8000/
+
+    If the application is mounted below a path, the form paths are
+    appended to the path of the URL (``--url http://host/app/`` tests
+    ``/app/login`` and ``/app/order``).
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import re
+import sys
+import math
+import time
+import random
+import httplib
+from optparse import OptionParser
+from threading import Thread, Lock
+from urllib import urlencode
+from urlparse import urlsplit
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+_token_re = re.compile(r'name="_csrf_token" value="([^"]*)"')
+
+# the form data of the valid submissions by path
+SUBMISSIONS = {
+    '/login': {'username': 'john', 'password': 'secret', 'remember': 'on'},
+    '/order': {'customer.name': 'John', 'customer.email': 'john@example.com',
+               'customer.city': 'Vienna', 'rows.0.sku': 'sku-1',
+               'rows.0.quantity': '2', 'rows.1.sku': 'sku-2',
+               'rows.1.quantity': '1'},
+}
+
+# the data that makes the submissions invalid by path
+INVALID = {
+    '/login': {'password': 'wrong'},
+    '/order': {'rows.1.quantity': '0'},
+}
+
+
+def percentile(values, percent):
+    """Returns the percentile of sorted values (nearest rank)."""
+    if not values:
+        return 0.0
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+class Client(object):
+    """An HTTP client that keeps the session cookie."""
+
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookie = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Sends a request and returns ``(status, body)``.  The server
+        closes the connection after every response.
+        """
+        headers = dict(headers or ())
+        if self.cookie is not None:
+            headers['Cookie'] = self.cookie
+        conn = httplib.HTTPConnection(self.host, self.port,
+                                      timeout=self.timeout)
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            cookie = response.getheader('set-cookie')
+            if cookie is not None:
+                self.cookie = cookie.split(';', 1)[0]
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+
+class Worker(Thread):
+    """Runs cycles until the deadline or the number of cycles is
+    reached.  The latencies are recorded in seconds by request kind.
+    """
+
+    def __init__(self, test, seed):
+        Thread.__init__(self)
+        self.daemon = True
+        self.test = test
+        self.random = random.Random(seed)
+        self.client = Client(test.host, test.port)
+        self.latencies = {'GET': [], 'POST': [], 'cycle': []}
+        self.errors = 0
+        self.invalid = 0
+
+    def next_cycle(self):
+        test = self.test
+        if time.time() >= test.deadline:
+            return False
+        test.lock.acquire()
+        try:
+            if test.cycles is not None:
+                if test.started >= test.cycles:
+                    return False
+                test.started += 1
+        finally:
+            test.lock.release()
+        return True
+
+    def run(self):
+        test = self.test
+        while self.next_cycle():
+            path = self.random.choice(test.paths)
+            data = dict(SUBMISSIONS[path])
+            invalid = self.random.random() < test.invalid_ratio
+            if invalid:
+                data.update(INVALID[path])
+            cycle_start = time.time()
+            try:
+                start = time.time()
+                status, body = self.client.request('GET', test.prefix + path)
+                self.latencies['GET'].append(time.time() - start)
+                match = _token_re.search(body)
+                if status != 200 or match is None:
+                    self.errors += 1
+                    continue
+                data['_csrf_token'] = match.group(1)
+                start = time.time()
+                status, body = self.client.request('POST',
+                                                   test.prefix + path,
+                                                   urlencode(data), {
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                    'Referer': test.url})
+                self.latencies['POST'].append(time.time() - start)
+            except (IOError, httplib.HTTPException):
+                self.errors += 1
+                continue
+            if status != (invalid and 400 or 303):
+                self.errors += 1
+                continue
+            if invalid:
+                self.invalid += 1
+            self.latencies['cycle'].append(time.time() - cycle_start)
+
+
+class LoadTest(object):
+    """Runs `concurrency` workers against the server at `url` for
+    `duration` seconds or until `cycles` cycles are started.  The `paths`
+    are relative to the path of the URL.
+    """
+
+    def __init__(self, url, paths, concurrency=10, duration=10,
+                 cycles=None, invalid_ratio=0.0, seed=0):
+        self.url = url
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.paths = paths
+        self.concurrency = concurrency
+        self.duration = duration
+        self.cycles = cycles
+        self.invalid_ratio = invalid_ratio
+        self.seed = seed
+        self.started = 0
+        self.deadline = None
+        self.elapsed = None
+        self.workers = []
+        self.lock = Lock()
+
+    def run(self):
+        self.workers = [Worker(self, self.seed + idx)
+                        for idx in xrange(self.concurrency)]
+        start = time.time()
+        self.deadline = start + self.duration
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            worker.join()
+        self.elapsed = time.time() - start
+
+    def report(self):
+        """Returns the results as string."""
+        lines = []
+        cycles = sum(len(x.latencies['cycle']) for x in self.workers)
+        errors = sum(x.errors for x in self.workers)
+        invalid = sum(x.invalid for x in self.workers)
+        requests = sum(len(x.latencies['GET']) + len(x.latencies['POST'])
+                       for x in self.workers)
+        lines.append('%d clients, %.1f seconds, %d cycles (%d invalid), '
+                     '%d errors' % (self.concurrency, self.elapsed, cycles,
+                                    invalid, errors))
+        lines.append('%.1f requests/s, %.1f cycles/s' % (
+            requests / self.elapsed, cycles / self.elapsed))
+        lines.append('')
+        lines.append('%-8s %8s %10s %10s %10s %10s' % (
+            'latency', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+        for kind in 'GET', 'POST', 'cycle':
+            values = []
+            for worker in self.workers:
+                values.extend(worker.latencies[kind])
+            values.sort()
+            lines.append('%-8s %8d %10.2f %10.2f %10.2f %10.2f' % (
+                kind, len(values), percentile(values, 50) * 1000,
+                percentile(values, 95) * 1000, percentile(values, 99) * 1000,
+                (values and values[-1] or 0) * 1000))
+        return '\n'.join(lines)
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--url', help='the server to test (default: serve '
+                      'the application in process)')
+    parser.add_option('-c', '--concurrency', type='int', default=10,
+                      help='number of clients (default 10)')
+    parser.add_option('-d', '--duration', type='float', default=10,
+                      help='seconds to run (default 10)')
+    parser.add_option('-n', '--cycles', type='int',
+                      help='stop after this many cycles')
+    parser.add_option('--path', action='append', dest='paths',
+                      choices=sorted(SUBMISSIONS),
+                      help='form to test, can be given more than once '
+                           '(default: all)')
+    parser.add_option('--invalid', type='float', default=0.1,
+                      help='fraction of invalid submissions (default 0.1)')
+    parser.add_option('--seed', type='int', default=0,
+                      help='seed of the clients (default 0)')
+    options, args = parser.parse_args()
+
+    server = None
+    url = options.url
+    if url is None:
+        from loadapp import make_load_server
+        server = make_load_server()
+        thread = Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://%s:%d/' % server.server_address
+
+    test = LoadTest(url, options.paths or sorted(SUBMISSIONS),
+                    options.concurrency, options.duration, options.cycles,
+                    options.invalid, options.seed)
+    test.run()
+    if server is not None:
+        server.shutdown()
+    print test.report()
+
+
+if __name__ == '__main__':
+    main()
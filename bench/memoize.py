@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+    memoize
+    ~~~~~~~
+
+    Compares an expensive validator with its memoized version on a list of
+    values with repeated entries.
+
+    Run it from the project root::
+
+        $ python bench/memoize.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import re
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import forms
+from fungiform.exceptions import ValidationError
+
+
+ROWS = 2000
+DISTINCT = 50
+ROUNDS = 5
+
+_email_re = re.compile(r'''^(?:[a-z0-9!#$%&'*+/=?^_`{|}~-]+
+    (?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*)@
+    (?:(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,})$''',
+    re.I | re.X)
+
+
+def is_valid_email(form, value):
+    if _email_re.match(value) is None or len(value) > 254:
+        raise ValidationError(u'Invalid email address')
+    local, domain = value.rsplit(u'@', 1)
+    for label in domain.split(u'.'):
+        if label.startswith(u'-') or label.endswith(u'-'):
+            raise ValidationError(u'Invalid email address')
+
+
+def make_form(validator):
+    class MailingForm(forms.FormBase):
+        recipients = forms.Multiple(forms.TextField(validators=[validator]))
+    return MailingForm
+
+
+def main():
+    data = dict(('recipients.%d' % idx,
+                 u'user%d@mail%d.example.com' % (idx % DISTINCT, idx % 7))
+                for idx in xrange(ROWS))
+    print '%d rows, %d distinct values, %d forms' % (ROWS, DISTINCT, ROUNDS)
+    memoized = forms.memoize(is_valid_email)
+    for name, validator in [('plain', is_valid_email),
+                            ('memoized', memoized)]:
+        form_cls = make_form(validator)
+        start = time.time()
+        for x in xrange(ROUNDS):
+            assert form_cls().validate(data)
+        print '%-10s %8.1f ms' % (name, (time.time() - start) * 1000)
+    print memoized
+
+
+if __name__ == '__main__':
+    main()
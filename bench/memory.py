@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+    memory
+    ~~~~~~
+
+    Reports the memory used by a bound admin style form with a lot of
+    fields and by the widget tree created when rendering it.
+
+    Run it from the project root::
+
+        $ python bench/memory.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fungiform import forms
+from memtools import measure, format_bytes, tracemalloc
+
+
+FIELD_COUNTS = [10, 100, 300]
+
+
+def make_form_class(size):
+    d = {}
+    for idx in xrange(size):
+        if idx % 3 == 0:
+            field = forms.TextField(u'Text %d' % idx, max_length=200)
+        elif idx % 3 == 1:
+            field = forms.IntegerField(u'Number %d' % idx, min_value=0)
+        else:
+            field = forms.BooleanField(u'Flag %d' % idx)
+        d['field_%d' % idx] = field
+    return type('AdminForm', (forms.FormBase,), d)
+
+
+def render_widget(form):
+    widget = form.as_widget()
+    widget.render()
+    return widget
+
+
+def main():
+    print 'measuring with %s' % (tracemalloc is not None and 'tracemalloc'
+                                 or 'the gc object fallback')
+    print '%-8s %-22s %12s %10s' % ('fields', 'what', 'memory', 'objects')
+    for size in FIELD_COUNTS:
+        form_class = make_form_class(size)
+        form, memory, objects = measure(form_class)
+        print '%-8d %-22s %12s %10d' % (size, 'bound form',
+                                        format_bytes(memory), objects)
+        widget, memory, objects = measure(render_widget, form)
+        print '%-8d %-22s %12s %10d' % (size, 'rendered widget tree',
+                                        format_bytes(memory), objects)
+        del form, widget
+
+
+if __name__ == '__main__':
+    main()
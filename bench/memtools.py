@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+    memtools
+    ~~~~~~~~
+
+    Small helpers for the memory benchmarks.  If the interpreter provides
+    `tracemalloc` (Python 3.4+ or a patched 2.x build with pytracemalloc)
+    the traced allocations are reported, otherwise the size of all newly
+    created garbage collector tracked objects is used as an approximation.
+    The fallback does not see strings and numbers but is good enough to
+    compare two implementations of the same object graph.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import gc
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def measure(func, *args, **kwargs):
+    """Calls `func` and returns a ``(result, bytes, objects)`` tuple where
+    `bytes` is the memory still allocated for the result after the call
+    and `objects` the number of objects created for it.
+    """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            result = func(*args, **kwargs)
+            gc.collect()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        return (result, sum(x.size_diff for x in stats),
+                sum(x.count_diff for x in stats))
+
+    old_objects = set(id(x) for x in gc.get_objects())
+    old_objects.add(id(old_objects))
+    result = func(*args, **kwargs)
+    gc.collect()
+    size = objects = 0
+    for obj in gc.get_objects():
+        if id(obj) not in old_objects:
+            objects += 1
+            size += sys.getsizeof(obj)
+            # instance dicts are not always tracked separately
+            d = getattr(obj, '__dict__', None)
+            if type(d) is dict and not gc.is_tracked(d):
+                size += sys.getsizeof(d)
+    del old_objects
+    return result, size, objects
+
+
+def format_bytes(size):
+    """Formats a number of bytes for the reports."""
+    if abs(size) < 1024:
+        return '%d B' % size
+    return '%.1f KB' % (size / 1024.0)
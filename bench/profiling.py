@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+    profiling
+    ~~~~~~~~~
+
+    Measures validating and rendering a form without a profiler and with
+    one attached, and prints the report of the profiler.
+
+    Run it from the project root::
+
+        $ python bench/profiling.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import forms
+from fungiform.exceptions import ValidationError
+from fungiform.profiling import Profiler
+
+
+FIELDS = 50
+NUMBER = 200
+
+
+def is_short(form, value):
+    if len(value) > 20:
+        raise ValidationError(u'Too long')
+
+
+BigForm = type('BigForm', (forms.FormBase,), dict(
+    ('field%d' % idx, forms.TextField(validators=[is_short]))
+    for idx in xrange(FIELDS)))
+DATA = dict(('field%d' % idx, u'value %d' % idx) for idx in xrange(FIELDS))
+
+
+def validate_and_render():
+    form = BigForm()
+    form.validate(DATA)
+    form.as_widget().render()
+
+
+def best(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER
+
+
+def main():
+    print '%d fields, validate and render' % FIELDS
+    plain = best(validate_and_render)
+    print '%-12s %8.1f us' % ('no profiler', plain * 1000000)
+    profiler = Profiler()
+    BigForm.profiler = profiler
+    profiled = best(validate_and_render)
+    del BigForm.profiler
+    print '%-12s %8.1f us' % ('profiler', profiled * 1000000)
+    print
+    print profiler.report(limit=8)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+    recaptcha
+    ~~~~~~~~~
+
+    Compares the latency of `validate_recaptcha` (one new connection per
+    call) and a pooled `RecaptchaVerifier` against the local stub verify
+    server from the test suite at different concurrency levels.
+
+    Run it from the project root::
+
+        $ python bench/recaptcha.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+from threading import Thread
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform import recaptcha
+from fungiform.tests.recaptcha import StubVerifyServer
+
+
+CONCURRENCY = [1, 8, 32]
+CALLS_PER_THREAD = 50
+SERVER_DELAY = 0.002
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def run(verify, concurrency):
+    timings = []
+
+    def worker():
+        for x in xrange(CALLS_PER_THREAD):
+            start = time.time()
+            verify('private', u'challenge', u'correct', u'127.0.0.1')
+            timings.append(time.time() - start)
+
+    threads = [Thread(target=worker) for x in xrange(concurrency)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, time.time() - start
+
+
+def main():
+    with StubVerifyServer(delay=SERVER_DELAY) as server:
+        recaptcha.VERIFY_SERVER = server.url
+        verifier = recaptcha.RecaptchaVerifier(server.url, pool_size=32)
+        print '%-20s %6s %10s %8s %8s %8s' % ('verifier', 'conc', 'req/s',
+                                             'p50 ms', 'p95 ms', 'p99 ms')
+        for name, verify in [('validate_recaptcha',
+                              recaptcha.validate_recaptcha),
+                             ('RecaptchaVerifier', verifier)]:
+            for concurrency in CONCURRENCY:
+                timings, elapsed = run(verify, concurrency)
+                print '%-20s %6d %10.0f %8.2f %8.2f %8.2f' % (
+                    name, concurrency, len(timings) / elapsed,
+                    percentile(timings, 50) * 1000,
+                    percentile(timings, 95) * 1000,
+                    percentile(timings, 99) * 1000)
+        verifier.close()
+        print 'connections opened: %d for %d requests' % (server.connections,
+                                                         server.requests)
+
+
+if __name__ == '__main__':
+    main()
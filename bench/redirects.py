@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+    redirects
+    ~~~~~~~~~
+
+    Compares checking a host against a list of allowed redirect rules with
+    `fnmatch` (one pattern at a time) and with a compiled `RedirectRules`
+    for an exact hit, a wildcard hit and a miss.
+
+    Run it from the project root::
+
+        $ python bench/redirects.py
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import timeit
+from fnmatch import fnmatch
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fungiform.redirects import RedirectRules
+
+
+# rule count -> iterations.  With more than 100 patterns the pattern cache
+# of fnmatch is flushed all the time so the big list runs fewer times.
+SIZES = [(10, 2000), (100, 500), (500, 10)]
+
+
+def make_rules(count):
+    rules = []
+    for idx in xrange(count):
+        if idx % 2:
+            rules.append('*.site%d.example.com' % idx)
+        else:
+            rules.append('site%d.example.org' % idx)
+    return rules
+
+
+def fnmatch_loop(host, rules):
+    for rule in rules:
+        if fnmatch(host, rule):
+            return True
+    return False
+
+
+def main():
+    print '%6s %-10s %14s %14s %8s' % ('rules', 'host', 'fnmatch us',
+                                       'compiled us', 'speedup')
+    for size, iterations in SIZES:
+        rules = make_rules(size)
+        compiled = RedirectRules(rules)
+        hosts = [('exact', 'site%d.example.org' % (size - 2)),
+                 ('wildcard', 'www.site%d.example.com' % (size - 1)),
+                 ('miss', 'evil.example.net')]
+        for name, host in hosts:
+            assert fnmatch_loop(host, rules) == compiled.match(host)
+            slow = timeit.timeit(lambda: fnmatch_loop(host, rules),
+                                 number=iterations) / iterations
+            fast = timeit.timeit(lambda: compiled.match(host),
+                                 number=iterations) / iterations
+            print '%6d %-10s %14.2f %14.2f %7.1fx' % (size, name, slow * 1e6,
+                                                      fast * 1e6, slow / fast)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+    suite
+    ~~~~~
+
+    Benchmarks creating, decoding, validating and rendering representative
+    forms: a flat login form, an admin form with 300 fields, an order form
+    with nested `Multiple` and `Mapping` fields and a select box with 10000
+    choices.  Every operation is reported in operations per second and
+    the memory and objects that are still allocated for its result (see
+    `memtools`).
+
+    Run it from the project root::
+
+        $ python bench/suite.py
+
+    Save a baseline and compare a later run against it.  The comparison
+    fails with exit code 1 if an operation got slower than the threshold
+    (a fraction of the baseline, 0.15 by default)::
+
+        $ python bench/suite.py --save baseline.json
+        $ python bench/suite.py --compare baseline.json --threshold 0.1
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+from optparse import OptionParser
+try:
+    import json
+except ImportError:
+    import simplejson as json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fungiform import forms
+from fungiform.utils import decode_form_data
+from memtools import measure, format_bytes
+
+
+OPERATIONS = ['init', 'decode', 'validate', 'as_widget', 'render']
+
+
+class LoginForm(forms.FormBase):
+    username = forms.TextField(required=True, max_length=50)
+    password = forms.TextField(required=True,
+                               widget=forms.widgets.PasswordInput)
+    remember = forms.BooleanField()
+
+
+def make_admin_form(size=300):
+    d = {}
+    for idx in xrange(size):
+        if idx % 3 == 0:
+            field = forms.TextField(u'Text %d' % idx, max_length=200)
+        elif idx % 3 == 1:
+            field = forms.IntegerField(u'Number %d' % idx, min_value=0)
+        else:
+            field = forms.BooleanField(u'Flag %d' % idx)
+        d['field_%d' % idx] = field
+    return type('AdminForm', (forms.FormBase,), d)
+
+
+class OrderForm(forms.FormBase):
+    customer = forms.Mapping(
+        name=forms.TextField(required=True),
+        address=forms.Mapping(street=forms.TextField(),
+                              city=forms.TextField(),
+                              zipcode=forms.TextField()))
+    rows = forms.Multiple(forms.Mapping(
+        sku=forms.TextField(required=True),
+        quantity=forms.IntegerField(min_value=1),
+        options=forms.Multiple(forms.Mapping(
+            name=forms.TextField(),
+            value=forms.TextField()))))
+
+
+class ChoiceForm(forms.FormBase):
+    country = forms.ChoiceField(choices=[(u'c%d' % idx, u'Choice %d' % idx)
+                                         for idx in xrange(10000)])
+
+
+def login_data():
+    return {'username': u'john', 'password': u'secret', 'remember': u'on'}
+
+
+def admin_data():
+    data = {}
+    for idx in xrange(300):
+        if idx % 3 == 0:
+            data['field_%d' % idx] = u'text %d' % idx
+        elif idx % 3 == 1:
+            data['field_%d' % idx] = unicode(idx)
+        else:
+            data['field_%d' % idx] = u'on'
+    return data
+
+
+def order_data(rows=50, options=3):
+    data = {'customer.name': u'John', 'customer.address.street': u'Main',
+            'customer.address.city': u'Vienna',
+            'customer.address.zipcode': u'1010'}
+    for idx in xrange(rows):
+        data['rows.%d.sku' % idx] = u'sku-%d' % idx
+        data['rows.%d.quantity' % idx] = u'2'
+        for opt in xrange(options):
+            data['rows.%d.options.%d.name' % (idx, opt)] = u'color'
+            data['rows.%d.options.%d.value' % (idx, opt)] = u'red'
+    return data
+
+
+def choice_data():
+    return {'country': u'c5000'}
+
+
+FORMS = [
+    ('login', LoginForm, login_data),
+    ('admin', make_admin_form(), admin_data),
+    ('order', OrderForm, order_data),
+    ('choices', ChoiceForm, choice_data),
+]
+
+
+def make_operations(form_class, data):
+    """Returns the operations for a form as ``(name, func)`` tuples."""
+    validated = form_class()
+    validated.validate(data)
+    widget = validated.as_widget()
+
+    def validate():
+        form = form_class()
+        form.validate(data)
+        return form
+    return [('init', form_class),
+            ('decode', lambda: decode_form_data(data)),
+            ('validate', validate),
+            ('as_widget', validated.as_widget),
+            ('render', widget.render)]
+
+
+def ops_per_second(func, min_time=0.2, repeat=3):
+    """Calls the function until `min_time` passed and returns the best
+    number of calls per second of `repeat` runs.
+    """
+    best = 0
+    for x in xrange(repeat):
+        count = 0
+        start = time.time()
+        while 1:
+            func()
+            count += 1
+            elapsed = time.time() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, count / elapsed)
+    return best
+
+
+def run(selected=None, min_time=0.2):
+    """Runs the benchmarks and returns a dict with the results keyed by
+    ``form.operation``.
+    """
+    results = {}
+    for form_name, form_class, get_data in FORMS:
+        for op_name, func in make_operations(form_class, get_data()):
+            key = '%s.%s' % (form_name, op_name)
+            if selected and not [x for x in selected if x in key]:
+                continue
+            ops = ops_per_second(func, min_time)
+            result, memory, objects = measure(func)
+            del result
+            results[key] = {'ops': ops, 'memory': memory,
+                            'objects': objects}
+            print '%-20s %12.1f ops/s %12s %8d objects' % (
+                key, ops, format_bytes(memory), objects)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints the change against the baseline and returns the keys of
+    the operations that got slower than the threshold.
+    """
+    regressions = []
+    print
+    print '%-20s %12s %12s %8s' % ('operation', 'baseline', 'now', 'change')
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        old = baseline[key]['ops']
+        new = results[key]['ops']
+        change = (new - old) / old
+        flag = ''
+        if change < -threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print '%-20s %12.1f %12.1f %+7.1f%%%s' % (key, old, new,
+                                                  change * 100, flag)
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [operation ...]')
+    parser.add_option('--save', metavar='FILE',
+                      help='save the results as baseline')
+    parser.add_option('--compare', metavar='FILE',
+                      help='compare the results with a baseline')
+    parser.add_option('--threshold', type='float', default=0.15,
+                      help='allowed slowdown as fraction (default 0.15)')
+    parser.add_option('--min-time', type='float', default=0.2,
+                      help='seconds per measurement (default 0.2)')
+    options, selected = parser.parse_args()
+
+    results = run(selected, options.min_time)
+    if options.save:
+        f = open(options.save, 'w')
+        try:
+            json.dump(results, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+    if options.compare:
+        f = open(options.compare)
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print
+            print '%d operations regressed more than %d%%' % (
+                len(regressions), options.threshold * 100)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
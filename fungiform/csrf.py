@@ -10,18 +10,31 @@
 """
 import os
 import hmac
+import mmap
+import struct
+from collections import deque
 from functools import update_wrapper
+from heapq import heappush, heappop
+from threading import Lock
+from time import time
 from zlib import adler32
 try:
     from hashlib import sha1
 except ImportError:
     from sha import new as sha1
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 #: the maximum number of csrf tokens kept in the session.  After that, the
 #: oldest item is deleted
 MAX_CSRF_TOKENS = 4
 
+#: the number of seconds a signed csrf token is valid by default
+CSRF_TOKEN_LIFETIME = 3600
+
 
 def csrf_url_hash(url):
     """A hash for a URL for the CSRF system."""
@@ -35,9 +48,22 @@ def random_token():
     return os.urandom(10)
 
 
-def get_csrf_token(session, url, force_update=False):
-    """Return a CSRF token."""
+def get_csrf_token(session, url, force_update=False, store=None):
+    """Return a CSRF token.  By default the tokens are stored in the
+    session, if a :class:`TokenStore` is passed the session only holds
+    the key for the tokens in the store.
+    """
     url_hash = csrf_url_hash(url)
+    if store is not None:
+        key = _get_store_key(session, url_hash)
+        token = None
+        if not force_update:
+            token = store.get(key)
+        if token is None:
+            token = random_token()
+            store.set(key, token)
+        return token.encode('hex')
+
     tokens = session.setdefault('csrf_tokens', [])
     token = None
 
@@ -57,10 +83,342 @@ def get_csrf_token(session, url, force_update=False):
     return token.encode('hex')
 
 
-def invalidate_csrf_token(session, url):
+def invalidate_csrf_token(session, url, store=None):
     """Clears the CSRF token for the given URL."""
     url_hash = csrf_url_hash(url)
+    if store is not None:
+        store.delete(_get_store_key(session, url_hash))
+        return
     tokens = session.get('csrf_tokens', None)
     if not tokens:
         return
     session['csrf_tokens'] = [(h, t) for h, t in tokens if h != url_hash]
+
+
+def _get_store_key(session, url_hash):
+    """Return the key for the token of an URL in a token store.  The key
+    is derived from the CSRF secret of the session.
+    """
+    secret = get_csrf_secret(session)
+    if isinstance(secret, unicode):
+        secret = secret.encode('utf-8')
+    return '%s:%d' % (sha1(secret).hexdigest()[:20], url_hash)
+
+
+def get_csrf_secret(session):
+    """Return the per-session secret used to sign CSRF tokens.  The secret
+    is stored in the session the first time it's requested, afterwards the
+    session is only read.
+    """
+    secret = session.get('csrf_secret')
+    if secret is None:
+        secret = session['csrf_secret'] = random_token().encode('hex')
+    return secret
+
+
+def _sign_csrf_token(secret, url_hash, expires):
+    """Return the signature for a signed CSRF token."""
+    if isinstance(secret, unicode):
+        secret = secret.encode('utf-8')
+    return hmac.new(secret, '%d|%d' % (url_hash, expires), sha1).hexdigest()
+
+
+def _constant_time_compare(a, b):
+    """Compares two strings in a time that only depends on their length."""
+    if len(a) != len(b):
+        return False
+    rv = 0
+    for x, y in zip(a, b):
+        rv |= ord(x) ^ ord(y)
+    return rv == 0
+
+
+def get_signed_csrf_token(secret, url, lifetime=CSRF_TOKEN_LIFETIME,
+                          now=None):
+    """Return a CSRF token for the URL that is signed with the secret and
+    valid for `lifetime` seconds.  Unlike `get_csrf_token` this does not
+    store anything, the token is verified by `check_signed_csrf_token`.
+    """
+    if now is None:
+        now = time()
+    expires = int(now + lifetime)
+    return '%x.%s' % (expires, _sign_csrf_token(secret, csrf_url_hash(url),
+                                                expires))
+
+
+def check_signed_csrf_token(secret, url, token, replay_cache=None, now=None):
+    """Checks a token created by `get_signed_csrf_token`.  If a
+    :class:`ReplayCache` is passed every token is only accepted once.
+    """
+    if not isinstance(token, basestring):
+        return False
+    try:
+        expires, signature = str(token).split('.', 1)
+        expires = int(expires, 16)
+    except (ValueError, UnicodeError):
+        return False
+    if now is None:
+        now = time()
+    if expires < now:
+        return False
+    expected = _sign_csrf_token(secret, csrf_url_hash(url), expires)
+    if not _constant_time_compare(signature, expected):
+        return False
+    if replay_cache is not None:
+        return replay_cache.add(token, expires, now, secret)
+    return True
+
+
+class ReplayCache(object):
+    """Remembers used signed CSRF tokens until they expire so that every
+    token is only accepted once.  Tokens are only forgotten once they
+    expired, forgetting a valid token would allow to use it again.  The
+    cache is local to the process and safe to share between threads.
+
+    The cache is bounded in two ways.  Every session secret may only have
+    `max_per_secret` valid tokens in the cache, further tokens of that
+    session are rejected until one of them expires.  This keeps a single
+    client from filling the cache by submitting forms in a loop.  The
+    whole cache holds at most `maxsize` tokens, if it is full new tokens
+    of all sessions are rejected for up to the token lifetime.  Many
+    sessions together can still lock out the site that way.  Both limits
+    can be disabled by passing `None`, the cache then grows with the
+    number of valid tokens instead.
+    """
+
+    def __init__(self, maxsize=10000, max_per_secret=100):
+        self.maxsize = maxsize
+        self.max_per_secret = max_per_secret
+        self._tokens = set()
+        self._expiry = []
+        self._per_secret = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def add(self, token, expires, now=None, secret=None):
+        """Remembers a token.  Returns `False` if the token was used before
+        or the cache or the quota of the secret is full, `True` otherwise.
+        """
+        if now is None:
+            now = time()
+        self._lock.acquire()
+        try:
+            if token in self._tokens:
+                return False
+            expiry = self._expiry
+            per_secret = self._per_secret
+            while expiry and expiry[0][0] < now:
+                old_token, old_secret = heappop(expiry)[1:]
+                self._tokens.discard(old_token)
+                if per_secret[old_secret] == 1:
+                    del per_secret[old_secret]
+                else:
+                    per_secret[old_secret] -= 1
+            if self.maxsize is not None and len(expiry) >= self.maxsize:
+                return False
+            count = per_secret.get(secret, 0)
+            if self.max_per_secret is not None and \
+               count >= self.max_per_secret:
+                return False
+            heappush(expiry, (expires, token, secret))
+            self._tokens.add(token)
+            per_secret[secret] = count + 1
+            return True
+        finally:
+            self._lock.release()
+
+
+class TokenStore(object):
+    """Interface for CSRF token stores.  If a token store is passed to
+    `get_csrf_token` and `invalidate_csrf_token` the tokens are kept in
+    the store instead of the session.  Keys and tokens are bytestrings,
+    tokens are created by `random_token` and 10 bytes long.
+    """
+
+    def get(self, key):
+        """Return the token for the key or `None` if there is none."""
+        raise NotImplementedError()
+
+    def set(self, key, token):
+        """Store a token for the key."""
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """Delete the token for the key if it exists."""
+        raise NotImplementedError()
+
+
+class MemoryTokenStore(TokenStore):
+    """Keeps the tokens in a dict in the current process.  Tokens expire
+    after `ttl` seconds and the oldest tokens are dropped if there are more
+    than `maxsize`.  This only works if all requests of a session are
+    handled by the same process.
+    """
+
+    def __init__(self, ttl=CSRF_TOKEN_LIFETIME, maxsize=100000, timer=time):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.timer = timer
+        self._tokens = {}
+        self._queue = deque()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def _evict(self, now):
+        # the queue is ordered by expiration time because the ttl is the
+        # same for all tokens.  Entries of tokens that were replaced or
+        # deleted in the meantime are skipped.
+        tokens = self._tokens
+        queue = self._queue
+        while queue and (queue[0][0] <= now or len(tokens) > self.maxsize):
+            expires, key = queue.popleft()
+            item = tokens.get(key)
+            if item is not None and item[0] == expires:
+                del tokens[key]
+
+    def _compact(self):
+        # entries of replaced or deleted tokens are dropped once they are
+        # half of the queue, so it never holds more than twice the entries
+        # of the live tokens
+        tokens = self._tokens
+        if len(self._queue) > 2 * len(tokens):
+            queue = deque()
+            seen = set()
+            for expires, key in self._queue:
+                item = tokens.get(key)
+                if item is not None and item[0] == expires and \
+                   key not in seen:
+                    seen.add(key)
+                    queue.append((expires, key))
+            self._queue = queue
+
+    def get(self, key):
+        item = self._tokens.get(key)
+        if item is not None and item[0] > self.timer():
+            return item[1]
+
+    def set(self, key, token):
+        now = self.timer()
+        expires = now + self.ttl
+        self._lock.acquire()
+        try:
+            self._tokens[key] = (expires, token)
+            self._queue.append((expires, key))
+            self._evict(now)
+            self._compact()
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            self._tokens.pop(key, None)
+            self._compact()
+        finally:
+            self._lock.release()
+
+
+class MmapTokenStore(TokenStore):
+    """Keeps the tokens in a memory mapped file that is shared by all
+    processes on a machine that use the same filename.  The file holds a
+    hash table with a fixed number of `slots`.  A key can be stored in a
+    handful of slots, if all of them are taken by valid tokens, the token
+    that expires first is replaced.  Locking between processes requires
+    `fcntl` which limits this store to POSIX systems.
+    """
+
+    #: key digest, expiration time and token
+    _record = struct.Struct('<20sd10s')
+    _empty_record = _record.pack('', 0, '')
+
+    #: the number of slots that are checked for a key
+    probe = 8
+
+    def __init__(self, filename, slots=65536, ttl=CSRF_TOKEN_LIFETIME,
+                 timer=time):
+        self.filename = filename
+        self.slots = slots
+        self.ttl = ttl
+        self.timer = timer
+        size = slots * self._record.size
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        except:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._lock = Lock()
+
+    def close(self):
+        """Unmaps the file."""
+        self._map.close()
+        os.close(self._fd)
+
+    def _acquire(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+
+    def _release(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def _offsets(self, digest):
+        start = struct.unpack('<I', digest[:4])[0]
+        size = self._record.size
+        for idx in xrange(self.probe):
+            yield ((start + idx) % self.slots) * size
+
+    def get(self, key):
+        digest = sha1(key).digest()
+        now = self.timer()
+        self._acquire()
+        try:
+            for offset in self._offsets(digest):
+                stored, expires, token = \
+                    self._record.unpack_from(self._map, offset)
+                if stored == digest and expires > now:
+                    return token
+        finally:
+            self._release()
+
+    def set(self, key, token):
+        if len(token) != 10:
+            raise ValueError('tokens have to be 10 bytes long')
+        digest = sha1(key).digest()
+        now = self.timer()
+        self._acquire()
+        try:
+            target = target_expires = None
+            for offset in self._offsets(digest):
+                stored, expires = self._record.unpack_from(self._map,
+                                                           offset)[:2]
+                if stored == digest:
+                    target = offset
+                    break
+                if target is None or expires < target_expires:
+                    target = offset
+                    target_expires = expires
+            self._record.pack_into(self._map, target, digest,
+                                   now + self.ttl, token)
+        finally:
+            self._release()
+
+    def delete(self, key):
+        digest = sha1(key).digest()
+        size = self._record.size
+        self._acquire()
+        try:
+            for offset in self._offsets(digest):
+                if self._map[offset:offset + 20] == digest:
+                    self._map[offset:offset + size] = self._empty_record
+        finally:
+            self._release()
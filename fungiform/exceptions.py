@@ -18,6 +18,8 @@ class ValidationError(ValueError):
     def __init__(self, message):
         if not isinstance(message, (list, tuple)):
             messages = [message]
+        else:
+            messages = message
         # make all items in the list unicode (this also evaluates
         # lazy translations in there)
         messages = map(unicode, messages)
@@ -50,3 +52,24 @@ class MultipleValidationErrors(ValidationError):
         for name, error in self.errors.iteritems():
             rv.update(error.unpack(form, make_name(key, name)))
         return rv
+
+
+class ValidationTimeout(Exception):
+    """Raised if the validation of a form takes longer than its budget.
+    `path` is the list of keys of the first field that was not validated
+    because the budget ran out.  Forms catch this and add a form level
+    error.
+    """
+
+    def __init__(self, path=None):
+        Exception.__init__(self, 'validation budget exceeded')
+        if path is None:
+            path = []
+        self.path = path
+
+    @property
+    def field(self):
+        """The name of the first field that was not validated or `None`
+        if it was the form itself.
+        """
+        return reduce(make_name, self.path, None)
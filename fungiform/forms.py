@@ -22,32 +22,46 @@
             name = TextField(u'Name: ', required=True)
             email = TextField(u'Email: ', validators=[is_valid_email])
 
+    The validators of a field run in order, `validate_<field>` methods of
+    the form after the ones passed to the field.  Validators that are
+    expensive (like database lookups) can be given a cost hint with `cost`
+    so that they run after the cheap ones and are skipped if one of those
+    failed.
+
 
     :copyright: (c) 2010 by the Fungiform Team.
     :license: BSD, see LICENSE for more details.
 """
+from time import time
 from datetime import datetime, date
-from itertools import count
+from itertools import count, izip
 from threading import Lock
 from urlparse import urljoin
 
 from fungiform import widgets
-from fungiform.exceptions import ValidationError, MultipleValidationErrors
-from fungiform.utils import OrderedDict, decode_form_data, \
+from fungiform.exceptions import ValidationError, MultipleValidationErrors, \
+                                 ValidationTimeout
+from fungiform.utils import OrderedDict, ThreadPool, LRUCache, \
+                            decode_form_data, \
                             format_system_datetime, format_system_date, \
                             parse_datetime, parse_date, get_timezone, \
                             _force_dict, _force_list, _to_string, _to_list, \
                             html, _make_widget, _value_matches_choice, \
-                            get_current_url
+                            to_utc, make_name, _missing, _convert_numbers, \
+                            _find_out_of_range, _parse_iso_column
 from fungiform.recaptcha import validate_recaptcha
-from fungiform.redirects import get_redirect_target
-from fungiform.csrf import get_csrf_token, invalidate_csrf_token
+from fungiform.redirects import get_redirect_target, get_url_context, \
+                                RedirectRules
+from fungiform.csrf import get_csrf_token, invalidate_csrf_token, \
+                           get_csrf_secret, get_signed_csrf_token, \
+                           check_signed_csrf_token, CSRF_TOKEN_LIFETIME
 
 
 __all__ = ['FormBase', 'Field', 'Mapping', 'Multiple', 'CommaSeparated',
            'LineSeparated', 'TextField', 'PasswordField', 'DateTimeField',
            'DateField', 'ChoiceField', 'MultiChoiceField', 'IntegerField',
-           'BooleanField', 'FormBase']
+           'BooleanField', 'FormBase', 'io_bound', 'batch_validator',
+           'memoize', 'depends_on_form', 'cost', 'PendingResult']
 
 
 _last_position_hint = -1
@@ -60,6 +74,11 @@ _dummy_translations = (type('_dummy_translations', (object,), {
     'ungettext':    lambda x, s, p, n: [s, p][n != 1]
 }))()
 
+# the type of the descriptors of `__slots__`
+_slot_descriptor = type(type('_slotted', (object,), {
+    '__slots__': ('x',)
+}).__dict__['x'])
+
 
 def _bind(obj, form, memo):
     """Helper for the field binding.  This is inspired by the way `deepcopy`
@@ -75,25 +94,614 @@ def _bind(obj, form, memo):
     return rv
 
 
+def _overrides(field, cls, *names):
+    """Checks if the class of the field overrides one of the methods of
+    `cls`.  Fields use this to only take shortcuts if the methods they
+    shortcut were not customized by a subclass.
+    """
+    field_cls = type(field)
+    for name in names:
+        if getattr(field_cls, name).im_func is not \
+           getattr(cls, name).im_func:
+            return True
+    return False
+
+
+def _diff_primitives(old, new, path, changes):
+    """Appends the paths (tuples of keys) where two primitive values differ
+    to `changes`.  Dicts are compared key by key, everything else as a
+    whole.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            _diff_primitives(old[key], new.get(key), path + (key,), changes)
+        for key in new:
+            if key not in old:
+                changes.append(path + (key,))
+    elif old != new:
+        changes.append(path)
+
+
+_default_pool = None
+_default_pool_lock = Lock()
+
+
+def _get_default_pool():
+    """Returns the thread pool that is shared by all forms that don't have
+    a `validator_pool`.
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool_lock.acquire()
+        try:
+            if _default_pool is None:
+                _default_pool = ThreadPool()
+        finally:
+            _default_pool_lock.release()
+    return _default_pool
+
+
+def io_bound(validator):
+    """Marks a validator as I/O bound.  Forms run these validators in a
+    thread pool so that all of them wait for their service at the same
+    time::
+
+        @io_bound
+        def is_known_user(form, value):
+            if ldap.find_user(value) is None:
+                raise ValidationError(u'Unknown user')
+
+    This works for `validate_<field>` methods too.  To mark all validators
+    of a field, set `io_bound` on the field.
+    """
+    validator.io_bound = True
+    return validator
+
+
+def batch_validator(validator):
+    """Marks a validator as batch validator.  Inside of a `Multiple` field
+    a batch validator is called once with the list of all values it has to
+    check instead of once per item, so it can look them up at once::
+
+        @batch_validator
+        def skus_exist(form, values):
+            known = Product.query.known_skus(set(values))
+            errors = dict((pos, ValidationError(u'Unknown SKU'))
+                          for pos, value in enumerate(values)
+                          if value not in known)
+            if errors:
+                raise MultipleValidationErrors(errors)
+
+    The keys of the `MultipleValidationErrors` are positions in the list
+    of values, a `ValidationError` marks all values as invalid.  The
+    errors end up at the items the values belong to.  Outside of a
+    `Multiple` field the list has a single value.
+    """
+    validator.batch = True
+    return validator
+
+
+class PendingResult(object):
+    """Wraps a future like object that a validator returns instead of
+    checking the value right away::
+
+        def is_known_user(form, value):
+            return PendingResult(executor.submit(check_user, value))
+
+    The `result` method of the wrapped object must raise a
+    `ValidationError` if the value is invalid.  If the form has a budget,
+    it's called with the remaining seconds as timeout like the one of
+    `concurrent.futures`.  Other return values of validators are ignored,
+    even if they have a `result` method.
+    """
+
+    def __init__(self, future):
+        self.future = future
+
+    def result(self, timeout=None):
+        if timeout is None:
+            return self.future.result()
+        return self.future.result(timeout)
+
+
+class MemoizedValidator(object):
+    """A validator that remembers if it accepted or rejected a value.  The
+    outcome is cached by value in an `LRUCache` with `maxsize` items that
+    are forgotten after `ttl` seconds.  `hits` and `misses` count the
+    lookups.
+
+    The cache is skipped if the validator is marked with
+    `depends_on_form`, if the value is unhashable or if the validator
+    returns a pending result.  The messages of cached errors are the ones
+    of the first call, so validators with translated messages should
+    only be memoized if all requests use the same language.
+    """
+
+    depends_on_form = False
+
+    def __init__(self, validator, maxsize=1024, ttl=None):
+        self.validator = validator
+        self.cache = LRUCache(maxsize, ttl)
+        self.hits = self.misses = 0
+        for name in ('io_bound', 'batch', 'depends_on_form', 'cost',
+                     '__name__', '__doc__'):
+            if hasattr(validator, name):
+                setattr(self, name, getattr(validator, name))
+
+    def __get__(self, obj, type=None):
+        # memoized `validate_<field>` methods can be called on the form
+        if obj is None:
+            return self
+        return lambda value: self(obj, value)
+
+    def __call__(self, form, value):
+        if self.depends_on_form:
+            return self.validator(form, value)
+        # ``1``, ``1.0`` and ``True`` are equal but not the same value
+        key = (type(value), value)
+        try:
+            messages = self.cache.get(key, _missing)
+        except TypeError:
+            return self.validator(form, value)
+        if messages is not _missing:
+            self.hits += 1
+            if messages is not None:
+                raise ValidationError(messages)
+            return
+        self.misses += 1
+        try:
+            rv = self.validator(form, value)
+        except MultipleValidationErrors:
+            raise
+        except ValidationError, e:
+            self.cache[key] = list(e.messages)
+            raise
+        if rv is None:
+            self.cache[key] = None
+        return rv
+
+    def clear(self):
+        """Forgets all outcomes and resets the counters."""
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+    def __repr__(self):
+        return '<%s %r hits=%d misses=%d>' % (self.__class__.__name__,
+                                              self.validator, self.hits,
+                                              self.misses)
+
+
+def memoize(validator=None, maxsize=1024, ttl=None):
+    """Caches the outcome of a deterministic validator by value, see
+    `MemoizedValidator`.  Works with and without arguments::
+
+        @memoize
+        def is_valid_iban(form, value):
+            ...
+
+        @memoize(maxsize=100, ttl=3600)
+        def validate_domain(self, value):
+            ...
+    """
+    if validator is None:
+        return lambda validator: MemoizedValidator(validator, maxsize, ttl)
+    return MemoizedValidator(validator, maxsize, ttl)
+
+
+def depends_on_form(validator):
+    """Marks a validator whose outcome depends on the state of the form
+    and not just the value.  `memoize` doesn't cache these validators.
+    """
+    validator.depends_on_form = True
+    return validator
+
+
+def cost(hint):
+    """Gives a validator a cost hint.  Bound fields run their validators
+    ordered by cost, validators without a hint have a cost of 0.  As
+    validation stops at the first error, expensive validators are not
+    called for values a cheaper one rejected::
+
+        @cost(10)
+        def is_unused_username(form, value):
+            if User.query.filter_by(username=value).first() is not None:
+                raise ValidationError(u'The username is taken')
+
+    This works for `validate_<field>` methods and `context_validate` too.
+    Validators with the same cost keep their order.
+    """
+    def decorator(validator):
+        validator.cost = hint
+        return validator
+    return decorator
+
+
+def _get_cost(validator):
+    return getattr(validator, 'cost', 0)
+
+
+def _order_validators(validators):
+    """Returns a copy of the list of validators ordered by cost."""
+    for validator in validators:
+        if getattr(validator, 'cost', 0):
+            return sorted(validators, key=_get_cost)
+    return validators[:]
+
+
+def _has_validators(field, test, field_test=None):
+    """Checks if a field or one of its children has validators for which
+    `test` returns true.  If `field_test` is given, fields for which it
+    returns true count as well.
+    """
+    if field_test is not None and field_test(field):
+        return True
+    for validator in field.validators:
+        if test(validator):
+            return True
+    if isinstance(field, Mapping):
+        for child in field.fields.itervalues():
+            if _has_validators(child, test, field_test):
+                return True
+    elif isinstance(field, Multiple):
+        return _has_validators(field.field, test, field_test)
+    return False
+
+
+def _is_io_bound(obj):
+    """Checks if a validator or field is marked as I/O bound."""
+    return getattr(obj, 'io_bound', False)
+
+
+def _is_batch_validator(validator):
+    return getattr(validator, 'batch', False)
+
+
+def _find_field_path(root, field):
+    """Returns the path (a tuple of keys) of a field in the mappings below
+    `root` or `None` if it's not there.
+    """
+    if root is field:
+        return ()
+    if isinstance(root, Mapping):
+        for name, child in root.fields.iteritems():
+            path = _find_field_path(child, field)
+            if path is not None:
+                return (name,) + path
+
+
+def _apply_batch_validator(validator, form, values):
+    """Calls a batch validator and returns a list of ``(pos, error)``
+    tuples for the invalid values.  A `ValueError` is raised if the
+    validator reports an error for a position that is not in the list.
+    """
+    try:
+        validator(form, values)
+    except MultipleValidationErrors, e:
+        for pos in e.errors:
+            if not isinstance(pos, (int, long)) or \
+               not 0 <= pos < len(values):
+                raise ValueError('batch validator %r reported an error '
+                                 'for position %r of %d values' %
+                                 (_get_validator_name(validator), pos,
+                                  len(values)))
+        return sorted(e.errors.iteritems())
+    except ValidationError, e:
+        return [(pos, e) for pos in xrange(len(values))]
+    return []
+
+
+class _BatchValidators(object):
+    """Collects the values for the batch validators of the items of a
+    `Multiple` field.
+    """
+
+    def __init__(self):
+        # the index of the item that is converted
+        self.index = None
+        # ``[field, validator, indices, values]`` lists by field and
+        # validator in the order they were added
+        self.groups = []
+        self._groups = {}
+
+    def add(self, field, validator, value):
+        key = (id(field), validator)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = [field, validator, [], []]
+            self.groups.append(group)
+        group[2].append(self.index)
+        group[3].append(value)
+
+    def apply(self, form, root, errors):
+        """Calls the batch validators and merges their errors into the
+        errors of the `Multiple` field.
+        """
+        for field, validator, indices, values in self.groups:
+            path = _find_field_path(root, field) or ()
+            for pos, error in _apply_batch_validator(validator, form,
+                                                     values):
+                _merge_error(errors, (indices[pos],) + path, error)
+
+
+def _get_pending(field):
+    """Returns the pending validator results of the form of a field if the
+    form is validated by `FormBase.validate_async`.
+    """
+    if field.form is not None:
+        return field.form._pending
+
+
+def _get_deadline(field):
+    """Returns the time when the budget of `FormBase.validate` runs out or
+    `None` if there is no budget.
+    """
+    if field.form is not None:
+        return field.form._deadline
+
+
+def _get_profiler(field):
+    """Returns the profiler of the form of a field or `None`."""
+    if field.form is not None:
+        return field.form.profiler
+
+
+def _get_validator_name(validator):
+    return getattr(validator, '__name__', None) or type(validator).__name__
+
+
+def _merge_error(errors, path, error):
+    """Adds an error for a path (a tuple of keys) to a dict of errors like
+    the one of a `MultipleValidationErrors`.
+    """
+    key = path[0]
+    if len(path) == 1:
+        errors.setdefault(key, error)
+        return
+    parent = errors.get(key)
+    if parent is None:
+        parent = errors[key] = MultipleValidationErrors({})
+    # if the parent itself is invalid the error of the child is dropped
+    # like it would be if the validators ran one after another
+    if isinstance(parent, MultipleValidationErrors):
+        _merge_error(parent.errors, path[1:], error)
+
+
+class _PendingTimeout(ValidationTimeout):
+    """Raised if the budget ran out while a pending result was waited for.
+    The field is the one of the result.  Its path is complete once the
+    exception reaches the form because mappings and lists prefix the paths
+    of the results on the way up.
+    """
+
+    def __init__(self, entry):
+        ValidationTimeout.__init__(self)
+        self.entry = entry
+
+    @property
+    def field(self):
+        return reduce(make_name, self.entry[0], None)
+
+
+class _PendingValidators(object):
+    """The pending results of validators for `FormBase.validate_async` and
+    of I/O bound validators.
+    The results are objects with a `result` method (like futures) that
+    return or raise a `ValidationError`.  If there are more than `limit`
+    results pending, the oldest one is waited for before more validators
+    are called.  If a `deadline` is set, the results are waited for until
+    then and a `ValidationTimeout` is raised afterwards.
+    """
+
+    def __init__(self, limit=None, defer_results=True):
+        self.limit = limit
+        # `validate` only collects the results of I/O bound validators
+        # and waits for results returned by other validators right away
+        self.defer_results = defer_results
+        self.deadline = None
+        # ``[path, result, error]`` lists in the order they were added
+        self.entries = []
+        self._waited = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def make_room(self):
+        """Waits for the oldest results until another one can be added.
+        This is called before a validator runs because the validator might
+        start its work before it returns the result.
+        """
+        if self.limit is not None:
+            while self._waited < len(self.entries) and \
+                  len(self.entries) - self._waited >= self.limit:
+                self._wait_next()
+
+    def add(self, result):
+        self.entries.append([(), result, None])
+
+    def prefix(self, start, key):
+        """Prefixes the paths of the results added since `start` with a
+        key.  Mappings and lists call this for their items so that the
+        errors end up at the right field.
+        """
+        for idx in xrange(start, len(self.entries)):
+            entry = self.entries[idx]
+            entry[0] = (key,) + entry[0]
+
+    def _wait_next(self):
+        entry = self.entries[self._waited]
+        try:
+            if self.deadline is None:
+                entry[1].result()
+            else:
+                entry[1].result(max(self.deadline - time(), 0))
+        except ValidationError, e:
+            entry[2] = e
+        except Exception:
+            # futures raise their own exception if the timeout passed
+            if self.deadline is not None and time() >= self.deadline:
+                raise _PendingTimeout(entry)
+            raise
+        self._waited += 1
+        entry[1] = None
+
+    def wait(self):
+        """Waits for all results and returns ``(path, error)`` tuples for
+        the ones that failed.  Afterwards the results are forgotten.
+        """
+        while self._waited < len(self.entries):
+            self._wait_next()
+        rv = [(path, error) for path, result, error in self.entries
+              if error is not None]
+        del self.entries[:]
+        self._waited = 0
+        return rv
+
+
+class _BackgroundCaptchaCheck(object):
+    """Runs a captcha verification in a thread of a pool.  The pool limits
+    the number of checks that run at once, also for forms that were
+    abandoned.  If the check is cancelled before a thread started the
+    verification, the verify server is never contacted.
+    """
+
+    def __init__(self, pool, verify, args):
+        self.args = args
+        self.cancelled = False
+        self._result = pool.submit(self._run, verify)
+
+    def _run(self, verify):
+        if not self.cancelled:
+            return verify(*self.args)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self):
+        """Waits for the verification and returns the result."""
+        return self._result.result()
+
+
+def _get_class_default(cls, name):
+    """Returns the class level default of a slotted attribute of a field
+    class.  Like a normal class attribute it's looked up in the classes of
+    the MRO, so defaults assigned to a base class later are inherited.
+    """
+    for base in cls.__mro__:
+        own = base.__dict__
+        defaults = own.get('_defaults')
+        if defaults is not None and name in defaults:
+            return defaults[name]
+        value = own.get(name, _missing)
+        if value is not _missing and type(value) is not _slot_descriptor:
+            if hasattr(value, '__get__'):
+                return value.__get__(None, cls)
+            return value
+    raise AttributeError(name)
+
+
+class _ClassDefault(object):
+    """Set on `FieldMeta` for every slot with a class level default so
+    that reading the attribute from a field class (``TextField.widget``)
+    returns the default instead of the slot descriptor.  Assigning to the
+    class attribute changes the default of that class and its subclasses.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, cls, metacls=None):
+        if cls is None:
+            return self
+        return _get_class_default(cls, self.name)
+
+    def __set__(self, cls, value):
+        cls.__dict__['_defaults'][self.name] = value
+
+
 class FieldMeta(type):
+    """Meta class for fields.  Merges the messages of the base classes and
+    keeps class level defaults of slotted attributes out of the way of the
+    slot descriptors.
+    """
 
     def __new__(cls, name, bases, d):
         messages = {}
+        defaults = {}
+        slots = set()
+        used_slots = set()
         for base in reversed(bases):
-            if hasattr(base, 'messages'):
-                messages.update(base.messages)
+            if isinstance(base, FieldMeta):
+                messages.update(_get_class_default(base, 'messages'))
+            slots.update(getattr(base, '_slots', ()))
+            used_slots.update(getattr(base, '_used_slots', ()))
         if 'messages' in d:
             messages.update(d['messages'])
         d['messages'] = messages
-        return type.__new__(cls, name, bases, d)
+
+        # builtin fields store their instance attributes in slots.  A class
+        # attribute with the name of a slot (like ``widget = TextInput``)
+        # would hide the slot descriptor, so these values are moved into
+        # the own `_defaults` of the class where `Field.__init__` and
+        # `Field.__getattr__` pick them up.  `_ClassDefault` returns them if
+        # they are read from the class.  All slots are declared on `Field`
+        # so that fields can be combined as bases.  Subclasses that don't
+        # define `__slots__` get a regular instance dict for additional
+        # attributes.
+        own_slots = d.get('__slots__', ())
+        if isinstance(own_slots, basestring):
+            own_slots = (own_slots,)
+        slots.update(own_slots)
+        for key in slots:
+            if key in d and not hasattr(d[key], '__get__'):
+                defaults[key] = d.pop(key)
+            if key in defaults and \
+               not isinstance(getattr(cls, key, None), _ClassDefault):
+                setattr(cls, key, _ClassDefault(key))
+        d['_defaults'] = defaults
+        d['_slots'] = tuple(sorted(slots))
+
+        # `Field._copy` copies the slots through their descriptors because
+        # attribute access would fall back to the class defaults.  Classes
+        # with `__slots__` list the slots they assign in `_used_slots`,
+        # the others might assign any slot.
+        if '__slots__' in d:
+            used_slots.update(d.get('_used_slots', own_slots))
+            d['_used_slots'] = tuple(sorted(used_slots))
+        else:
+            used_slots = slots
+        rv = type.__new__(cls, name, bases, d)
+        descriptors = {}
+        for base in reversed(rv.__mro__):
+            for key, value in base.__dict__.iteritems():
+                if type(value) is _slot_descriptor:
+                    descriptors[key] = value
+        rv._slot_descriptors = tuple(descriptors[key]
+                                     for key in sorted(used_slots))
+        return rv
 
 
 class Field(object):
     """Abstract field base class."""
 
     __metaclass__ = FieldMeta
+    # the slots of all builtin fields.  Python can't combine two bases that
+    # both add slots, so the subclasses don't add their own but list the
+    # ones they assign in `_used_slots`.
+    __slots__ = ('_position_hint', 'label', 'help_text', 'validators',
+                 'custom_converter', 'widget', 'messages', 'sentinel', 'form',
+                 'io_bound', 'required', 'fields', 'form_class', 'field',
+                 'min_size', 'max_size', 'sep', 'min_length', 'max_length',
+                 'min_value', 'max_value', 'choices', 'date_formats',
+                 'time_formats', '_tzinfo', '_item_validators')
+    _used_slots = ('_position_hint', 'label', 'help_text', 'validators',
+                   'custom_converter', 'widget', 'messages', 'sentinel',
+                   'form', 'io_bound')
     messages = dict(required=None)
     form = None
+
+    # if this is set all validators of the field run in the thread pool of
+    # the form like validators marked with `io_bound`.
+    io_bound = False
     widget = widgets.TextInput
 
     # these attributes are used by the widgets to get an idea what
@@ -115,15 +723,22 @@ class Field(object):
             validators = []
         self.validators = validators
         self.custom_converter = None
-        if widget is not None:
-            self.widget = widget
+        if widget is None:
+            widget = _get_class_default(self.__class__, 'widget')
+        self.widget = widget
+        self.messages = _get_class_default(self.__class__, 'messages')
         if messages:
             self.messages = self.messages.copy()
             self.messages.update(messages)
         self.sentinel = sentinel
+        self.form = None
         assert not issubclass(self.widget, widgets.InternalWidget), \
             'can\'t use internal widgets as widgets for fields'
 
+    def __getattr__(self, name):
+        # slots that were never assigned fall back to the class defaults
+        return _get_class_default(self.__class__, name)
+
     def gettext(self, string):
         if self.form is None:
             return string
@@ -143,10 +758,48 @@ class Field(object):
         return _bind(self, None, None)
 
     def apply_validators(self, value):
-        """Applies all validators on the value."""
+        """Applies all validators on the value.  Validators can return a
+        `PendingResult` instead of raising errors right away.  `validate`
+        waits for the result immediately, `validate_async` only after all
+        fields are converted.
+
+        I/O bound validators are submitted to the thread pool of the form
+        after the other validators passed.  The form waits for them once
+        all fields are converted.
+        """
         if self.should_validate(value):
+            pending = _get_pending(self)
+            deadline = _get_deadline(self)
+            profiler = _get_profiler(self)
+            deferred = None
             for validate in self.validators:
-                validate(self.form, value)
+                if deadline is not None and time() > deadline:
+                    raise ValidationTimeout()
+                if pending is not None and \
+                   (self.io_bound or getattr(validate, 'io_bound', False)):
+                    if deferred is None:
+                        deferred = []
+                    deferred.append(validate)
+                    continue
+                if pending is not None:
+                    pending.make_room()
+                if getattr(validate, 'batch', False):
+                    self._apply_batch_validator(validate, value)
+                    continue
+                if profiler is None:
+                    rv = validate(self.form, value)
+                else:
+                    rv = self._profile_validator(profiler, validate, value)
+                if isinstance(rv, PendingResult):
+                    if pending is None or not pending.defer_results:
+                        rv.result()
+                    else:
+                        pending.add(rv)
+            if deferred is not None:
+                pool = self.form._get_validator_pool()
+                for validate in deferred:
+                    pending.make_room()
+                    pending.add(pool.submit(validate, self.form, value))
 
     def empty_as_item(self, value):
         """Multiple fields use this method to decide if the field is
@@ -165,6 +818,29 @@ class Field(object):
         """
         return self.sentinel and not value
 
+    def _profile_validator(self, profiler, validate, value):
+        """Calls a validator in a frame of the profiler."""
+        depth = profiler.enter('validator', _get_validator_name(validate))
+        try:
+            return validate(self.form, value)
+        finally:
+            profiler.leave(depth)
+
+    def _apply_batch_validator(self, validate, value):
+        """Adds the value to the values of a batch validator if the field
+        is converted as part of a `Multiple` field, otherwise the validator
+        is called with just this value.
+        """
+        batch = None
+        if self.form is not None:
+            batch = self.form._batch
+        if batch is not None:
+            batch.add(self, validate, value)
+            return
+        errors = _apply_batch_validator(validate, self.form, [value])
+        if errors:
+            raise errors[0][1]
+
     def should_validate(self, value):
         """Per default validate if the value is not None.  This method is
         called before the custom validators are applied to not perform
@@ -182,6 +858,49 @@ class Field(object):
         """
         return _to_string(value)
 
+    def convert_column(self, values):
+        """Converts and validates a list of values with this field.  Returns
+        a list with the results (`None` for invalid values) and a dict of
+        the validation errors by index.  This is used by `Multiple` and
+        fields that can convert many values faster than one by one
+        override it.
+        """
+        result = []
+        errors = {}
+        for idx, value in enumerate(values):
+            try:
+                result.append(self(value))
+            except ValidationError, e:
+                result.append(None)
+                errors[idx] = e
+        return result, errors
+
+    def _add_column_errors(self, errors, indices, key, get_message):
+        """Helper for `convert_column` that adds the error message for the
+        given key for all indices.
+        """
+        if not indices:
+            return
+        message = self.messages[key]
+        if message is None:
+            message = get_message()
+        for idx in indices:
+            errors.setdefault(idx, ValidationError(message))
+
+    def _validate_column(self, result, errors):
+        """Helper for `convert_column` that applies the validators on all
+        values without errors.
+        """
+        if self.validators:
+            for idx, value in enumerate(result):
+                if idx not in errors:
+                    try:
+                        self.apply_validators(value)
+                    except ValidationError, e:
+                        result[idx] = None
+                        errors[idx] = e
+        return result, errors
+
     def to_primitive(self, value):
         """Convert a value into a primitve (string or a list/dict of lists,
         dicts or strings).
@@ -194,19 +913,33 @@ class Field(object):
         """Method that binds a field to a form. If `form` is None, a copy of
         the field is returned."""
         if form is not None and self.bound:
-            raise TypeError('%r already bound' % type(obj).__name__)
-        rv = object.__new__(self.__class__)
-        rv.__dict__.update(self.__dict__)
-        rv.validators = self.validators[:]
+            raise TypeError('%r already bound' % type(self).__name__)
+        rv = self._copy()
+        rv.validators = _order_validators(self.validators)
         rv.messages = self.messages.copy()
         if form is not None:
             rv.form = form
         return rv
 
+    def _copy(self, cls=None):
+        """Returns a shallow copy of the field.  If a class is given the
+        copy is an instance of that class instead.
+        """
+        rv = object.__new__(cls or self.__class__)
+        for slot in self._slot_descriptors:
+            try:
+                slot.__set__(rv, slot.__get__(self))
+            except AttributeError:
+                pass
+        # subclasses without `__slots__` have an instance dict
+        if self.__class__.__dictoffset__:
+            rv.__dict__.update(self.__dict__)
+        return rv
+
     @property
     def bound(self):
         """True if the form is bound."""
-        return 'form' in self.__dict__
+        return self.form is not None
 
     def __repr__(self):
         rv = object.__repr__(self)
@@ -227,6 +960,9 @@ class Mapping(Field):
     widget that is able to handle mapping structures.
     """
 
+    __slots__ = ()
+    _used_slots = ('fields',)
+
     widget = widgets.MappingWidget
 
     def __init__(self, *args, **fields):
@@ -243,6 +979,7 @@ class Mapping(Field):
         self.fields.sort(key=lambda i: i[1]._position_hint)
 
     def empty_as_item(self, values):
+        values = _force_dict(values)
         for name, field in self.fields.iteritems():
             if field.empty_as_item(values.get(name)):
                 return True
@@ -252,11 +989,29 @@ class Mapping(Field):
         value = _force_dict(value)
         errors = {}
         result = {}
+        pending = _get_pending(self)
+        deadline = _get_deadline(self)
+        profiler = _get_profiler(self)
         for name, field in self.fields.iteritems():
+            if deadline is not None and time() > deadline:
+                raise ValidationTimeout([name])
+            if pending is not None:
+                start = len(pending)
+            if profiler is not None:
+                depth = profiler.enter('field', name)
             try:
                 result[name] = field(value.get(name))
             except ValidationError, e:
                 errors[name] = e
+            except ValidationTimeout, e:
+                e.path.insert(0, name)
+                if pending is not None:
+                    pending.prefix(start, name)
+                raise
+            if profiler is not None:
+                profiler.leave(depth)
+            if pending is not None:
+                pending.prefix(start, name)
         if errors:
             raise MultipleValidationErrors(errors)
         return result
@@ -279,6 +1034,8 @@ class Mapping(Field):
 class FormMapping(Mapping):
     """Like a mapping but does csrf protection and stuff."""
 
+    __slots__ = ()
+
     widget = widgets.FormWidget
 
     def convert(self, value):
@@ -287,19 +1044,46 @@ class FormMapping(Mapping):
                             'to convert data')
         if self.form.csrf_protected:
             token = self.form.raw_data.get('_csrf_token')
-            if token != self.form.csrf_token:
+            if not self.form._check_csrf_token(token):
+                self.form.on_csrf_failure()
                 message = self.gettext(u'Form submitted multiple times or '
                                        u'session expired.  Try again.')
                 raise ValidationError(message)
-        if self.form.captcha_protected:
-            if not validate_recaptcha(
-                    self.form.recaptcha_private_key,
-                    self.form.raw_data.get('recaptcha_challenge_field'),
-                    self.form.raw_data.get('recaptcha_response_field'),
-                    self.form._get_remote_addr()):
-                message = self.gettext('You entered an invalid captcha.')
-                raise ValidationError(message)
-        return Mapping.convert(self, value)
+        # captchas verified in the background are only waited for if the
+        # fields are valid
+        check_captcha = self.form.captcha_protected
+        if check_captcha and not self.form.recaptcha_background:
+            self._check_captcha()
+            check_captcha = False
+        pending = _get_pending(self)
+        if pending is None:
+            rv = Mapping.convert(self, value)
+        else:
+            rv = self._convert_and_wait(value, pending)
+        if check_captcha:
+            self._check_captcha()
+        return rv
+
+    def _convert_and_wait(self, value, pending):
+        """Converts the fields and waits for the pending validators of
+        them, the errors are merged with the errors of the conversion.
+        """
+        errors = {}
+        try:
+            rv = Mapping.convert(self, value)
+        except MultipleValidationErrors, e:
+            errors = e.errors
+        for path, error in pending.wait():
+            _merge_error(errors, path, error)
+        if errors:
+            raise MultipleValidationErrors(errors)
+        return rv
+
+    def _check_captcha(self):
+        if not self.form._verify_captcha():
+            self.form.on_captcha_failure()
+            message = self.gettext('You entered an invalid captcha.')
+            raise ValidationError(message)
 
 
 class FormAsField(Mapping):
@@ -309,6 +1093,9 @@ class FormAsField(Mapping):
     :attr:`form_class` that points to the form class it was created from.
     """
 
+    __slots__ = ()
+    _used_slots = ('form_class',)
+
     def __init__(self):
         raise TypeError('can\'t create %r instances' %
                         self.__class__.__name__)
@@ -329,6 +1116,9 @@ class Multiple(Field):
     -   `SelectBoxWidget` -- useful in combination with choices
     """
 
+    __slots__ = ()
+    _used_slots = ('field', 'min_size', 'max_size', '_item_validators')
+
     widget = widgets.ListWidget
     messages = dict(too_small=None, too_big=None)
     validate_on_omission = True
@@ -339,13 +1129,14 @@ class Multiple(Field):
         self.field = field
         self.min_size = min_size
         self.max_size = max_size
+        self._item_validators = None
 
     @property
     def multiple_choices(self):
         return self.max_size is None or self.max_size > 1
 
     def empty_as_item(self, values):
-        for idx, value in enumerate(values):
+        for idx, value in enumerate(_force_list(values)):
             if self.field.empty_as_item(value):
                 return True
         return False
@@ -372,13 +1163,62 @@ class Multiple(Field):
                     u'Please provide no more than %d items.',
                     self.max_size) % self.max_size
             raise ValidationError(message)
+        # with pending validators, batch validators or a time budget the
+        # items are converted one by one
+        pending = _get_pending(self)
+        io_bound = batch = False
+        if self.form is not None:
+            io_bound, batch = self._item_validators
+        if batch or _get_deadline(self) is not None or \
+           (pending is not None and (io_bound or pending.defer_results)):
+            return self._convert_items(value, pending, batch)
+        result, errors = self.field.convert_column([item for idx, item
+                                                    in value])
+        if errors:
+            raise MultipleValidationErrors(dict((value[pos][0], error)
+                                                for pos, error
+                                                in errors.iteritems()))
+        return result
+
+    def _convert_items(self, value, pending, batch_validators=False):
+        """Converts the items one by one so that the pending validator
+        results get the index of their item, the values of the batch
+        validators are collected (if the items have batch validators) and
+        the time budget is checked.
+        """
         result = []
         errors = {}
-        for idx, item in value:
-            try:
-                result.append(self.field(item))
-            except ValidationError, e:
-                errors[idx] = e
+        form = self.form
+        deadline = _get_deadline(self)
+        batch = None
+        if batch_validators:
+            batch = _BatchValidators()
+            old_batch = form._batch
+            form._batch = batch
+        try:
+            for idx, item in value:
+                if deadline is not None and time() > deadline:
+                    raise ValidationTimeout([idx])
+                if pending is not None:
+                    start = len(pending)
+                if batch is not None:
+                    batch.index = idx
+                try:
+                    result.append(self.field(item))
+                except ValidationError, e:
+                    errors[idx] = e
+                except ValidationTimeout, e:
+                    e.path.insert(0, idx)
+                    if pending is not None:
+                        pending.prefix(start, idx)
+                    raise
+                if pending is not None:
+                    pending.prefix(start, idx)
+        finally:
+            if batch is not None:
+                form._batch = old_batch
+        if batch is not None:
+            batch.apply(form, self.field, errors)
         if errors:
             raise MultipleValidationErrors(errors)
         return result
@@ -387,6 +1227,12 @@ class Multiple(Field):
         return map(self.field.to_primitive, _force_list(value))
 
     def _bind(self, form, memo):
+        if self._item_validators is None:
+            # the validators of the items are checked once per field, the
+            # copy inherits the result
+            self._item_validators = (
+                _has_validators(self.field, _is_io_bound, _is_io_bound),
+                _has_validators(self.field, _is_batch_validator))
         rv = Field._bind(self, form, memo)
         rv.field = _bind(self.field, form, memo)
         return rv
@@ -403,6 +1249,9 @@ class CommaSeparated(Multiple):
     choices as well.
     """
 
+    __slots__ = ()
+    _used_slots = ('sep',)
+
     widget = widgets.TextInput
 
     def __init__(self, field, label=None, help_text=None, min_size=None,
@@ -435,6 +1284,7 @@ class LineSeparated(Multiple):
     The default widget is a `Textarea` and taht is pretty much the only thing
     that makes sense for this widget.
     """
+    __slots__ = ()
     widget = widgets.Textarea
 
     def convert(self, value):
@@ -462,6 +1312,9 @@ class TextField(Field):
     ValidationError: This field is required.
     """
 
+    __slots__ = ()
+    _used_slots = ('required', 'min_length', 'max_length')
+
     messages = dict(too_short=None, too_long=None)
 
     def __init__(self, label=None, help_text=None, required=False,
@@ -508,6 +1361,8 @@ class TextField(Field):
 class PasswordField(TextField):
     """A special :class:`TextField` for passwords."""
 
+    __slots__ = ()
+
     widget = widgets.PasswordInput
 
 
@@ -524,6 +1379,9 @@ class DateTimeField(Field):
     ValidationError: Please enter a valid date.
     """
 
+    __slots__ = ()
+    _used_slots = ('required', '_tzinfo', 'date_formats', 'time_formats')
+
     messages = dict(invalid_date=None)
 
     def __init__(self, label=None, help_text=None, required=False,
@@ -538,7 +1396,13 @@ class DateTimeField(Field):
     @property
     def tzinfo(self):
         tzinfo = self._tzinfo
-        return tzinfo() if hasattr(tzinfo, '__call__') else tzinfo
+        if not hasattr(tzinfo, '__call__'):
+            return tzinfo
+        # bound fields resolve the timezone once per validation or
+        # rendering of the form, not for every value.
+        if self.form is not None:
+            return self.form._resolve_timezone(tzinfo)
+        return tzinfo()
 
     def convert(self, value):
         if isinstance(value, datetime):
@@ -561,6 +1425,17 @@ class DateTimeField(Field):
                 message = self.gettext('Please enter a valid date.')
             raise ValidationError(message)
 
+    def convert_column(self, values):
+        if _overrides(self, DateTimeField, '__call__', 'convert'):
+            return Field.convert_column(self, values)
+        tzinfo = self.tzinfo
+
+        def parse(value):
+            return parse_datetime(value, tzinfo=tzinfo,
+                                  date_formats=self.date_formats,
+                                  time_formats=self.time_formats)
+        return _convert_date_column(self, values, datetime, parse, tzinfo)
+
     def to_primitive(self, value):
         if isinstance(value, datetime):
             value = format_system_datetime(value, tzinfo=self.tzinfo)
@@ -580,6 +1455,9 @@ class DateField(Field):
     ValidationError: Please enter a valid date.
     """
 
+    __slots__ = ()
+    _used_slots = ('required', 'date_formats')
+
     messages = dict(invalid_date=None)
 
     def __init__(self, label=None, help_text=None, required=False,
@@ -608,12 +1486,59 @@ class DateField(Field):
                 message = self.gettext('Please enter a valid date.')
             raise ValidationError(message)
 
+    def convert_column(self, values):
+        if _overrides(self, DateField, '__call__', 'convert'):
+            return Field.convert_column(self, values)
+
+        def parse(value):
+            return parse_date(value, date_formats=self.date_formats)
+        return _convert_date_column(self, values, date, parse)
+
     def to_primitive(self, value):
         if isinstance(value, date):
             value = format_system_date(value)
         return value
 
 
+def _convert_date_column(field, values, value_type, parse, tzinfo=None):
+    """Implements `convert_column` for the date fields.  Values in the ISO
+    format are parsed together, the others one by one with `parse`.
+    """
+    result = [None] * len(values)
+    errors = {}
+    required = []
+    strings = []
+    positions = []
+    for idx, value in enumerate(values):
+        if isinstance(value, value_type):
+            result[idx] = value
+            continue
+        value = _to_string(value)
+        if value:
+            strings.append(value)
+            positions.append(idx)
+        elif field.required:
+            required.append(idx)
+    field._add_column_errors(errors, required, 'required', lambda:
+                             field.gettext(u'This field is required.'))
+
+    invalid = []
+    parsed = _parse_iso_column(strings, with_time=value_type is datetime)
+    for pos, string, value in izip(positions, strings, parsed):
+        if value is None:
+            try:
+                value = parse(string)
+            except ValueError:
+                invalid.append(pos)
+                continue
+        elif tzinfo:
+            value = to_utc(value, tzinfo)
+        result[pos] = value
+    field._add_column_errors(errors, invalid, 'invalid_date', lambda:
+                             field.gettext('Please enter a valid date.'))
+    return field._validate_column(result, errors)
+
+
 class ChoiceField(Field):
     """A field that lets a user select one out of many choices.
 
@@ -665,6 +1590,9 @@ class ChoiceField(Field):
     ...                                              ('1', u'Something')])
     """
 
+    __slots__ = ()
+    _used_slots = ('required', 'choices')
+
     widget = widgets.SelectBox
     messages = dict(invalid_choice=None)
 
@@ -700,6 +1628,9 @@ class ChoiceField(Field):
 class MultiChoiceField(ChoiceField):
     """A field that lets a user select multiple choices."""
 
+    __slots__ = ()
+    _used_slots = ('min_size', 'max_size')
+
     multiple_choices = True
     messages = dict(too_small=None, too_big=None)
     validate_on_omission = True
@@ -775,6 +1706,9 @@ class FloatField(Field):
     ValidationError: Ensure this value is less than or equal to 99.9.
     """
 
+    __slots__ = ()
+    _used_slots = ('required', 'min_value', 'max_value')
+
     messages = dict(
         too_small=None,
         too_big=None,
@@ -822,6 +1756,55 @@ class FloatField(Field):
 
         return float(value)
 
+    def convert_column(self, values):
+        if _overrides(self, FloatField, '__call__', 'convert'):
+            return Field.convert_column(self, values)
+        return _convert_number_column(
+            self, values, float, 'no_float',
+            lambda: self.gettext(u'Please enter a floating-point number.'))
+
+
+def _convert_number_column(field, values, number_type, invalid_key,
+                           get_invalid_message):
+    """Implements `convert_column` for the number fields.  The range checks
+    are done for all numbers at once.  `get_invalid_message` returns the
+    translated message for values that are no numbers.
+    """
+    result = [None] * len(values)
+    errors = {}
+    required = []
+    strings = []
+    positions = []
+    for idx, value in enumerate(values):
+        value = _to_string(value)
+        if value:
+            strings.append(value)
+            positions.append(idx)
+        elif field.required:
+            required.append(idx)
+    field._add_column_errors(errors, required, 'required', lambda:
+                             field.gettext(u'This field is required.'))
+
+    numbers, invalid = _convert_numbers(strings, number_type)
+    too_small, too_big = _find_out_of_range(numbers, field.min_value,
+                                            field.max_value, invalid)
+    field._add_column_errors(errors, [positions[x] for x in invalid],
+                             invalid_key, get_invalid_message)
+    field._add_column_errors(errors, [positions[x] for x in too_small],
+                             'too_small', lambda:
+                             field.gettext(u'Ensure this value is greater '
+                                           u'than or equal to %s.') %
+                             field.min_value)
+    field._add_column_errors(errors, [positions[x] for x in too_big],
+                             'too_big', lambda:
+                             field.gettext(u'Ensure this value is less than '
+                                           u'or equal to %s.') %
+                             field.max_value)
+    for pos, number in izip(positions, numbers):
+        if pos not in errors:
+            result[pos] = number
+    return field._validate_column(result, errors)
+
 
 class IntegerField(Field):
     """Field for integers.
@@ -841,6 +1824,9 @@ class IntegerField(Field):
     ValidationError: Ensure this value is less than or equal to 99.
     """
 
+    __slots__ = ()
+    _used_slots = ('required', 'min_value', 'max_value')
+
     messages = dict(
         too_small=None,
         too_big=None,
@@ -888,6 +1874,13 @@ class IntegerField(Field):
 
         return int(value)
 
+    def convert_column(self, values):
+        if _overrides(self, IntegerField, '__call__', 'convert'):
+            return Field.convert_column(self, values)
+        return _convert_number_column(
+            self, values, int, 'no_integer',
+            lambda: self.gettext(u'Please enter a whole number.'))
+
 
 class BooleanField(Field):
     """Field for boolean values.
@@ -901,6 +1894,8 @@ class BooleanField(Field):
     False
     """
 
+    __slots__ = ()
+
     widget = widgets.Checkbox
     validate_on_omission = True
     choices = [u'True', u'False']
@@ -941,11 +1936,17 @@ class FormMeta(type):
             if field_name in fields:
                 fields[field_name].validators.append(func)
 
+        # compile the redirect rules once for the class
+        rules = d.get('allowed_redirect_rules')
+        if rules is not None and not isinstance(rules, RedirectRules):
+            d['allowed_redirect_rules'] = RedirectRules(rules)
+
         d['_root_field'] = root = FormMapping(**fields)
         context_validate = d.get('context_validate')
         root.validators.extend(root_validator_functions)
         if context_validate is not None:
             root.validators.append(context_validate)
+        d['_io_bound'] = _has_validators(root, _is_io_bound, _is_io_bound)
 
         return type.__new__(cls, name, bases, d)
 
@@ -954,8 +1955,8 @@ class FormMeta(type):
         is independent of the form and can be modified in the same manner as
         a bound field.
         """
-        field = object.__new__(FormAsField)
-        field.__dict__.update(cls._root_field.__dict__)
+        field = cls._root_field._copy(FormAsField)
+        field.widget = FormAsField.widget
         field.form_class = cls
         field.validators = cls._root_field.validators[:]
         field.fields = cls._root_field.fields.copy()
@@ -1093,7 +2094,14 @@ class FormBase(object):
 
     Forms can be recaptcha protected by setting `captcha_protected` to `True`.
     If captcha protection is enabled the captcha has to be rendered from the
-    widget created, like a field.
+    widget created, like a field.  To verify captchas over pooled connections
+    with timeouts set `recaptcha_verifier` to a shared
+    :class:`~fungiform.recaptcha.RecaptchaVerifier`.  If `recaptcha_background`
+    is enabled the captcha is verified in the thread pool of the validators
+    while the fields are validated, and the result is only waited for if all
+    fields are valid.
+    The result of a verification is remembered by the form, so validating
+    the same data twice only verifies once.
 
     Forms are CSRF protected if they are created in the context of an active
     request or if an request is passed to the constructor.  In order for the
@@ -1101,10 +2109,29 @@ class FormBase(object):
 
     The consequence of that is that the application must not ignore session
     changes.
+
+    If `signed_csrf_tokens` is set to `True` the CSRF tokens are signed with
+    a per-session secret instead and carry their own expiration time.  The
+    session is then only written once to store that secret (or never if
+    `_get_csrf_secret` is overridden) and tokens stay valid for
+    `csrf_token_lifetime` seconds.  To accept every token only once a
+    :class:`~fungiform.csrf.ReplayCache` can be set as `csrf_replay_cache`.
+    Make it big enough for the tokens used within `csrf_token_lifetime`, a
+    full cache rejects the tokens of all sessions and a single session may
+    only fill a limited share of it.
+
+    Alternatively the tokens can be kept in a
+    :class:`~fungiform.csrf.TokenStore` that is set as `csrf_token_store`.
+    Then the session only stores the secret the keys in the store are
+    derived from.
     """
     __metaclass__ = FormMeta
 
     csrf_protected = None
+    signed_csrf_tokens = False
+    csrf_token_lifetime = CSRF_TOKEN_LIFETIME
+    csrf_replay_cache = None
+    csrf_token_store = None
     redirect_tracking = True
     allowed_redirect_rules = None
     captcha_protected = False
@@ -1114,6 +2141,27 @@ class FormBase(object):
     recaptcha_public_key = None
     recaptcha_private_key = None
     recaptcha_use_ssl = True
+    recaptcha_verifier = None
+    recaptcha_background = False
+
+    # the number of validator results `validate_async` waits for at once
+    max_pending_validators = 10
+
+    # the default time budget for `validate` in seconds
+    validation_budget = None
+
+    # a `fungiform.profiling.Profiler` that records the time spent in
+    # fields, validators and widgets
+    profiler = None
+
+    # an object with the `on_*` event methods of the form (like a
+    # `fungiform.metrics.FormMetrics`) that is notified of the events
+    metrics = None
+
+    # the thread pool for I/O bound validators, any object with a `submit`
+    # method like `concurrent.futures.ThreadPoolExecutor` works.  If not
+    # set a pool shared by all forms is used.
+    validator_pool = None
 
     def __init__(self, initial=None, action=None, request_info=None):
         if request_info is None:
@@ -1124,6 +2172,12 @@ class FormBase(object):
         self.initial = initial
         self.action = action
         self.invalid_redirect_targets = set()
+        self._captcha_results = {}
+        self._captcha_check = None
+        self._timezones = {}
+        self._pending = None
+        self._batch = None
+        self._deadline = None
 
         if self.request_info is not None:
             if self.csrf_protected is None:
@@ -1149,6 +2203,7 @@ class FormBase(object):
 
     def as_widget(self):
         """Return the form as widget."""
+        self._timezones.clear()
         # if there is submitted data, use that for the widget
         if self.raw_data is not None:
             data = self.raw_data
@@ -1189,7 +2244,19 @@ class FormBase(object):
         if not self.csrf_protected:
             raise AttributeError('no csrf token because form not '
                                  'csrf protected')
-        return get_csrf_token(self._get_session(), self.action)
+        if self.signed_csrf_tokens:
+            return get_signed_csrf_token(self._get_csrf_secret(), self.action,
+                                         self.csrf_token_lifetime)
+        return get_csrf_token(self._get_session(), self.action,
+                              store=self.csrf_token_store)
+
+    def _check_csrf_token(self, token):
+        """Checks if the submitted token is valid for this form."""
+        if self.signed_csrf_tokens:
+            return check_signed_csrf_token(self._get_csrf_secret(),
+                                           self.action, token,
+                                           self.csrf_replay_cache)
+        return token == self.csrf_token
 
     @property
     def is_valid(self):
@@ -1199,8 +2266,57 @@ class FormBase(object):
     @property
     def has_changed(self):
         """True if the form has changed."""
-        return self._root_field.to_primitive(self.initial) != \
-               self._root_field.to_primitive(self.data)
+        return bool(self._changed_paths)
+
+    @property
+    def changed_fields(self):
+        """A set with the names of the fields that differ from the initial
+        data.  Nested fields are named like in `errors` and their parents
+        are included.  The changes are recorded by `validate`.
+        """
+        rv = set()
+        for path in self._changed_paths:
+            name = None
+            for key in path:
+                name = make_name(name, key)
+                rv.add(name)
+        return rv
+
+    def changes(self):
+        """Returns a dict with only the data that differs from the initial
+        data.  For nested mappings only the changed keys are included:
+
+        >>> class UserForm(FormBase):
+        ...     name = TextField()
+        ...     address = Mapping(street=TextField(), city=TextField())
+        >>> form = UserForm({'name': u'John', 'address': {
+        ...     'street': u'Main Street', 'city': u'Vienna'}})
+        >>> form.validate({'name': u'John', 'address.street': u'Main Street',
+        ...                'address.city': u'Graz'})
+        True
+        >>> form.changes()
+        {'address': {'city': u'Graz'}}
+        >>> sorted(form.changed_fields)
+        ['address', 'address.city']
+        """
+        rv = {}
+        for path in self._changed_paths:
+            source = self.data
+            target = rv
+            for key in path[:-1]:
+                source = source[key]
+                target = target.setdefault(key, {})
+            target[path[-1]] = source.get(path[-1])
+        return rv
+
+    def _record_changes(self):
+        """Finds the changes of the data against the initial data."""
+        changes = []
+        for key, field in self._root_field.fields.iteritems():
+            _diff_primitives(field.to_primitive(self.initial.get(key)),
+                             field.to_primitive(self.data.get(key)),
+                             (key,), changes)
+        self._changed_paths = changes
 
     @property
     def fields(self):
@@ -1215,6 +2331,8 @@ class FormBase(object):
         self.data = self.initial.copy()
         self.errors = {}
         self.raw_data = None
+        self.timed_out_field = None
+        self._changed_paths = []
 
     def add_error(self, error, field=None):
         """Adds an error to a field."""
@@ -1223,48 +2341,207 @@ class FormBase(object):
             seq = self.errors[field] = widgets.ErrorList(self)
         seq.append(error)
 
-    def validate(self, data=None, from_flat=True):
+    def validate(self, data=None, from_flat=True, budget=None):
         """Validate the form against the data passed.  If no data is provided
         the form data of the current request is taken.  By default a flat
         representation of the data is assumed.  If you already have a non-flat
         representation of the data (JSON for example) you can disable that
         with ``from_flat=False``.
+
+        If a `budget` in seconds is given (or `validation_budget` is set) the
+        validation is aborted with a form level error once it took longer.
+        The time is checked before every field, list item and validator is
+        started, so a single slow validator still runs to its end and a
+        validation that finished is never aborted.  Pending results (of I/O
+        bound validators or `validate_async`) are only waited for until the
+        budget runs out.  The name of the first field that was not
+        validated is stored as `timed_out_field`.
         """
+        start = time()
+        if budget is None:
+            budget = self.validation_budget
         if data is None:
             data = self._autodiscover_data()
         if from_flat:
-            data = decode_form_data(data)
+            # only indices as top level keys decode to a list
+            data = _force_dict(decode_form_data(data))
         self.raw_data = data
-
-        # for each field in the root that requires validation on value
-        # omission we add `None` into the raw data dict.  Because the
-        # implicit switch between initial data and user submitted data
-        # only happens on the "root level" for obvious reasons we only
-        # have to hook the data in here.
-        for name, field in self._root_field.fields.iteritems():
-            if field.validate_on_omission and name not in self.raw_data:
-                self.raw_data.setdefault(name)
-
-        d = self.data.copy()
-        d.update(self.raw_data)
-        errors = {}
+        self.timed_out_field = None
+        self._timezones.clear()
+        self.on_validate_start()
+        valid = False
         try:
-            data = self._root_field(d)
-        except ValidationError, e:
-            errors = e.unpack(self)
-        self.errors = errors
+            # for each field in the root that requires validation on value
+            # omission we add `None` into the raw data dict.  Because the
+            # implicit switch between initial data and user submitted data
+            # only happens on the "root level" for obvious reasons we only
+            # have to hook the data in here.
+            for name, field in self._root_field.fields.iteritems():
+                if field.validate_on_omission and name not in self.raw_data:
+                    self.raw_data.setdefault(name)
+
+            d = self.data.copy()
+            d.update(self.raw_data)
+            errors = {}
+            if self.captcha_protected and self.recaptcha_background:
+                self._start_captcha_check()
+            pending = self._pending
+            if pending is None and self._io_bound:
+                self._pending = _PendingValidators(defer_results=False)
+            if budget is not None:
+                self._deadline = time() + budget
+            if self._pending is not None:
+                self._pending.deadline = self._deadline
+            profiler = self.profiler
+            if profiler is not None:
+                depth = profiler.enter('form', '%s.validate' %
+                                       self.__class__.__name__)
+            try:
+                try:
+                    data = self._root_field(d)
+                    if self._pending is not None:
+                        self._wait_for_root_validators()
+                except ValidationError, e:
+                    errors = e.unpack(self)
+                except ValidationTimeout, e:
+                    self.timed_out_field = e.field
+                    errors = ValidationError(self._get_translations().ugettext(
+                        u'The form could not be validated in time.')
+                    ).unpack(self)
+            finally:
+                self._pending = pending
+                self._deadline = None
+                if profiler is not None:
+                    profiler.leave(depth)
+                if self._captcha_check is not None:
+                    self._captcha_check.cancel()
+                    self._captcha_check = None
+            self.errors = errors
+
+            # every time we validate, we invalidate the csrf token if there
+            # was one.  Signed tokens are not stored and expire on their own.
+            if self.csrf_protected and not self.signed_csrf_tokens:
+                # FIXME: do we really want action here?
+                invalidate_csrf_token(self._get_session(), self.action,
+                                      self.csrf_token_store)
+
+            if not errors:
+                self.data.update(data)
+                self._record_changes()
+            for key, messages in errors.iteritems():
+                self.on_field_error(key, messages)
+            valid = not errors
+        finally:
+            self.on_validate_end(time() - start, valid)
+        return valid
+
+    def validate_async(self, data=None, from_flat=True, max_pending=None,
+                       budget=None):
+        """Like `validate` but validators can return a `PendingResult`
+        that wraps a future instead of checking the value right away.  The
+        results are waited for after all fields are converted, so slow
+        checks (like lookups in a database or on a remote service) that
+        were started by the validators run concurrently.  The `result`
+        method of the future must raise a `ValidationError` if the value
+        is invalid.
+
+        At most `max_pending` results (`max_pending_validators` by default)
+        are pending at once, if there are more the oldest one is waited for
+        first.  The `context_validate` method is only called once all
+        pending results of the fields are in.
+        """
+        if max_pending is None:
+            max_pending = self.max_pending_validators
+        self._pending = _PendingValidators(max_pending)
+        try:
+            return self.validate(data, from_flat, budget)
+        finally:
+            self._pending = None
+
+    def _get_validator_pool(self):
+        """Returns the thread pool for I/O bound validators."""
+        if self.validator_pool is not None:
+            return self.validator_pool
+        return _get_default_pool()
+
+    def _wait_for_root_validators(self):
+        """Waits for the pending results of the root validators."""
+        messages = []
+        for path, error in self._pending.wait():
+            messages.extend(error.messages)
+        if messages:
+            raise ValidationError(messages)
+
+    def _get_captcha_args(self):
+        """The arguments for the captcha verification."""
+        return (self.recaptcha_private_key,
+                self.raw_data.get('recaptcha_challenge_field'),
+                self.raw_data.get('recaptcha_response_field'),
+                self._get_remote_addr())
+
+    def _start_captcha_check(self):
+        """Starts verifying the captcha in a separate thread."""
+        args = self._get_captcha_args()
+        if args not in self._captcha_results:
+            verify = self.recaptcha_verifier or validate_recaptcha
+            self._captcha_check = _BackgroundCaptchaCheck(
+                self._get_validator_pool(), verify, args)
+
+    def _verify_captcha(self):
+        """Verifies the captcha of the submitted data.  The result is
+        remembered because challenges can only be verified once.
+        """
+        args = self._get_captcha_args()
+        rv = self._captcha_results.get(args)
+        if rv is None:
+            check = self._captcha_check
+            if check is not None and check.args == args:
+                rv = check.wait()
+            else:
+                verify = self.recaptcha_verifier or validate_recaptcha
+                rv = verify(*args)
+            self._captcha_results[args] = rv
+        return rv
 
-        # every time we validate, we invalidate the csrf token if there
-        # was one.
-        if self.csrf_protected:
-            # FIXME: do we really want action here?
-            invalidate_csrf_token(self._get_session(), self.action)
+    # events.  By default they are passed on to `metrics`
 
-        if errors:
-            return False
+    def on_validate_start(self):
+        """Called when `validate` starts, after `raw_data` is set."""
+        if self.metrics is not None:
+            self.metrics.on_validate_start(self)
 
-        self.data.update(data)
-        return True
+    def on_validate_end(self, duration, valid):
+        """Called when `validate` is done with the duration in seconds and
+        if the form was valid.  This is called even if a validator raised
+        an unexpected exception, the form is not valid then.
+        """
+        if self.metrics is not None:
+            self.metrics.on_validate_end(self, duration, valid)
+
+    def on_field_error(self, name, errors):
+        """Called after the validation with the dotted name and the
+        `ErrorList` of every field with errors.  Errors of the form itself
+        have the name `None`.
+        """
+        if self.metrics is not None:
+            self.metrics.on_field_error(self, name, errors)
+
+    def on_csrf_failure(self):
+        """Called if the CSRF token of a submission is invalid."""
+        if self.metrics is not None:
+            self.metrics.on_csrf_failure(self)
+
+    def on_captcha_failure(self):
+        """Called if the captcha of a submission is invalid."""
+        if self.metrics is not None:
+            self.metrics.on_captcha_failure(self)
+
+    def on_render(self, duration):
+        """Called when the form widget was rendered with the duration in
+        seconds.
+        """
+        if self.metrics is not None:
+            self.metrics.on_render(self, duration)
 
     # extra functionality that has to be implemented
 
@@ -1291,14 +2568,23 @@ class FormBase(object):
         """
         return None
 
+    def _get_url_context(self):
+        """Returns the :class:`~fungiform.redirects.URLContext` of the
+        request or `None` if there is no WSGI environment.  The context
+        is shared with everything else that uses the same environment.
+        """
+        env = self._get_wsgi_environ()
+        if env is not None:
+            return get_url_context(env)
+
     def _get_request_url(self):
         """Returns the current URL of the request.  When this is called,
         `self.request_info` is set to the request info passed or the
         one looked up by `_lookup_request_info`.
         """
-        env = self._get_wsgi_environ()
-        if env is not None:
-            return get_current_url(env)
+        context = self._get_url_context()
+        if context is not None:
+            return context.url
         return ''
 
     def _autodiscover_data(self):
@@ -1348,5 +2634,25 @@ class FormBase(object):
             'some features require access to the session.  If you want those, '
             'implement `_get_session`.')
 
+    def _get_csrf_secret(self):
+        """Returns the secret for signed CSRF tokens.  By default a random
+        secret is stored in the session.  Override this to derive the
+        secret from something else (like the session id and a secret key
+        of the application) to not touch the session at all.
+        """
+        return get_csrf_secret(self._get_session())
+
+    def _resolve_timezone(self, tzinfo):
+        """Called by fields with a callable as timezone.  The timezone is
+        looked up once per validation or rendering and cached on the form.
+        """
+        rv = self._timezones.get(tzinfo, _missing)
+        if rv is _missing:
+            rv = tzinfo()
+            if isinstance(rv, basestring):
+                rv = get_timezone(rv)
+            self._timezones[tzinfo] = rv
+        return rv
+
     def _get_remote_addr(self):
         return self._get_wsgi_environ()['REMOTE_ADDR']
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.metrics
+    ~~~~~~~~~~~~~~~~~
+
+    An in-process aggregator for the events of forms.  Set an instance of
+    `FormMetrics` as `metrics` on the form classes (or on `FormBase` for
+    all forms) and dump the counters and histograms in the Prometheus text
+    format from a metrics endpoint:
+
+    >>> from fungiform.forms import FormBase, TextField
+    >>> class LoginForm(FormBase):
+    ...     username = TextField(required=True)
+    ...
+    >>> LoginForm.metrics = metrics = FormMetrics(buckets=[0.1])
+    >>> LoginForm().validate({'username': u''})
+    False
+    >>> print metrics.snapshot()  # doctest: +ELLIPSIS
+    # HELP fungiform_validations_total Number of validated forms.
+    # TYPE fungiform_validations_total counter
+    fungiform_validations_total{form="LoginForm",result="invalid"} 1
+    # HELP fungiform_validation_seconds Time spent validating forms.
+    # TYPE fungiform_validation_seconds histogram
+    fungiform_validation_seconds_bucket{form="LoginForm",le="0.1"} 1
+    fungiform_validation_seconds_bucket{form="LoginForm",le="+Inf"} 1
+    fungiform_validation_seconds_sum{form="LoginForm"} ...
+    fungiform_validation_seconds_count{form="LoginForm"} 1
+    # HELP fungiform_field_errors_total Number of validation errors by field.
+    # TYPE fungiform_field_errors_total counter
+    fungiform_field_errors_total{form="LoginForm",field="username"} 1
+    ...
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import re
+from bisect import bisect_left
+from threading import Lock
+
+
+_index_re = re.compile(r'(?<=\.)\d+(?=\.|$)|^\d+(?=\.|$)')
+
+# the default histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0)
+
+
+def _escape_label(value):
+    return unicode(value).replace(u'\\', u'\\\\').replace(u'"', u'\\"') \
+                         .replace(u'\n', u'\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [u'%s="%s"' % (name, _escape_label(value))
+             for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(u'%s="%s"' % extra)
+    if not pairs:
+        return u''
+    return u'{%s}' % u','.join(pairs)
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return u'+Inf'
+    return unicode(repr(float(value)) if value != int(value)
+                   else int(value))
+
+
+def field_label(name):
+    """Returns the label for a field name in the metrics.  The indices of
+    list items are replaced by ``*`` so that the number of labels doesn't
+    grow with the number of items:
+
+    >>> field_label('addresses.3.street')
+    'addresses.*.street'
+    >>> field_label(None)
+    '__form__'
+    """
+    if name is None:
+        return '__form__'
+    return _index_re.sub('*', name)
+
+
+class Counter(object):
+    """A counter with labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = Lock()
+
+    def inc(self, labels=(), amount=1):
+        self._lock.acquire()
+        try:
+            self.values[labels] = self.values.get(labels, 0) + amount
+        finally:
+            self._lock.release()
+
+    def get(self, labels=()):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        self._lock.acquire()
+        try:
+            items = sorted(self.values.items())
+        finally:
+            self._lock.release()
+        for labels, value in items:
+            yield u'%s%s %s' % (self.name, _format_labels(self.labels,
+                                                          labels),
+                                _format_number(value))
+
+
+class Histogram(object):
+    """A histogram with labels and fixed buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # ``[bucket counts, sum, count]`` lists by label values
+        self.values = {}
+        self._lock = Lock()
+
+    def observe(self, labels, value):
+        self._lock.acquire()
+        try:
+            data = self.values.get(labels)
+            if data is None:
+                data = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+            pos = bisect_left(self.buckets, value)
+            if pos < len(self.buckets):
+                data[0][pos] += 1
+            data[1] += value
+            data[2] += 1
+        finally:
+            self._lock.release()
+
+    def samples(self):
+        self._lock.acquire()
+        try:
+            items = sorted((labels, (list(data[0]), data[1], data[2]))
+                           for labels, data in self.values.iteritems())
+        finally:
+            self._lock.release()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield u'%s_bucket%s %d' % (self.name, _format_labels(
+                    self.labels, labels, ('le', _format_number(bound))),
+                    cumulative)
+            yield u'%s_bucket%s %d' % (self.name, _format_labels(
+                self.labels, labels, ('le', u'+Inf')), count)
+            label_string = _format_labels(self.labels, labels)
+            yield u'%s_sum%s %s' % (self.name, label_string,
+                                    _format_number(total))
+            yield u'%s_count%s %d' % (self.name, label_string, count)
+
+
+class FormMetrics(object):
+    """Counts validations, field errors and failed CSRF and captcha checks
+    and records the time spent validating and rendering forms.  The
+    metrics are labeled with the name of the form class.  It's safe to
+    share one instance between threads.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.validations = Counter('fungiform_validations_total',
+                                   'Number of validated forms.',
+                                   ('form', 'result'))
+        self.validation_time = Histogram('fungiform_validation_seconds',
+                                         'Time spent validating forms.',
+                                         ('form',), buckets)
+        self.field_errors = Counter('fungiform_field_errors_total',
+                                    'Number of validation errors by field.',
+                                    ('form', 'field'))
+        self.csrf_failures = Counter('fungiform_csrf_failures_total',
+                                     'Number of failed CSRF checks.',
+                                     ('form',))
+        self.captcha_failures = Counter('fungiform_captcha_failures_total',
+                                        'Number of failed captcha checks.',
+                                        ('form',))
+        self.render_time = Histogram('fungiform_render_seconds',
+                                     'Time spent rendering forms.',
+                                     ('form',), buckets)
+        self.metrics = [self.validations, self.validation_time,
+                        self.field_errors, self.csrf_failures,
+                        self.captcha_failures, self.render_time]
+
+    def on_validate_start(self, form):
+        pass
+
+    def on_validate_end(self, form, duration, valid):
+        name = form.__class__.__name__
+        self.validations.inc((name, valid and 'valid' or 'invalid'))
+        self.validation_time.observe((name,), duration)
+
+    def on_field_error(self, form, name, errors):
+        self.field_errors.inc((form.__class__.__name__, field_label(name)))
+
+    def on_csrf_failure(self, form):
+        self.csrf_failures.inc((form.__class__.__name__,))
+
+    def on_captcha_failure(self, form):
+        self.captcha_failures.inc((form.__class__.__name__,))
+
+    def on_render(self, form, duration):
+        self.render_time.observe((form.__class__.__name__,), duration)
+
+    def snapshot(self):
+        """Returns the metrics in the Prometheus text format.  Metrics
+        without samples are left out.
+        """
+        lines = []
+        for metric in self.metrics:
+            samples = list(metric.samples())
+            if samples:
+                lines.append(u'# HELP %s %s' % (metric.name, metric.help))
+                lines.append(u'# TYPE %s %s' % (metric.name, metric.type))
+                lines.extend(samples)
+        return u'\n'.join(lines) + u'\n'
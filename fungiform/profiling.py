@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.profiling
+    ~~~~~~~~~~~~~~~~~~~
+
+    Records where the time of validating and rendering forms goes.  A
+    `Profiler` is attached to a form (or a form class) as `profiler`.
+    Forms without one only pay for a check if the attribute is set.
+
+    >>> from fungiform.forms import FormBase, TextField
+    >>> class LoginForm(FormBase):
+    ...     username = TextField()
+    ...
+    >>> profiler = Profiler()
+    >>> form = LoginForm()
+    >>> with profiler.profile(form):
+    ...     form.validate({'username': u'foo'})
+    True
+    >>> sorted(profiler.stats)
+    [('field', 'username'), ('form', 'LoginForm.validate')]
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+from time import time
+
+
+class _Profile(object):
+    """Context manager returned by `Profiler.profile`."""
+
+    def __init__(self, profiler, target):
+        self.profiler = profiler
+        self.target = target
+        self.old_profiler = None
+
+    def __enter__(self):
+        self.old_profiler = self.target.__dict__.get('profiler')
+        self.target.profiler = self.profiler
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.old_profiler is None:
+            del self.target.profiler
+        else:
+            self.target.profiler = self.old_profiler
+
+
+class Profiler(object):
+    """Collects wall time and call counts of fields, validators, widgets
+    and forms.  The stats are keyed by ``(kind, name)`` where the kind is
+    ``'form'``, ``'field'`` (the name is the dotted path of the field),
+    ``'validator'`` (the name of the validator function) or ``'widget'``
+    (the name of the widget class).  The values are ``[calls, seconds]``
+    lists.  The time of nested frames is included in the time of their
+    parents.
+
+    A profiler is not thread safe, use one per thread or request.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        # ``[calls, seconds]`` lists by the tuple of frame names
+        self.stacks = {}
+        # ``(kind, name, frame, obj, start)`` tuples
+        self._stack = []
+
+    def profile(self, target):
+        """Returns a context manager that attaches the profiler to a form
+        or form class while the block runs.
+        """
+        return _Profile(self, target)
+
+    def enter(self, kind, name, obj=None):
+        """Starts a frame and returns the depth of the stack before it.
+        Pass the depth to `leave` to end the frame and all frames started
+        after it.
+        """
+        stack = self._stack
+        depth = len(stack)
+        frame = name
+        if kind == 'field':
+            # fields are recorded by their full path
+            for entry in reversed(stack):
+                if entry[0] == 'field':
+                    name = '%s.%s' % (entry[1], name)
+                    break
+        elif kind != 'form':
+            frame = '%s:%s' % (kind, name)
+        stack.append((kind, name, frame, obj, time()))
+        return depth
+
+    def is_running(self, obj):
+        """Checks if the innermost frame is for `obj`."""
+        return bool(self._stack) and self._stack[-1][3] is obj
+
+    def leave(self, depth):
+        """Ends the frames down to `depth`."""
+        now = time()
+        stack = self._stack
+        while len(stack) > depth:
+            path = tuple(entry[2] for entry in stack)
+            kind, name, frame, obj, start = stack.pop()
+            elapsed = now - start
+            for key, mapping in ((kind, name), self.stats), \
+                                (path, self.stacks):
+                value = mapping.get(key)
+                if value is None:
+                    mapping[key] = [1, elapsed]
+                else:
+                    value[0] += 1
+                    value[1] += elapsed
+
+    def clear(self):
+        """Forgets all recorded frames."""
+        self.stats.clear()
+        self.stacks.clear()
+        del self._stack[:]
+
+    def report(self, limit=None):
+        """Returns a report as string with the stats sorted by total time
+        and at most `limit` lines.
+        """
+        items = sorted(self.stats.iteritems(), key=lambda x: -x[1][1])
+        if limit is not None:
+            items = items[:limit]
+        lines = ['%-10s %-40s %8s %12s %12s' % ('kind', 'name', 'calls',
+                                                'total ms', 'per call ms')]
+        for (kind, name), (calls, seconds) in items:
+            lines.append('%-10s %-40s %8d %12.3f %12.3f' % (
+                kind, name, calls, seconds * 1000, seconds * 1000 / calls))
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        """Returns the stacks in the collapsed format that flame graph
+        tools read: one line per stack with the frames separated by
+        semicolons and the time spent in the innermost frame itself in
+        microseconds.
+        """
+        own = dict((path, value[1]) for path, value
+                   in self.stacks.iteritems())
+        for path, (calls, seconds) in self.stacks.iteritems():
+            parent = path[:-1]
+            if parent in own:
+                own[parent] -= seconds
+        lines = []
+        for path in sorted(own):
+            lines.append('%s %d' % (';'.join(path),
+                                    max(0, int(own[path] * 1000000))))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<%s %d frames>' % (self.__class__.__name__,
+                                   sum(x[0] for x in self.stats.itervalues()))
@@ -8,9 +8,13 @@
     :copyright: (c) 2010 by the Fungiform Team.
     :license: BSD, see LICENSE for more details.
 """
-from fungiform.utils import Markup
-from urllib import urlencode
+import socket
+import httplib
 import urllib2
+from threading import Lock
+from urllib import urlencode
+from urlparse import urlsplit
+from fungiform.utils import Markup, LRUCache
 try:
     from simplejson import dumps
 except ImportError:
@@ -27,15 +31,54 @@ API_SERVER = 'http://api.recaptcha.net/'
 SSL_API_SERVER = 'https://api-secure.recaptcha.net/'
 VERIFY_SERVER = 'http://api-verify.recaptcha.net/verify'
 
+# seconds `validate_recaptcha` waits for the verify server
+VERIFY_TIMEOUT = 10
+
+#: the messages of the recaptcha widget that are translated
+_custom_translations = [
+    ('visual_challenge',    'Get a visual challenge'),
+    ('audio_challenge',     'Get an audio challenge'),
+    ('refresh_btn',         'Get a new challenge'),
+    ('instructions_visual', 'Type the two words:'),
+    ('instructions_audio',  'Type what you hear:'),
+    ('help_btn',            'Help'),
+    ('play_again',          'Play sound again'),
+    ('cant_hear_this',      'Download sound as MP3'),
+    ('incorrect_try_again', 'Incorrect. Try again.')
+]
+
+_untranslated_messages = tuple(unicode(msgid) for key, msgid
+                               in _custom_translations)
+
+#: the rendered HTML only depends on the arguments and the translated
+#: messages, so it's cached for all requests
+_html_cache = LRUCache(128)
+
 
 def get_recaptcha_html(public_key=None, use_ssl=True, error=None,
                        translations=None):
     """Returns the recaptcha input HTML."""
-    _ = translations and translations.ugettext or (lambda x: x)
+    if translations is None:
+        messages = _untranslated_messages
+    else:
+        messages = tuple(unicode(translations.ugettext(msgid))
+                         for key, msgid in _custom_translations)
+    if error is not None:
+        error = unicode(error)
+    cache_key = (public_key, use_ssl, error, messages)
+    rv = _html_cache.get(cache_key)
+    if rv is None:
+        rv = _render_recaptcha_html(public_key, use_ssl, error, messages)
+        _html_cache[cache_key] = rv
+    return rv
+
+
+def _render_recaptcha_html(public_key, use_ssl, error, messages):
+    """Renders the recaptcha HTML for `get_recaptcha_html`."""
     server = use_ssl and API_SERVER or SSL_API_SERVER
     options = dict(k=public_key.encode('utf-8'))
     if error is not None:
-        options['error'] = unicode(error).encode('utf-8')
+        options['error'] = error.encode('utf-8')
     query = urlencode(options)
     return Markup(u'''
     <script type="text/javascript">var RecaptchaOptions = %(options)s;</script>
@@ -52,34 +95,24 @@ def get_recaptcha_html(public_key=None, use_ssl=True, error=None,
         frame_url='%snoscript?%s' % (server, query),
         options=dumps({
             'theme':    'clean',
-            'custom_translations': {
-                'visual_challenge': _("Get a visual challenge"),
-                'audio_challenge': _("Get an audio challenge"),
-                'refresh_btn': _("Get a new challenge"),
-                'instructions_visual': _("Type the two words:"),
-                'instructions_audio': _("Type what you hear:"),
-                'help_btn': _("Help"),
-                'play_again': _("Play sound again"),
-                'cant_hear_this': _("Download sound as MP3"),
-                'incorrect_try_again': _("Incorrect. Try again.")
-            }
-        })
+            'custom_translations': dict(zip(
+                [key for key, msgid in _custom_translations], messages))
+        }, sort_keys=True)
     ))
 
 
-def validate_recaptcha(private_key, challenge, response, remote_ip):
-    """Validates the recaptcha.  If the validation fails
-    a `RecaptchaValidationFailed` error is raised.
-    """
-    request = urllib2.Request(VERIFY_SERVER, data=urlencode({
+def _encode_verify_request(private_key, challenge, response, remote_ip):
+    """Returns the body of a verification request."""
+    return urlencode({
         'privatekey':       private_key.encode('utf-8'),
         'remoteip':         remote_ip.encode('utf-8'),
         'challenge':        challenge.encode('utf-8'),
         'response':         response.encode('utf-8')
-    }))
-    response = urllib2.urlopen(request)
-    rv = response.read().splitlines()
-    response.close()
+    })
+
+
+def _parse_verify_response(rv):
+    """Parses the lines returned by the verify server."""
     if rv and rv[0] == 'true':
         return True
     if len(rv) > 1:
@@ -91,3 +124,140 @@ def validate_recaptcha(private_key, challenge, response, remote_ip):
         if error == 'invalid-referrer':
             raise RuntimeError('key not valid for the current domain')
     return False
+
+
+def validate_recaptcha(private_key, challenge, response, remote_ip):
+    """Validates the recaptcha.  If the validation fails
+    a `RecaptchaValidationFailed` error is raised.  If the verify server
+    doesn't respond within `VERIFY_TIMEOUT` seconds an `IOError` is
+    raised.
+    """
+    request = urllib2.Request(VERIFY_SERVER, data=_encode_verify_request(
+        private_key, challenge, response, remote_ip))
+    response = urllib2.urlopen(request, timeout=VERIFY_TIMEOUT)
+    rv = response.read().splitlines()
+    response.close()
+    return _parse_verify_response(rv)
+
+
+class RecaptchaVerifier(object):
+    """Verifies recaptcha responses over a pool of keep-alive connections
+    to the verify server.  Instances are callable with the same arguments
+    as `validate_recaptcha` and can be set as `recaptcha_verifier` on a
+    form to be used instead of it.  One verifier is supposed to be shared
+    by all requests and is thread safe.
+
+    `connect_timeout` and `read_timeout` limit how long a verification can
+    block in seconds.  If the verify server can't be reached in time the
+    captcha is considered invalid, unless `fail_open` is set to `True`.  At
+    most `pool_size` idle connections are kept around.
+    """
+
+    def __init__(self, verify_server=VERIFY_SERVER, connect_timeout=2,
+                 read_timeout=5, fail_open=False, pool_size=10):
+        scheme, netloc, path, query = urlsplit(verify_server)[:4]
+        if scheme == 'https':
+            self._connection_class = httplib.HTTPSConnection
+        else:
+            self._connection_class = httplib.HTTPConnection
+        self._netloc = netloc
+        self._path = path + (query and '?' + query or '')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.fail_open = fail_open
+        self.pool_size = pool_size
+        self._pool = []
+        self._lock = Lock()
+
+    def _connect(self):
+        con = self._connection_class(self._netloc,
+                                     timeout=self.connect_timeout)
+        con.connect()
+        con.sock.settimeout(self.read_timeout)
+        # requests are small and connections are reused, don't let
+        # nagle's algorithm delay them
+        con.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return con
+
+    def _get_connection(self):
+        self._lock.acquire()
+        try:
+            if self._pool:
+                return self._pool.pop(), True
+        finally:
+            self._lock.release()
+        return self._connect(), False
+
+    def _put_connection(self, con):
+        self._lock.acquire()
+        try:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(con)
+                return
+        finally:
+            self._lock.release()
+        con.close()
+
+    def close(self):
+        """Closes all idle connections."""
+        self._lock.acquire()
+        try:
+            pool = self._pool
+            self._pool = []
+        finally:
+            self._lock.release()
+        for con in pool:
+            con.close()
+
+    def _send(self, con, body):
+        con.request('POST', self._path, body, {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        })
+
+    def _post(self, body):
+        """Sends the request and returns the lines of the response.  If
+        sending on a pooled connection fails because it went away in the
+        meantime, the request is sent once more on a fresh connection.
+        Once the request is sent it's never repeated, the verify server
+        accepts every captcha response only once.  Responses with a status
+        other than 2xx raise an `httplib.HTTPException`.
+        """
+        con, reused = self._get_connection()
+        try:
+            try:
+                self._send(con, body)
+            except (httplib.HTTPException, socket.error):
+                if not reused:
+                    raise
+                con.close()
+                con = self._connect()
+                self._send(con, body)
+            response = con.getresponse()
+            rv = response.read().splitlines()
+            if not 200 <= response.status < 300:
+                raise httplib.HTTPException('verify server responded with '
+                                            'status %d' % response.status)
+        except (httplib.HTTPException, socket.error):
+            con.close()
+            raise
+        if response.will_close:
+            con.close()
+        else:
+            self._put_connection(con)
+        return rv
+
+    def verify(self, private_key, challenge, response, remote_ip):
+        """Validates the recaptcha.  Returns `True` if the response
+        was correct.
+        """
+        if not challenge or not response:
+            return False
+        body = _encode_verify_request(private_key, challenge, response,
+                                      remote_ip)
+        try:
+            rv = self._post(body)
+        except (httplib.HTTPException, socket.error):
+            return self.fail_open
+        return _parse_verify_response(rv)
+
+    __call__ = verify
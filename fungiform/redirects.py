@@ -9,11 +9,14 @@
     :copyright: (c) 2010 by the Fungiform Team.
     :license: BSD, see LICENSE for more details.
 """
+import re
 import urllib
-from itertools import chain
 from urlparse import urlparse, urlsplit, urljoin
 from cgi import parse_qsl as urldecode
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
+
+
+_glob_chars = re.compile(r'[*?[]')
 
 
 def get_current_url(environ, root_only=False):
@@ -67,11 +70,143 @@ def get_host(environ):
     return result
 
 
+def _get_url_key(environ):
+    """The parts of the environment the URLs of a request depend on."""
+    get = environ.get
+    return (get('wsgi.url_scheme'), get('HTTP_X_FORWARDED_HOST'),
+            get('HTTP_HOST'), get('SERVER_NAME'), get('SERVER_PORT'),
+            get('SCRIPT_NAME'), get('PATH_INFO'), get('QUERY_STRING'))
+
+
+class URLContext(object):
+    """The URLs of a request computed once from the WSGI environment.  Use
+    :func:`get_url_context` to get the context of a request so that it's
+    shared by everything that needs the URLs:
+
+    >>> ctx = URLContext({'wsgi.url_scheme': 'http', 'HTTP_HOST': 'localhost',
+    ...                   'SCRIPT_NAME': '/script', 'PATH_INFO': '/edit',
+    ...                   'QUERY_STRING': 'id=42'})
+    >>> ctx.host, ctx.root_url
+    ('localhost', 'http://localhost/script/')
+    >>> ctx.url
+    'http://localhost/script/edit?id=42'
+
+    URLs relative to the current URL are joined and parsed into tuples of
+    the first four URL parts and the decoded query arguments:
+
+    >>> ctx.parse('list?page=2')
+    (('http', 'localhost', '/script/list', ''), (('page', '2'),))
+    """
+
+    def __init__(self, environ):
+        self.key = _get_url_key(environ)
+        self.host = get_host(environ)
+        self.url = get_current_url(environ)
+        self.root_url = get_current_url(environ, root_only=True)
+        self._parsed = {}
+        self.url_parts = self.parse(self.url)
+
+    def join(self, url):
+        """Joins an URL with the current URL."""
+        return urljoin(self.url, url)
+
+    def parse(self, url):
+        """Joins an URL with the current URL and parses it.  The result is
+        cached for the lifetime of the context.
+        """
+        rv = self._parsed.get(url)
+        if rv is None:
+            parts = urlparse(urljoin(self.url, url))
+            rv = self._parsed[url] = (tuple(parts[:4]),
+                                      tuple(urldecode(parts[4])))
+        return rv
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.url)
+
+
+def get_url_context(environ):
+    """Returns the :class:`URLContext` for a WSGI environment.  The context
+    is stored in the environment and recreated if one of the values the
+    URLs are built from changes.
+    """
+    context = environ.get('fungiform.url_context')
+    if context is None or context.key != _get_url_key(environ):
+        context = environ['fungiform.url_context'] = URLContext(environ)
+    return context
+
+
+class RedirectRules(object):
+    """A compiled list of host patterns that redirects are allowed to.  The
+    patterns are the same `fnmatch` patterns that `get_redirect_target`
+    accepts, but hosts without wildcards are looked up in a set and all
+    wildcard patterns are combined into a single regular expression:
+
+    >>> rules = RedirectRules(['example.com', '*.example.org', 'www?.a.com'])
+    >>> rules.match('example.com'), rules.match('foo.example.org')
+    (True, True)
+    >>> rules.match('www1.a.com'), rules.match('example.org')
+    (True, False)
+
+    Iterating over the rules yields the patterns:
+
+    >>> list(rules)
+    ['example.com', '*.example.org', 'www?.a.com']
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.hosts = set()
+        patterns = []
+        for rule in self.rules:
+            if _glob_chars.search(rule) is None:
+                self.hosts.add(rule)
+            else:
+                pattern = translate(rule)
+                if pattern.endswith('\\Z(?ms)'):
+                    pattern = pattern[:-7]
+                patterns.append(pattern)
+        self._regex = None
+        if patterns:
+            self._regex = re.compile(r'(?:%s)\Z' % '|'.join(patterns), re.S)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, host):
+        """Checks if a host matches one of the rules."""
+        if host in self.hosts:
+            return True
+        return self._regex is not None and \
+               self._regex.match(host) is not None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.rules)
+
+
+def _is_allowed_host(host, current_host, allowed_redirects):
+    """Checks if a redirect to the host is allowed."""
+    if fnmatch(host, current_host):
+        return True
+    if isinstance(allowed_redirects, RedirectRules):
+        return allowed_redirects.match(host)
+    for rule in allowed_redirects or ():
+        if fnmatch(host, rule):
+            return True
+    return False
+
+
 def get_redirect_target(environ, user_url=None, invalid_targets=(),
                         allowed_redirects=None):
     """Check the request and get the redirect target if possible.
     If not this function returns just `None`.  The return value of this
     function is suitable to be passed to `redirect`.
+
+    The allowed redirects can be a list of `fnmatch` patterns or a
+    :class:`RedirectRules` object which is a lot faster for long lists.
     """
     check_target = user_url or environ.get('HTTP_REFERER')
 
@@ -84,44 +219,38 @@ def get_redirect_target(environ, user_url=None, invalid_targets=(),
     # otherwise drop the leading slash
     check_target = check_target.lstrip('/')
 
-    root_url = get_current_url(environ)
-    root_parts = urlparse(root_url)
-
-    check_parts = urlparse(urljoin(root_url, check_target))
-    check_query = dict(urldecode(check_parts[4]))
+    context = get_url_context(environ)
+    root_parts = context.url_parts[0]
+    check_parts, check_query = context.parse(check_target)
+    check_query = dict(check_query)
 
     def url_equals(to_check):
-        if to_check[:4] != check_parts[:4]:
+        parts, args = to_check
+        if parts != check_parts:
             return False
-        args = urldecode(to_check[4])
         for key, value in args:
             if check_query.get(key) != value:
                 return False
         return True
 
-    allowed_redirects = chain([get_host(environ)], allowed_redirects or ())
-
     # if the jump target is on a different server we probably have
     # a security problem and better try to use the target url.
     # except the host is whitelisted in the config
     if root_parts[:2] != check_parts[:2]:
         host = check_parts[1].split(':', 1)[0]
-        for rule in allowed_redirects:
-            if fnmatch(host, rule):
-                break
-        else:
+        if not _is_allowed_host(host, context.host, allowed_redirects):
             return
 
     # if the jump url is the same url as the current url we've had
     # a bad redirect before and use the target url to not create a
     # infinite redirect.
-    if url_equals(urlparse(get_current_url(environ))):
+    if url_equals(context.url_parts):
         return
 
     # if the `check_target` is one of the invalid targets we also
     # fall back.
     for invalid in invalid_targets:
-        if url_equals(urlparse(urljoin(root_url, invalid))):
+        if url_equals(context.parse(invalid)):
             return
 
     return check_target
@@ -13,17 +13,26 @@ import unittest
 
 
 def suite():
-    from fungiform.tests import forms, utils, widgets
+    from fungiform.tests import complexity, csrf, forms, metrics, \
+         profiling, recaptcha, redirects, utils, widgets
     pkg_prefix = ''.join(__name__.rpartition('.')[:-1])
 
     def DocTestSuite(name):
         return doctest.DocTestSuite(pkg_prefix + name)
 
     suite = unittest.TestSuite()
+    suite.addTest(complexity.suite())
+    suite.addTest(csrf.suite())
     suite.addTest(forms.suite())
+    suite.addTest(metrics.suite())
+    suite.addTest(profiling.suite())
+    suite.addTest(recaptcha.suite())
+    suite.addTest(redirects.suite())
     suite.addTest(utils.suite())
     suite.addTest(widgets.suite())
     suite.addTest(DocTestSuite('forms'))
+    suite.addTest(DocTestSuite('metrics'))
+    suite.addTest(DocTestSuite('profiling'))
     suite.addTest(DocTestSuite('redirects'))
     suite.addTest(DocTestSuite('utils'))
     suite.addTest(DocTestSuite('widgets'))
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.tests.complexity
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Feeds adversarial form data to the decoder, list fields and list
+    widgets and checks that time and memory grow linearly with the size
+    of the input.  The payloads come from seeded random generators so that
+    a failure can be reproduced.
+
+    Every check runs an operation at a small and at a four times bigger
+    input and compares the number of objects the results keep alive.
+    With ``FUNGIFORM_TIMING_TESTS=1`` in the environment the wall time is
+    compared as well: linear (or ``n log n``) code gets about four times
+    slower, quadratic code sixteen times.  The bound in between leaves
+    room for a noisy machine, but timings are still too unreliable for a
+    default test run.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import gc
+import os
+import time
+import random
+import unittest
+from fungiform import forms
+from fungiform.utils import decode_form_data
+
+
+# compare the wall time too, not only the retained objects
+TIMING_TESTS = os.environ.get('FUNGIFORM_TIMING_TESTS') == '1'
+
+# the input grows by this factor between the two measurements
+GROWTH = 4
+
+# the slowdown that is still accepted as linear for that growth
+MAX_SLOWDOWN = 9
+
+# faster operations are not compared, the timer is too coarse for them
+MIN_TIME = 0.002
+
+
+def best_time(func, repeat=5):
+    """Returns the best wall time of `repeat` calls."""
+    best = None
+    for x in xrange(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def retained_objects(func):
+    """Returns the number of garbage collector tracked objects that are
+    kept alive by the return value of `func`.
+    """
+    gc.collect()
+    before = len(gc.get_objects())
+    result = func()
+    gc.collect()
+    count = len(gc.get_objects()) - before
+    del result
+    return count
+
+
+def sparse_indices(rnd, size):
+    return dict(('items.%d' % rnd.randint(0, 10 ** 12), u'x')
+                for x in xrange(size))
+
+
+def mixed_keys(rnd, size):
+    data = {}
+    for x in xrange(size):
+        if rnd.random() < 0.5:
+            data['items.%d' % rnd.randint(0, size)] = u'x'
+        else:
+            data['items.k%d' % rnd.randint(0, size)] = u'x'
+    return data
+
+
+def nested_rows(rnd, size):
+    data = {}
+    for idx in xrange(size):
+        data['rows.%d.options.%d.name' % (rnd.randint(0, size / 10),
+                                           idx)] = u'x'
+    return data
+
+
+def deep_key(rnd, size):
+    return {'.'.join(rnd.choice('ab0') for x in xrange(size)): u'x'}
+
+
+def long_digits(rnd, size):
+    return {'items.' + ''.join(rnd.choice('0123456789')
+                               for x in xrange(size)): u'x'}
+
+
+def multi_dict_items(rnd, size):
+    # a list of pairs takes the sorting path for dict like objects
+    class Pairs(dict):
+        def items(self):
+            return pairs
+    pairs = [('items.%d' % rnd.randint(0, size), u'x')
+             for x in xrange(size)]
+    return Pairs()
+
+
+def comma_string(rnd, size):
+    return u','.join(rnd.choice([u'', u' ', u'x', u'x' * 50])
+                     for x in xrange(size))
+
+
+def random_key(rnd):
+    parts = []
+    for x in xrange(rnd.randint(1, 6)):
+        parts.append(rnd.choice(['items', 'rows', 'tags', 'name', '', '0',
+                                 '1', '007', str(rnd.randint(0, 10 ** 6)),
+                                 u'\xfc', ' ', '-1']))
+    return '.'.join(parts)
+
+
+def random_value(rnd):
+    value = rnd.choice([u'', u'x', u'1', u',,,', u'a, b,c', u'\x00',
+                        u'<script>', u'x' * 1000])
+    if rnd.random() < 0.2:
+        return [value] * rnd.randint(0, 3)
+    return value
+
+
+class FuzzForm(forms.FormBase):
+    name = forms.TextField(max_length=20)
+    items = forms.Multiple(forms.IntegerField())
+    tags = forms.CommaSeparated(forms.TextField(), max_size=50)
+    rows = forms.Multiple(forms.Mapping(
+        name=forms.TextField(required=True),
+        options=forms.Multiple(forms.Mapping(
+            name=forms.TextField()))))
+
+
+class ComplexityTestCase(unittest.TestCase):
+
+    def assert_linear(self, func, make_data, size, seed=42):
+        """Checks that `func` doesn't keep more than ``GROWTH * 2`` times
+        more objects alive (or, with `TIMING_TESTS`, get more than
+        `MAX_SLOWDOWN` times slower) if the data returned by `make_data`
+        grows by `GROWTH`.
+        """
+        small = make_data(random.Random(seed), size)
+        big = make_data(random.Random(seed), size * GROWTH)
+        if TIMING_TESTS:
+            small_time = best_time(lambda: func(small))
+            big_time = best_time(lambda: func(big))
+            if big_time >= MIN_TIME:
+                slowdown = big_time / max(small_time, MIN_TIME / GROWTH)
+                self.assert_(slowdown < MAX_SLOWDOWN,
+                             '%s: %d times the input took %.1f times as '
+                             'long (%.4fs vs %.4fs)' % (
+                                 make_data.__name__, GROWTH, slowdown,
+                                 small_time, big_time))
+        small_objects = retained_objects(lambda: func(small))
+        big_objects = retained_objects(lambda: func(big))
+        self.assert_(big_objects <= max(small_objects, 10) * GROWTH * 2,
+                     '%s: %d times the input kept %d instead of %d objects '
+                     'alive' % (make_data.__name__, GROWTH, big_objects,
+                                small_objects))
+
+    def test_decode_form_data(self):
+        for make_data, size in [(sparse_indices, 2000),
+                                (mixed_keys, 2000),
+                                (nested_rows, 2000),
+                                (deep_key, 20),
+                                (long_digits, 2000),
+                                (multi_dict_items, 2000)]:
+            self.assert_linear(decode_form_data, make_data, size)
+
+    def test_sparse_indices_are_compacted(self):
+        data = decode_form_data(sparse_indices(random.Random(42), 100))
+        self.assertEqual(len(data['items']), 100)
+
+    def test_deep_keys(self):
+        rnd = random.Random(42)
+        for size in 50, 100, 101, 5000, 100000:
+            data = dict(deep_key(rnd, size), name=u'x')
+            decoded = decode_form_data(data)
+            self.assertEqual(decoded['name'], u'x')
+            self.assertEqual(len(decoded), size <= 100 and 2 or 1)
+
+    def test_multiple(self):
+        def validate(data):
+            form = FuzzForm()
+            form.validate(data)
+            return form
+        self.assert_linear(validate, lambda rnd, size: {
+            'items': [unicode(rnd.randint(-10, 10 ** 6))
+                      for x in xrange(size)]}, 1000)
+        self.assert_linear(validate, lambda rnd, size: {
+            'items': [rnd.choice([u'x', u'', u'1.5'])
+                      for x in xrange(size)]}, 1000)
+        self.assert_linear(validate, lambda rnd, size: nested_rows(rnd, size),
+                           500)
+
+    def test_comma_separated(self):
+        field = forms.CommaSeparated(forms.TextField())
+        self.assert_linear(field, comma_string, 2000)
+        self.assert_linear(field, lambda rnd, size: u',' * size, 20000)
+
+    def test_list_widget(self):
+        def render(data):
+            form = FuzzForm()
+            form.validate(data)
+            widget = form.as_widget()
+            return widget['items'].as_ul(extra_rows=3), \
+                   widget['tags'](), widget['rows'].as_ul()
+        self.assert_linear(render, lambda rnd, size: {
+            'items': [rnd.choice([u'1', u'x', u''])
+                      for x in xrange(size)]}, 300)
+        self.assert_linear(render, lambda rnd, size: {
+            'tags': comma_string(rnd, size)}, 300)
+        self.assert_linear(render, nested_rows, 300)
+
+    def test_fuzz(self):
+        rnd = random.Random(1234)
+        for run in xrange(200):
+            data = dict((random_key(rnd), random_value(rnd))
+                        for x in xrange(rnd.randint(0, 30)))
+            # only numbers as top level keys make a list
+            self.assert_(isinstance(decode_form_data(data), (dict, list)))
+            form = FuzzForm()
+            try:
+                result = form.validate(data)
+            except Exception, e:
+                self.fail('validation failed for seed 1234, run %d: %r (%s)'
+                          % (run, data, e))
+            self.assert_(result in (True, False))
+            form.as_widget().render()
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(ComplexityTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
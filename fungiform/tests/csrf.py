@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.tests.csrf
+    ~~~~~~~~~~~~~~~~~~~~
+
+    The unittests for the CSRF protection.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from fungiform import csrf, forms
+
+
+class RecordingSession(dict):
+    """A session that counts the writes."""
+
+    writes = 0
+
+    def __setitem__(self, key, value):
+        self.writes += 1
+        dict.__setitem__(self, key, value)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+def make_form_class(**options):
+    class LoginForm(forms.FormBase):
+        redirect_tracking = False
+        username = forms.TextField(required=True)
+
+        def __init__(self, session, initial=None):
+            self.session = session
+            forms.FormBase.__init__(self, initial, action='/login',
+                                    request_info=object())
+
+        def _get_session(self):
+            return self.session
+
+    for key, value in options.iteritems():
+        setattr(LoginForm, key, value)
+    return LoginForm
+
+
+class SignedTokenTestCase(unittest.TestCase):
+
+    def test_sign_and_check(self):
+        token = csrf.get_signed_csrf_token('secret', '/login', now=1000)
+        self.assert_(csrf.check_signed_csrf_token('secret', '/login', token,
+                                                  now=1000))
+        self.assert_(csrf.check_signed_csrf_token('secret', '/login',
+                                                  unicode(token), now=4600))
+        self.failIf(csrf.check_signed_csrf_token('secret', '/login', token,
+                                                 now=4601))
+        self.failIf(csrf.check_signed_csrf_token('other', '/login', token,
+                                                 now=1000))
+        self.failIf(csrf.check_signed_csrf_token('secret', '/logout', token,
+                                                 now=1000))
+
+    def test_invalid_tokens(self):
+        token = csrf.get_signed_csrf_token('secret', '/login', now=1000)
+        expires, signature = token.split('.')
+        forged = '%x.%s' % (int(expires, 16) + 1000, signature)
+        for invalid in None, '', 'foo', 'xx.yy', forged, u'\xe4.\xe4', 42:
+            self.failIf(csrf.check_signed_csrf_token('secret', '/login',
+                                                     invalid, now=1000))
+
+    def test_replay_cache(self):
+        cache = csrf.ReplayCache(maxsize=2)
+        token = csrf.get_signed_csrf_token('secret', '/login', now=1000)
+        check = lambda t, now=1000: csrf.check_signed_csrf_token(
+            'secret', '/login', t, cache, now=now)
+        self.assert_(check(token))
+        self.failIf(check(token))
+
+        # expired tokens are dropped from the cache
+        for offset in xrange(5):
+            other = csrf.get_signed_csrf_token('secret', '/login', 10,
+                                               now=1000 + offset * 20)
+            self.assert_(check(other, now=1000 + offset * 20))
+        self.assertEqual(len(cache), 2)
+
+    def test_full_replay_cache(self):
+        cache = csrf.ReplayCache(maxsize=2)
+        check = lambda t, now=1000: csrf.check_signed_csrf_token(
+            'secret', '/login', t, cache, now=now)
+        tokens = [csrf.get_signed_csrf_token('secret', '/login', lifetime,
+                                             now=1000)
+                  for lifetime in 3600, 3000, 2000]
+        self.assert_(check(tokens[0]))
+        self.assert_(check(tokens[1]))
+        # flooding the cache with fresh tokens doesn't push out used ones
+        self.failIf(check(tokens[2]))
+        self.failIf(check(tokens[0]))
+        self.assertEqual(len(cache), 2)
+
+        # once tokens expired there is room again
+        later = csrf.get_signed_csrf_token('secret', '/login', 3600, now=4500)
+        self.assert_(check(later, now=4500))
+        self.failIf(check(tokens[0], now=4500))
+        self.assertEqual(len(cache), 2)
+
+    def test_replay_cache_per_secret(self):
+        def check(cache, secret, lifetime, now=1000):
+            token = csrf.get_signed_csrf_token(secret, '/login', lifetime,
+                                               now=1000)
+            return csrf.check_signed_csrf_token(secret, '/login', token,
+                                                cache, now=now)
+
+        cache = csrf.ReplayCache(maxsize=10, max_per_secret=2)
+        self.assert_(check(cache, 'flood', 100))
+        self.assert_(check(cache, 'flood', 3600))
+        # a single session can only lock out itself
+        self.failIf(check(cache, 'flood', 3500))
+        self.assert_(check(cache, 'other', 3600))
+        self.assertEqual(len(cache), 3)
+        # and gets its share back once its tokens expire
+        self.assert_(check(cache, 'flood', 3000, now=1200))
+        self.assertEqual(len(cache), 3)
+
+        unbounded = csrf.ReplayCache(maxsize=None, max_per_secret=None)
+        for lifetime in xrange(100, 200):
+            self.assert_(check(unbounded, 'flood', lifetime))
+        self.assertEqual(len(unbounded), 100)
+
+    def test_form_never_writes_session(self):
+        session = RecordingSession(csrf_secret='abc')
+        form_class = make_form_class(signed_csrf_tokens=True)
+
+        form = form_class(session)
+        widget = form.as_widget()
+        token = widget.csrf_token
+        self.assert_('_csrf_token' in widget.hidden_fields)
+
+        form = form_class(session)
+        self.assert_(form.validate({'username': 'john',
+                                    '_csrf_token': token}))
+        form = form_class(session)
+        self.failIf(form.validate({'username': 'john',
+                                   '_csrf_token': token + 'x'}))
+        self.assert_(None in form.errors)
+        self.assertEqual(session.writes, 0)
+        self.assertEqual(session.keys(), ['csrf_secret'])
+
+    def test_form_one_time_tokens(self):
+        session = RecordingSession()
+        form_class = make_form_class(signed_csrf_tokens=True,
+                                     csrf_replay_cache=csrf.ReplayCache())
+        token = form_class(session).csrf_token
+        self.assertEqual(session.writes, 1)
+        self.assert_(form_class(session).validate({'username': 'john',
+                                                   '_csrf_token': token}))
+        self.failIf(form_class(session).validate({'username': 'john',
+                                                  '_csrf_token': token}))
+        self.assertEqual(session.writes, 1)
+
+    def test_session_tokens(self):
+        session = RecordingSession()
+        form_class = make_form_class()
+        token = form_class(session).csrf_token
+        self.assert_(form_class(session).validate({'username': 'john',
+                                                   '_csrf_token': token}))
+        self.failIf(form_class(session).validate({'username': 'john',
+                                                  '_csrf_token': token}))
+
+
+class Clock(object):
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TokenStoreTestMixin(object):
+
+    def make_store(self, clock, **options):
+        raise NotImplementedError()
+
+    def test_get_set_delete(self):
+        clock = Clock()
+        store = self.make_store(clock, ttl=60)
+        self.assertEqual(store.get('foo'), None)
+        store.set('foo', 'a' * 10)
+        store.set('bar', 'b' * 10)
+        self.assertEqual(store.get('foo'), 'a' * 10)
+        store.set('foo', 'c' * 10)
+        self.assertEqual(store.get('foo'), 'c' * 10)
+        store.delete('foo')
+        store.delete('missing')
+        self.assertEqual(store.get('foo'), None)
+        self.assertEqual(store.get('bar'), 'b' * 10)
+        clock.now += 60
+        self.assertEqual(store.get('bar'), None)
+
+    def test_form_integration(self):
+        session = RecordingSession()
+        form_class = make_form_class(csrf_token_store=self.make_store(Clock()))
+        token = form_class(session).csrf_token
+        self.assertEqual(form_class(session).csrf_token, token)
+        self.assertEqual(session.keys(), ['csrf_secret'])
+        self.assert_(form_class(session).validate({'username': 'john',
+                                                   '_csrf_token': token}))
+        self.failIf(form_class(session).validate({'username': 'john',
+                                                  '_csrf_token': token}))
+        self.assertEqual(session.writes, 1)
+
+
+class MemoryTokenStoreTestCase(TokenStoreTestMixin, unittest.TestCase):
+
+    def make_store(self, clock, **options):
+        return csrf.MemoryTokenStore(timer=clock, **options)
+
+    def test_maxsize(self):
+        clock = Clock()
+        store = self.make_store(clock, maxsize=3)
+        for idx in xrange(5):
+            clock.now += 1
+            store.set(str(idx), 'x' * 10)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.get('1'), None)
+        self.assertEqual(store.get('2'), 'x' * 10)
+
+    def test_consumed_tokens_are_pruned(self):
+        clock = Clock()
+        store = self.make_store(clock)
+        for idx in xrange(1000):
+            store.set(str(idx % 10), 'x' * 10)
+            store.delete(str(idx % 7))
+        self.assert_(len(store._queue) <= 2 * len(store))
+
+
+class MmapTokenStoreTestCase(TokenStoreTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.path)
+
+    def make_store(self, clock, **options):
+        store = csrf.MmapTokenStore(os.path.join(self.path, 'tokens'),
+                                    timer=clock, **options)
+        self.stores.append(store)
+        return store
+
+    def test_shared_between_instances(self):
+        clock = Clock()
+        one = self.make_store(clock)
+        two = self.make_store(clock)
+        one.set('foo', '0123456789')
+        self.assertEqual(two.get('foo'), '0123456789')
+        two.delete('foo')
+        self.assertEqual(one.get('foo'), None)
+
+    def test_full_table(self):
+        clock = Clock()
+        store = self.make_store(clock, slots=4)
+        for idx in xrange(10):
+            clock.now += 1
+            store.set(str(idx), 'x' * 10)
+        self.assertEqual(store.get('9'), 'x' * 10)
+        self.assertEqual(len([x for x in xrange(10)
+                              if store.get(str(x)) is not None]), 4)
+        self.assertRaises(ValueError, store.set, 'foo', 'x' * 11)
+        self.assertRaises(ValueError, store.set, 'foo', 'x' * 9)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SignedTokenTestCase))
+    suite.addTest(unittest.makeSuite(MemoryTokenStoreTestCase))
+    suite.addTest(unittest.makeSuite(MmapTokenStoreTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -8,8 +8,12 @@
     :copyright: (c) 2010 by the Fungiform Team.
     :license: BSD, see LICENSE for more details.
 """
+import time
 import unittest
-from fungiform import forms
+from threading import Lock, Thread, current_thread
+from datetime import date, datetime
+from fungiform import forms, utils, widgets
+from fungiform.exceptions import ValidationError, MultipleValidationErrors
 
 
 class FormTestCase(unittest.TestCase):
@@ -51,6 +55,20 @@ class FormTestCase(unittest.TestCase):
         self.assertEqual(form.data['ints'], [42, 125, 23])
         self.assertEqual(form.data['strings'], 'foo bar baz'.split())
 
+    def test_malformed_nesting(self):
+        class MyForm(forms.FormBase):
+            rows = forms.Multiple(forms.Mapping(
+                name=forms.TextField(required=True),
+                tags=forms.Multiple(forms.TextField())))
+
+        form = MyForm()
+        self.assertEqual(form.validate({'rows.0': 'foo',
+                                        'rows.1.tags': 'bar'}), False)
+        self.assertEqual(sorted(form.errors), ['rows.0.name', 'rows.1.name'])
+        form = MyForm()
+        self.assertEqual(form.validate({'0': 'foo'}), True)
+        self.assertEqual(form.data['rows'], [])
+
     def test_form_as_field(self):
         class AddressForm(forms.FormBase):
             street = forms.TextField()
@@ -74,10 +92,861 @@ class FormTestCase(unittest.TestCase):
                           {'street': u'Ailleurs', 'zipcode': 55555}],
         })
 
+    def test_slotted_fields(self):
+        class MyForm(forms.FormBase):
+            name = forms.TextField(messages=dict(required=u'Name please!'))
+            age = forms.IntegerField()
+
+        self.assertRaises(AttributeError, getattr, MyForm.age, '__dict__')
+        self.assertEqual(MyForm.age.widget, widgets.TextInput)
+        self.assertEqual(MyForm.age.messages['no_integer'], None)
+        self.assertEqual(MyForm.name.messages['required'], u'Name please!')
+        self.assertEqual(forms.TextField._defaults['messages'],
+                         dict(required=None, too_short=None, too_long=None))
+
+        form = MyForm()
+        self.assert_(form.age.form is form)
+        self.assert_(form.age is not MyForm.age)
+        self.assertEqual(form.name.messages['required'], u'Name please!')
+        self.assertRaises(AttributeError, getattr, form.age, '__dict__')
+
+    def test_class_defaults_of_slots(self):
+        self.assertEqual(forms.TextField.widget, widgets.TextInput)
+        self.assertEqual(forms.Field.io_bound, False)
+        self.assertEqual(forms.Field.form, None)
+        self.assertEqual(forms.TextField.messages['too_long'], None)
+        self.assertEqual(forms.BooleanField.validate_on_omission, True)
+
+        class MyField(forms.TextField):
+            pass
+        MyField.widget = widgets.Textarea
+        self.assertEqual(MyField.widget, widgets.Textarea)
+        self.assertEqual(MyField().widget, widgets.Textarea)
+        self.assertEqual(forms.TextField().widget, widgets.TextInput)
+
+        # defaults set on a base class reach existing subclasses
+        class MyText(forms.TextField):
+            pass
+        forms.TextField.widget = widgets.Textarea
+        try:
+            self.assertEqual(MyText.widget, widgets.Textarea)
+            self.assertEqual(MyText().widget, widgets.Textarea)
+        finally:
+            forms.TextField.widget = widgets.TextInput
+        self.assertEqual(MyText().widget, widgets.TextInput)
+
+        # descriptors of subclasses are not hidden by the defaults
+        class PropertyField(forms.TextField):
+            @property
+            def widget(self):
+                return widgets.Textarea
+        self.assert_(isinstance(PropertyField.widget, property))
+
+    def test_combined_fields(self):
+        class DateChoiceField(forms.ChoiceField, forms.DateField):
+            pass
+
+        class RangeField(forms.IntegerField, forms.FloatField):
+            pass
+        field = DateChoiceField(choices=[u'a', u'b'])
+        self.assertEqual(field.choices, [u'a', u'b'])
+        self.assertEqual(field._bind(None, {}).choices, [u'a', u'b'])
+        self.assertEqual(RangeField(max_value=3)(u'2'), 2)
+
+        class GroupWidget(widgets.RadioButtonGroup, widgets.FormWidget):
+            pass
+
+    def test_subclass_assigns_other_slots(self):
+        class LimitedField(forms.Field):
+            def __init__(self):
+                forms.Field.__init__(self)
+                self.max_length = 10
+        field = LimitedField()._bind(None, {})
+        self.assertEqual(field.max_length, 10)
+        self.assertEqual(field.__dict__, {})
+
+    def test_field_subclass_with_attributes(self):
+        class UpperField(forms.TextField):
+            widget = widgets.Textarea
+            messages = dict(not_upper=None)
+
+            def __init__(self, label=None, strict=True):
+                forms.TextField.__init__(self, label)
+                self.strict = strict
+
+        class MyForm(forms.FormBase):
+            name = UpperField(strict=False)
+            title = forms.TextField(widget=widgets.Textarea)
+
+        self.assertEqual(MyForm.name.widget, widgets.Textarea)
+        self.assertEqual(MyForm.name.strict, False)
+        self.assertEqual(sorted(MyForm.name.messages), ['not_upper',
+                         'required', 'too_long', 'too_short'])
+
+        form = MyForm()
+        self.assert_(form.name.bound)
+        self.assertEqual(form.name.strict, False)
+        self.assertEqual(form.name.__dict__, {'strict': False})
+        self.assertEqual(form.title.widget, widgets.Textarea)
+
+        field = MyForm.as_field()
+        self.assert_(isinstance(field, forms.FormAsField))
+        self.assertEqual(field.widget, widgets.MappingWidget)
+        self.assertEqual(field.form_class, MyForm)
+        self.assert_(not field.bound)
+
+    def test_timezone_resolved_once(self):
+        calls = []
+
+        def get_user_timezone():
+            calls.append(None)
+
+        class EventForm(forms.FormBase):
+            start = forms.DateTimeField(tzinfo=get_user_timezone)
+            times = forms.Multiple(forms.DateTimeField(
+                tzinfo=get_user_timezone))
+
+        form = EventForm()
+        values = [u'2010-11-%02d 10:30' % day for day in xrange(1, 21)]
+        self.assert_(form.validate({'start': u'2010-11-12 10:30',
+                                    'times': values}))
+        self.assertEqual(len(form.data['times']), 20)
+        self.assertEqual(len(calls), 1)
+
+        form = EventForm(form.data)
+        widget = form.as_widget()
+        self.assertEqual([x.value for x in widget['times']], values)
+        self.assertEqual(len(calls), 2)
+
+        # unbound fields call it every time
+        field = forms.DateTimeField(tzinfo=get_user_timezone)
+        field(u'2010-11-12 10:30')
+        field(u'2010-11-12 10:30')
+        self.assertEqual(len(calls), 4)
+
+    def test_changed_fields(self):
+        class ArticleForm(forms.FormBase):
+            title = forms.TextField()
+            tags = forms.Multiple(forms.TextField())
+            meta = forms.Mapping(author=forms.TextField(),
+                                 views=forms.IntegerField())
+
+        def full_compare(form):
+            root = form._root_field
+            return root.to_primitive(form.initial) != \
+                   root.to_primitive(form.data)
+
+        initial = {'title': u'Hello', 'tags': [u'a', u'b'],
+                   'meta': {'author': u'me', 'views': 1}}
+        form = ArticleForm(initial)
+        self.assert_(not form.has_changed)
+        self.assertEqual(form.changes(), {})
+
+        form.validate({'title': u'Hello', 'tags': [u'a', u'b'],
+                       'meta.author': u'me', 'meta.views': u'1'})
+        self.assertEqual(form.has_changed, full_compare(form))
+        self.assert_(not form.has_changed)
+        self.assertEqual(form.changed_fields, set())
+
+        form.validate({'title': u'Hello', 'tags': [u'a', u'c'],
+                       'meta.author': u'me', 'meta.views': u'2'})
+        self.assertEqual(form.has_changed, full_compare(form))
+        self.assertEqual(form.changed_fields, set(['tags', 'meta',
+                                                   'meta.views']))
+        self.assertEqual(form.changes(), {'tags': [u'a', u'c'],
+                                          'meta': {'views': 2}})
+
+        # failed validations keep the data and with that the changes
+        form.validate({'meta.views': u'many'})
+        self.assertEqual(form.changes(), {'tags': [u'a', u'c'],
+                                          'meta': {'views': 2}})
+        form.reset()
+        self.assert_(not form.has_changed)
+
+
+def convert_one_by_one(field, values):
+    result = []
+    errors = {}
+    for idx, value in enumerate(values):
+        try:
+            result.append(field(value))
+        except ValidationError, e:
+            result.append(None)
+            errors[idx] = e
+    return result, errors
+
+
+def no_sevens(form, value):
+    if '7' in unicode(value):
+        raise ValidationError(u'no sevens')
+
+
+class ColumnTestCase(unittest.TestCase):
+
+    numbers = [u'1', u'-5', u'42', u'', None, u'abc', u'1.5', u' 12 ',
+               u'99999999999999999999999', u'1e3', u'nan', u'-inf', 7, 3.5,
+               u'100', u'101', u'0']
+    dates = [u'2010-11-12', u'2010-02-30', u'0000-01-01', u'12/11/2010',
+             u'13/02/2010', u'', None, u'foo', u'2010-1-2', u'2010-11-12\n',
+             u'2010-11-12 10:30', u'2010-11-12  23:59', u'2010-11-12 24:00',
+             u'10:30', date(2010, 1, 1), datetime(2010, 1, 1, 10, 30),
+             u'2017-07-07']
+
+    def assertSameColumn(self, field, values):
+        for with_numpy in True, False:
+            old_numpy = utils.numpy
+            if not with_numpy:
+                utils.numpy = None
+            try:
+                result, errors = field.convert_column(values)
+            finally:
+                utils.numpy = old_numpy
+            expected, expected_errors = convert_one_by_one(field, values)
+            # compare the reprs because nan != nan
+            self.assertEqual(map(repr, result), map(repr, expected))
+            self.assertEqual(dict((k, unicode(v)) for k, v
+                                  in errors.iteritems()),
+                             dict((k, unicode(v)) for k, v
+                                  in expected_errors.iteritems()))
+
+    def test_number_columns(self):
+        for field in [forms.IntegerField(), forms.FloatField(),
+                      forms.IntegerField(required=True, min_value=0,
+                                         max_value=100),
+                      forms.FloatField(min_value=-1.5, max_value=2 ** 60,
+                                       validators=[no_sevens]),
+                      forms.IntegerField(min_value=2 ** 70),
+                      forms.FloatField(required=True, max_value=100,
+                                       messages={'too_big': u'big'})]:
+            for size in 1, 10:
+                self.assertSameColumn(field, self.numbers * size)
+                self.assertSameColumn(field, [x for x in self.numbers * size
+                                              if x not in (u'abc', u'')])
+
+    def test_translated_column_messages(self):
+        class Translations(object):
+            def ugettext(self, string):
+                return string.upper()
+
+            def ungettext(self, sg, pl, n):
+                return (n == 1 and sg or pl).upper()
+
+        class MyForm(forms.FormBase):
+            ints = forms.Multiple(forms.IntegerField())
+            floats = forms.Multiple(forms.FloatField())
+
+            def _get_translations(self):
+                return Translations()
+
+        form = MyForm()
+        form.validate({'ints': [u'1', u'x'], 'floats': [u'x']})
+        self.assertEqual(list(form.errors['ints.1']),
+                         [u'PLEASE ENTER A WHOLE NUMBER.'])
+        self.assertEqual(list(form.errors['floats.0']),
+                         [u'PLEASE ENTER A FLOATING-POINT NUMBER.'])
+
+    def test_date_columns(self):
+        for field in [forms.DateField(), forms.DateTimeField(),
+                      forms.DateField(required=True, validators=[no_sevens]),
+                      forms.DateField(date_formats=['%Y-%d-%m']),
+                      forms.DateTimeField(required=True)]:
+            for size in 1, 10:
+                self.assertSameColumn(field, self.dates * size)
+                self.assertSameColumn(field, [u'2010-11-%02d' % x
+                                              for x in xrange(1, 31)] * size)
+
+    def test_multiple_uses_columns(self):
+        field = forms.Multiple(forms.IntegerField(max_value=10))
+        self.assertEqual(field([u'1', u'', u'2']), [1, None, 2])
+        try:
+            field([u'1', u'', u'20', u'x'])
+        except ValidationError, e:
+            self.assertEqual(sorted(e.errors), [2, 3])
+        else:
+            self.fail('no validation error')
+
+
+class ThreadResult(object):
+    """Runs a function in a thread, `result` waits for it like a future."""
+
+    def __init__(self, func, *args):
+        self._value = self._error = None
+        self._thread = Thread(target=self._run, args=(func, args))
+        self._thread.start()
+
+    def _run(self, func, args):
+        try:
+            self._value = func(*args)
+        except Exception, e:
+            self._error = e
+
+    def result(self, timeout=None):
+        self._thread.join(timeout)
+        if self._thread.isAlive():
+            raise RuntimeError('timed out')
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def slow_check(delay, message=None):
+    """A validator that checks values in a thread.  Values that contain
+    ``'bad'`` are invalid.
+    """
+
+    def check(value):
+        time.sleep(delay)
+        if u'bad' in value:
+            raise ValidationError(message or u'%s is bad' % value)
+
+    def validator(form, value):
+        return forms.PendingResult(ThreadResult(check, value))
+    return validator
+
+
+def make_user_form(delay=0):
+    """A nested form whose fields are checked by `slow_check`."""
+    class AddressForm(forms.FormBase):
+        street = forms.TextField(validators=[slow_check(delay)])
+
+    class UserForm(forms.FormBase):
+        username = forms.TextField(validators=[slow_check(delay)])
+        address = AddressForm.as_field()
+        tags = forms.Multiple(forms.TextField(
+            validators=[slow_check(delay)]))
+        checked = []
+
+        def context_validate(self, data):
+            self.checked.append(data)
+    return UserForm()
+
+
+class AsyncValidationTestCase(unittest.TestCase):
+
+    def test_errors_end_up_at_fields(self):
+        form = make_user_form()
+        self.assertEqual(form.validate_async({
+            'username':         'bad user',
+            'address.street':   'bad street',
+            'tags.0':           'good',
+            'tags.1':           'bad tag',
+        }), False)
+        self.assertEqual(sorted(form.errors), ['address.street',
+                                               'tags.1', 'username'])
+        self.assertEqual(form.errors['tags.1'], [u'bad tag is bad'])
+        self.assertEqual(form.checked, [])
+
+    def test_same_result_as_validate(self):
+        data = {'username': 'bad', 'address.street': 'x', 'tags.0': 'bad'}
+        form = make_user_form()
+        form.validate(data)
+        other = make_user_form()
+        other.validate_async(data)
+        self.assertEqual(form.errors, other.errors)
+
+        form = make_user_form()
+        self.assertEqual(form.validate_async({'username': 'foo',
+                                              'tags.0': 'bar'}), True)
+        self.assertEqual(form.data['tags'], [u'bar'])
+        self.assertEqual(len(form.checked), 1)
+
+    def test_context_validate_result(self):
+        class PairForm(forms.FormBase):
+            first = forms.TextField()
+            second = forms.TextField()
+
+            def context_validate(self, data):
+                return forms.PendingResult(ThreadResult(self.check,
+                                                        data))
+
+            def check(self, data):
+                if data['first'] == data['second']:
+                    raise ValidationError(u'values must differ')
+
+        form = PairForm()
+        self.assertEqual(form.validate_async({'first': 'a',
+                                              'second': 'a'}), False)
+        self.assertEqual(form.errors[None], [u'values must differ'])
+        self.assertEqual(PairForm().validate({'first': 'a',
+                                              'second': 'b'}), True)
+
+    def test_other_results_are_ignored(self):
+        class Model(object):
+            def result(self):
+                raise ValidationError(u'not pending')
+        field = forms.TextField(validators=[lambda form, value: Model()])
+
+        class ModelForm(forms.FormBase):
+            name = field
+
+            def context_validate(self, data):
+                return Model()
+        for method in 'validate', 'validate_async':
+            form = ModelForm()
+            self.assertEqual(getattr(form, method)({'name': 'x'}), True)
+
+    def test_concurrency(self):
+        lock = Lock()
+        running = [0, 0]
+
+        def check(value):
+            lock.acquire()
+            try:
+                running[0] += 1
+                running[1] = max(running)
+            finally:
+                lock.release()
+            time.sleep(0.05)
+            lock.acquire()
+            try:
+                running[0] -= 1
+            finally:
+                lock.release()
+        field = forms.Multiple(forms.TextField(
+            validators=[lambda form, value:
+                        forms.PendingResult(ThreadResult(check, value))]))
+
+        class ListForm(forms.FormBase):
+            items = field
+        data = dict(('items.%d' % idx, 'x') for idx in xrange(8))
+
+        start = time.time()
+        ListForm().validate_async(data, max_pending=4)
+        self.assert_(time.time() - start < 0.3)
+        self.assertEqual(running[1], 4)
+
+        running[1] = 0
+        ListForm().validate(data)
+        self.assertEqual(running[1], 1)
+
+
+def io_bound_check(calls, name, delay):
+    """An I/O bound validator that appends `name` to `calls`.  Values that
+    contain ``'bad'`` are invalid.
+    """
+    @forms.io_bound
+    def validator(form, value):
+        calls.append(name)
+        time.sleep(delay)
+        if u'bad' in value:
+            raise ValidationError(u'%s: %s is bad' % (name, value))
+    return validator
+
+
+class IOBoundValidatorTestCase(unittest.TestCase):
+
+    def test_validators_run_concurrently(self):
+        calls = []
+
+        class LookupForm(forms.FormBase):
+            user = forms.TextField(
+                validators=[io_bound_check(calls, 'ldap', 0.05)])
+            group = forms.TextField(
+                validators=[io_bound_check(calls, 'http', 0.05)])
+            tags = forms.Multiple(forms.TextField(
+                validators=[io_bound_check(calls, 'tag', 0.05)]))
+
+            @forms.io_bound
+            def validate_group(self, value):
+                time.sleep(0.05)
+
+        self.assert_(LookupForm._io_bound)
+        data = {'user': 'foo', 'group': 'bar', 'tags.0': 'a',
+                'tags.1': 'b', 'tags.2': 'bad'}
+        start = time.time()
+        form = LookupForm()
+        self.assertEqual(form.validate(data), False)
+        self.assert_(time.time() - start < 0.15)
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(form.errors.keys(), ['tags.2'])
+
+        self.assertEqual(LookupForm().validate({'user': 'foo',
+                                                'group': 'bar'}), True)
+
+    def test_error_order(self):
+        calls = []
+        order = []
+
+        class OrderForm(forms.FormBase):
+            name = forms.TextField(validators=[
+                io_bound_check(calls, 'slow', 0.05),
+                io_bound_check(calls, 'fast', 0)])
+
+            def validate_name(self, value):
+                order.append('cheap')
+                if value == u'short':
+                    raise ValidationError(u'too short')
+
+        for x in xrange(3):
+            form = OrderForm()
+            form.validate({'name': 'bad'})
+            self.assertEqual(form.errors['name'], [u'slow: bad is bad'])
+        self.assertEqual(order, ['cheap'] * 3)
+
+        calls[:] = []
+        form = OrderForm()
+        form.validate({'name': 'short'})
+        self.assertEqual(form.errors['name'], [u'too short'])
+        self.assertEqual(calls, [])
+
+    def test_io_bound_field(self):
+        threads = []
+
+        def validator(form, value):
+            threads.append(current_thread())
+
+        field = forms.TextField(validators=[validator])
+        field.io_bound = True
+        class FieldForm(forms.FormBase):
+            name = field
+        pool = utils.ThreadPool(1)
+        FieldForm.validator_pool = pool
+        self.assert_(FieldForm._io_bound)
+        FieldForm().validate({'name': 'foo'})
+        self.assertEqual(len(threads), 1)
+        self.assert_(threads[0] is not current_thread())
+        self.assertEqual(pool.threads, 1)
+
+        # unbound fields run the validators right away
+        del threads[:]
+        field(u'foo')
+        self.assertEqual(threads, [current_thread()])
+
+
+def make_order_form():
+    """An order form with a batch validator.  Returns the form and the list
+    of values the validator was called with.
+    """
+    lookups = []
+
+    @forms.batch_validator
+    def skus_exist(form, values):
+        lookups.append(values)
+        errors = dict((pos, ValidationError(u'unknown SKU %s' % value))
+                      for pos, value in enumerate(values)
+                      if not value.startswith(u'sku'))
+        if errors:
+            raise MultipleValidationErrors(errors)
+
+    class OrderForm(forms.FormBase):
+        rows = forms.Multiple(forms.Mapping(
+            sku=forms.TextField(validators=[skus_exist]),
+            quantity=forms.IntegerField(max_value=10)))
+        codes = forms.Multiple(forms.TextField(validators=[skus_exist]))
+        single = forms.TextField(validators=[skus_exist])
+    return OrderForm(), lookups
+
+
+class BatchValidatorTestCase(unittest.TestCase):
+
+    def test_one_call_per_path(self):
+        form, lookups = make_order_form()
+        data = {'codes.0': 'sku-1', 'codes.1': 'nope', 'single': 'x'}
+        for idx in xrange(50):
+            data['rows.%d.sku' % idx] = 'sku-%d' % idx
+            data['rows.%d.quantity' % idx] = '1'
+        data['rows.3.sku'] = 'bad'
+        data['rows.7.sku'] = 'worse'
+        data['rows.7.quantity'] = '100'
+        data['rows.9.quantity'] = '100'
+        self.assertEqual(form.validate(data), False)
+        self.assertEqual(sorted(len(x) for x in lookups), [1, 2, 50])
+        self.assertEqual(sorted(form.errors), ['codes.1', 'rows.3.sku',
+                                               'rows.7.quantity',
+                                               'rows.7.sku',
+                                               'rows.9.quantity', 'single'])
+        self.assertEqual(form.errors['rows.7.sku'], [u'unknown SKU worse'])
+        self.assertEqual(form.errors['single'], [u'unknown SKU x'])
+
+    def test_valid_data(self):
+        form, lookups = make_order_form()
+        self.assertEqual(form.validate({'rows.0.sku': 'sku-1',
+                                        'rows.0.quantity': '2',
+                                        'rows.1.sku': 'sku-2',
+                                        'rows.1.quantity': '3'}), True)
+        self.assertEqual(lookups, [[u'sku-1', u'sku-2']])
+        self.assertEqual(form.data['rows'][1], {'sku': u'sku-2',
+                                                'quantity': 3})
+
+    def test_error_for_all_values(self):
+        @forms.batch_validator
+        def unique(form, values):
+            if len(set(values)) != len(values):
+                raise ValidationError(u'values must be unique')
+        field = forms.Multiple(forms.TextField(validators=[unique]))
+
+        class TagForm(forms.FormBase):
+            tags = field
+        form = TagForm()
+        form.validate({'tags.0': 'a', 'tags.1': 'a'})
+        self.assertEqual(sorted(form.errors), ['tags.0', 'tags.1'])
+
+        # unbound fields check the values one by one
+        self.assertEqual(field([u'a', u'a']), [u'a', u'a'])
+
+    def test_other_lists_use_columns(self):
+        columns = []
+
+        class ColumnField(forms.IntegerField):
+            def convert_column(self, values):
+                columns.append(values)
+                return forms.IntegerField.convert_column(self, values)
+
+        @forms.batch_validator
+        def unique(form, values):
+            pass
+
+        @forms.io_bound
+        def known(form, value):
+            pass
+
+        class MyForm(forms.FormBase):
+            tags = forms.Multiple(forms.TextField(validators=[unique]))
+            users = forms.Multiple(forms.TextField(validators=[known]))
+            numbers = forms.Multiple(ColumnField())
+        self.assertEqual(MyForm().validate({'tags.0': 'a', 'users.0': 'b',
+                                            'numbers.0': '1',
+                                            'numbers.1': '2'}), True)
+        self.assertEqual(columns, [[u'1', u'2']])
+
+    def test_position_out_of_range(self):
+        @forms.batch_validator
+        def off_by_one(form, values):
+            raise MultipleValidationErrors({
+                len(values): ValidationError(u'invalid')})
+        field = forms.Multiple(forms.TextField(validators=[off_by_one]))
+
+        class TagForm(forms.FormBase):
+            tags = field
+        try:
+            TagForm().validate({'tags.0': 'a', 'tags.1': 'b'})
+        except ValueError, e:
+            self.assert_('off_by_one' in str(e))
+            self.assert_('position 2 of 2 values' in str(e))
+        else:
+            self.fail('no value error')
+        self.assertRaises(ValueError, field, [u'a'])
+
+
+class MemoizeTestCase(unittest.TestCase):
+
+    def test_memoized_outcomes(self):
+        calls = []
+
+        @forms.memoize(maxsize=10)
+        def is_even(form, value):
+            calls.append(value)
+            if value % 2:
+                raise ValidationError(u'%d is odd' % value)
+
+        field = forms.Multiple(forms.IntegerField(validators=[is_even]))
+        self.assertEqual(field([u'2', u'2', u'4']), [2, 2, 4])
+        for x in xrange(2):
+            try:
+                field([u'3', u'3'])
+            except ValidationError, e:
+                self.assertEqual(e.errors[1].messages, [u'3 is odd'])
+            else:
+                self.fail('no validation error')
+        self.assertEqual(calls, [2, 4, 3])
+        self.assertEqual((is_even.hits, is_even.misses), (4, 3))
+
+        # equal values of other types are checked again
+        is_even(None, 2.0)
+        self.assertEqual(calls, [2, 4, 3, 2.0])
+        is_even.clear()
+        self.assertEqual((is_even.hits, is_even.misses), (0, 0))
+
+    def test_skipped_cache(self):
+        calls = []
+        class RangeForm(forms.FormBase):
+            low = forms.IntegerField()
+            high = forms.IntegerField()
+            tags = forms.Multiple(forms.TextField())
+
+            @forms.memoize
+            @forms.depends_on_form
+            def validate_high(self, value):
+                calls.append(value)
+                if value < int(self.raw_data['low']):
+                    raise ValidationError(u'too low')
+
+            @forms.memoize(ttl=60)
+            def validate_tags(self, value):
+                calls.append(value)
+
+        for low in '1', '10':
+            form = RangeForm()
+            form.validate({'low': low, 'high': '5', 'tags.0': 'a'})
+        self.assertEqual(form.errors.keys(), ['high'])
+        self.assertEqual(calls, [5, [u'a'], 5, [u'a']])
+        self.assertEqual(RangeForm.validate_high.hits, 0)
+        # lists are unhashable
+        self.assertEqual(RangeForm.validate_tags.misses, 0)
+
+        RangeForm().validate_tags(u'a')
+        self.assertEqual(RangeForm.validate_tags.hits, 0)
+        RangeForm().validate_tags(u'a')
+        self.assertEqual(RangeForm.validate_tags.hits, 1)
+
+
+class CostTestCase(unittest.TestCase):
+
+    def test_cheap_validators_first(self):
+        calls = []
+
+        def check(name, hint=None, fails=False):
+            def validator(form, value):
+                calls.append(name)
+                if fails:
+                    raise ValidationError(u'%s failed' % name)
+            if hint is not None:
+                validator = forms.cost(hint)(validator)
+            return validator
+
+        class SignupForm(forms.FormBase):
+            username = forms.TextField(validators=[check('remote', 10),
+                                                   check('local'),
+                                                   check('regex', 1)])
+            email = forms.TextField(validators=[check('dns', 10),
+                                                check('syntax', fails=True)])
+
+            @forms.cost(-1)
+            def validate_username(self, value):
+                calls.append('length')
+
+            @forms.cost(100)
+            def context_validate(self, data):
+                calls.append('context')
+
+            @forms.cost(5)
+            def validate_email(self, value):
+                calls.append('blacklist')
+
+        form = SignupForm()
+        form.validate({'username': 'foo', 'email': 'foo'})
+        self.assertEqual(calls, ['length', 'local', 'regex', 'remote',
+                                 'syntax'])
+        self.assertEqual(form.errors['email'], [u'syntax failed'])
+
+        # the class level fields keep their order
+        self.assertEqual(SignupForm.username.validators[0].cost, 10)
+
+        del calls[:]
+        SignupForm().validate({'username': 'foo'})
+        self.assertEqual(calls[-1], 'context')
+
+
+def make_item_form():
+    """A form with a list of items that take 20 ms each to validate.
+    Returns the form and the list of validated values.
+    """
+    calls = []
+
+    def slow(form, value):
+        calls.append(value)
+        time.sleep(0.02)
+
+    class ItemForm(forms.FormBase):
+        name = forms.TextField(validators=[slow])
+
+    class OrderForm(forms.FormBase):
+        customer = forms.TextField()
+        items = forms.Multiple(ItemForm.as_field())
+    return OrderForm(), calls
+
+
+class BudgetTestCase(unittest.TestCase):
+
+    def test_abort(self):
+        form, calls = make_item_form()
+        data = dict(('items.%d.name' % idx, 'item %d' % idx)
+                    for idx in xrange(10))
+        start = time.time()
+        self.assertEqual(form.validate(data, budget=0.05), False)
+        self.assert_(time.time() - start < 0.15)
+        self.assert_(len(calls) < 10)
+        self.assertEqual(form.errors.keys(), [None])
+        self.assertEqual(form.errors[None],
+                         [u'The form could not be validated in time.'])
+        # the first item that wasn't validated
+        self.assertEqual(form.timed_out_field, 'items.%d' % len(calls))
+        self.assert_('items' not in form.data)
+
+        self.assertEqual(form.validate(data), True)
+        self.assertEqual(form.timed_out_field, None)
+        self.assertEqual(len(form.data['items']), 10)
+
+    def test_default_budget(self):
+        form, calls = make_item_form()
+        form.validation_budget = 0.01
+        self.assertEqual(form.validate({'items.0.name': 'foo',
+                                        'items.1.name': 'bar'}), False)
+        self.assertEqual(form.timed_out_field, 'items.1')
+        self.assertEqual(form.validate({'customer': 'foo'}), True)
+
+    def test_finished_in_time(self):
+        # the budget runs out in the last validator, but nothing is skipped
+        form, calls = make_item_form()
+        self.assertEqual(form.validate({'items.0.name': 'foo'}, budget=0.01),
+                         True)
+        self.assertEqual(form.timed_out_field, None)
+
+    def test_skipped_validator(self):
+        def slow(form, value):
+            time.sleep(0.02)
+        skipped = []
+
+        class MyForm(forms.FormBase):
+            name = forms.TextField(validators=[
+                slow, lambda form, value: skipped.append(value)])
+            other = forms.TextField()
+        form = MyForm()
+        self.assertEqual(form.validate({'name': 'foo'}, budget=0.01), False)
+        self.assertEqual(form.timed_out_field, 'name')
+        self.assertEqual(skipped, [])
+
+    def test_pending_results(self):
+        @forms.io_bound
+        def slow(form, value):
+            time.sleep(0.3)
+
+        class AddressForm(forms.FormBase):
+            street = forms.TextField(validators=[slow])
+
+        class MyForm(forms.FormBase):
+            name = forms.TextField()
+            addresses = forms.Multiple(AddressForm.as_field())
+            validator_pool = utils.ThreadPool(2)
+        form = MyForm()
+        start = time.time()
+        self.assertEqual(form.validate({'name': 'foo',
+                                        'addresses.0.street': 'a'},
+                                       budget=0.05), False)
+        self.assert_(time.time() - start < 0.2)
+        self.assertEqual(form.timed_out_field, 'addresses.0.street')
+
+        # results returned by validators are waited for with the budget
+        class UserForm(forms.FormBase):
+            username = forms.TextField(validators=[slow_check(0.3)])
+        form = UserForm()
+        start = time.time()
+        self.assertEqual(form.validate_async({'username': 'foo'},
+                                             budget=0.05), False)
+        self.assert_(time.time() - start < 0.2)
+        self.assertEqual(form.timed_out_field, 'username')
+
 
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(FormTestCase))
+    suite.addTest(unittest.makeSuite(ColumnTestCase))
+    suite.addTest(unittest.makeSuite(AsyncValidationTestCase))
+    suite.addTest(unittest.makeSuite(IOBoundValidatorTestCase))
+    suite.addTest(unittest.makeSuite(BatchValidatorTestCase))
+    suite.addTest(unittest.makeSuite(MemoizeTestCase))
+    suite.addTest(unittest.makeSuite(CostTestCase))
+    suite.addTest(unittest.makeSuite(BudgetTestCase))
     return suite
 
 
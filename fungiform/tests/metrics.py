@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.tests.metrics
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Unittests for the form events and the metrics aggregator.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+from fungiform import forms
+from fungiform.metrics import FormMetrics, Histogram
+from fungiform.tests.csrf import RecordingSession, make_form_class
+
+
+class EventForm(forms.FormBase):
+    name = forms.TextField(required=True)
+    tags = forms.Multiple(forms.IntegerField())
+
+    def __init__(self, *args, **kwargs):
+        forms.FormBase.__init__(self, *args, **kwargs)
+        self.events = []
+
+    def on_validate_start(self):
+        self.events.append(('start', self.raw_data.get('name')))
+
+    def on_validate_end(self, duration, valid):
+        self.events.append(('end', valid))
+        forms.FormBase.on_validate_end(self, duration, valid)
+
+    def on_field_error(self, name, errors):
+        self.events.append(('error', name, list(errors)))
+
+    def on_render(self, duration):
+        self.events.append('render')
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_events(self):
+        form = EventForm()
+        form.validate({'name': '', 'tags': ['1', 'x']})
+        self.assertEqual(form.events[0], ('start', u''))
+        self.assertEqual(sorted(form.events[1:-1]), [
+            ('error', 'name', [u'This field is required.']),
+            ('error', 'tags.1', [u'Please enter a whole number.'])])
+        self.assertEqual(form.events[-1], ('end', False))
+        form.as_widget().render()
+        self.assertEqual(form.events[-1], 'render')
+
+        form = EventForm()
+        form.validate({'name': 'foo'})
+        self.assertEqual(form.events, [('start', u'foo'), ('end', True)])
+
+    def test_end_event_on_exception(self):
+        def fail(form, value):
+            raise RuntimeError('broken validator')
+
+        class BrokenForm(EventForm):
+            name = forms.TextField(validators=[fail])
+        form = BrokenForm()
+        self.assertRaises(RuntimeError, form.validate, {'name': 'foo'})
+        self.assertEqual(form.events, [('start', u'foo'), ('end', False)])
+
+    def test_aggregator(self):
+        metrics = FormMetrics()
+        EventForm.metrics = metrics
+        try:
+            for x in xrange(3):
+                form = EventForm()
+                form.validate({'name': 'foo', 'tags': ['x', str(x)]})
+            EventForm().validate({'name': 'foo'})
+        finally:
+            del EventForm.metrics
+        self.assertEqual(metrics.validations.get(('EventForm', 'invalid')),
+                         3)
+        self.assertEqual(metrics.validations.get(('EventForm', 'valid')), 1)
+        snapshot = metrics.snapshot()
+        self.assert_('fungiform_validation_seconds_count{form="EventForm"} '
+                     '4\n' in snapshot)
+        self.assert_('fungiform_validations_total{form="EventForm",'
+                     'result="invalid"} 3\n' in snapshot)
+        # the field errors are only passed to the form's own hook
+        self.assert_('fungiform_field_errors_total' not in snapshot)
+
+    def test_csrf_and_captcha_failures(self):
+        metrics = FormMetrics()
+        form_class = make_form_class(signed_csrf_tokens=True,
+                                     metrics=metrics)
+        session = RecordingSession(csrf_secret='abc')
+        form_class(session).validate({'username': 'john',
+                                      '_csrf_token': 'invalid'})
+        form_class(session).validate({'username': 'john'})
+        self.assertEqual(metrics.csrf_failures.get(('LoginForm',)), 2)
+        self.assertEqual(metrics.field_errors.get(('LoginForm',
+                                                   '__form__')), 2)
+
+        form_class = make_form_class(csrf_protected=False,
+                                     captcha_protected=True,
+                                     metrics=metrics)
+        form = form_class(session)
+        form.recaptcha_verifier = lambda *args: False
+        form._get_remote_addr = lambda: '127.0.0.1'
+        form.validate({'username': 'john', 'recaptcha_challenge_field': 'a',
+                       'recaptcha_response_field': 'b'})
+        self.assertEqual(metrics.captcha_failures.get(('LoginForm',)), 1)
+        self.assert_('fungiform_captcha_failures_total{form="LoginForm"} 1'
+                     in metrics.snapshot())
+
+    def test_histogram(self):
+        histogram = Histogram('latency', 'Latency.', ('form',),
+                              buckets=[0.1, 1])
+        for value in 0.05, 0.1, 0.5, 2:
+            histogram.observe(('A"\\',), value)
+        self.assertEqual(list(histogram.samples()), [
+            u'latency_bucket{form="A\\"\\\\",le="0.1"} 2',
+            u'latency_bucket{form="A\\"\\\\",le="1"} 3',
+            u'latency_bucket{form="A\\"\\\\",le="+Inf"} 4',
+            u'latency_sum{form="A\\"\\\\"} 2.65',
+            u'latency_count{form="A\\"\\\\"} 4'])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(MetricsTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.tests.profiling
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Unittests for the profiler.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+from fungiform import forms, widgets
+from fungiform.exceptions import ValidationError
+from fungiform.profiling import Profiler
+
+
+def is_short(form, value):
+    if len(value) > 5:
+        raise ValidationError(u'Too long')
+
+
+class AddressForm(forms.FormBase):
+    street = forms.TextField(validators=[is_short])
+
+
+class UserForm(forms.FormBase):
+    username = forms.TextField(validators=[is_short])
+    addresses = forms.Multiple(AddressForm.as_field())
+    tags = forms.Multiple(forms.TextField(validators=[is_short]))
+
+    def validate_username(self, value):
+        pass
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def validate(self, profiler, data):
+        form = UserForm()
+        with profiler.profile(form):
+            form.validate(data)
+        self.assertEqual(form.profiler, None)
+        return form
+
+    def test_validation_stats(self):
+        profiler = Profiler()
+        form = self.validate(profiler, {
+            'username':             'foo',
+            'addresses.0.street':   'a',
+            'addresses.1.street':   'too long',
+            'tags.0':               'a',
+            'tags.1':               'toooo long',
+            'tags.2':               'b'})
+        self.assertEqual(sorted(form.errors), ['addresses.1.street',
+                                               'tags.1'])
+        stats = dict((key, value[0]) for key, value
+                     in profiler.stats.iteritems())
+        self.assertEqual(stats, {
+            ('form', 'UserForm.validate'):      1,
+            ('field', 'username'):              1,
+            ('field', 'addresses'):             1,
+            ('field', 'addresses.street'):      2,
+            ('field', 'tags'):                  1,
+            ('validator', 'is_short'):          6,
+            ('validator', 'validate_username'): 1})
+        self.assertEqual(profiler._stack, [])
+
+        stacks = sorted(line.rsplit(' ', 1)[0]
+                        for line in profiler.collapsed().splitlines())
+        self.assertEqual(stacks, [
+            'UserForm.validate',
+            'UserForm.validate;addresses',
+            'UserForm.validate;addresses;street',
+            'UserForm.validate;addresses;street;validator:is_short',
+            'UserForm.validate;tags',
+            'UserForm.validate;tags;validator:is_short',
+            'UserForm.validate;username',
+            'UserForm.validate;username;validator:is_short',
+            'UserForm.validate;username;validator:validate_username'])
+
+        report = profiler.report(limit=2).splitlines()
+        self.assertEqual(len(report), 3)
+        self.assert_(report[1].startswith('form       UserForm.validate'))
+
+    def test_render_stats(self):
+        profiler = Profiler()
+        form = UserForm()
+        widget = form.as_widget()
+        with profiler.profile(UserForm):
+            widget.render()
+            widget['username'].render()
+        stats = dict((key, value[0]) for key, value
+                     in profiler.stats.iteritems())
+        self.assertEqual(stats[('widget', 'FormWidget')], 1)
+        # the three inputs of the form and the username again
+        self.assertEqual(stats[('widget', 'TextInput')], 4)
+        self.assert_('widget:FormWidget;widget:TextInput' in
+                     profiler.collapsed())
+        self.assertEqual(UserForm.profiler, None)
+
+    def test_disabled(self):
+        form = UserForm()
+        form.validate({'username': 'foo'})
+        self.assertEqual(form.profiler, None)
+        widget = form.as_widget()['username']
+        self.assertEqual(widget.render(), widgets.TextInput.render(widget))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(ProfilerTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
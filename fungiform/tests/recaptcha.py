@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.tests.recaptcha
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    The unittests for the recaptcha support.  The verify server is replaced
+    by a local stub server.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import time
+import unittest
+import threading
+from threading import Thread, Lock
+from cgi import parse_qsl
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from fungiform import forms, recaptcha, utils
+
+
+class StubVerifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        args = dict(parse_qsl(self.rfile.read(length)))
+        self.server.count('requests')
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.drop:
+            # the request arrived but the connection breaks
+            self.close_connection = 1
+            return
+        if args['privatekey'] != 'private':
+            body = 'false\ninvalid-site-private-key'
+        elif args['response'] == 'correct':
+            body = 'true\nsuccess'
+        else:
+            body = 'false\nincorrect-captcha-sol'
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubVerifyServer(ThreadingMixIn, HTTPServer):
+    """A local replacement for the recaptcha verify server.  Responses
+    equal to ``'correct'`` are accepted, every request is delayed by
+    `delay` seconds.  Responses have the given `status`, if `drop` is set
+    the connection is closed without a response.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubVerifyHandler)
+        self.delay = delay
+        self.status = 200
+        self.drop = False
+        self.connections = self.requests = 0
+        self._lock = Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/verify' % self.server_address[1]
+
+    def count(self, what):
+        self._lock.acquire()
+        try:
+            setattr(self, what, getattr(self, what) + 1)
+        finally:
+            self._lock.release()
+
+    def handle_error(self, request, client_address):
+        # clients that timed out close the connection early
+        pass
+
+    def __enter__(self):
+        thread = Thread(target=self.serve_forever, args=(0.01,))
+        thread.setDaemon(True)
+        thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+        self.server_close()
+
+
+class RecaptchaVerifierTestCase(unittest.TestCase):
+
+    def test_verify(self):
+        with StubVerifyServer() as server:
+            verifier = recaptcha.RecaptchaVerifier(server.url)
+            for x in xrange(5):
+                self.assert_(verifier('private', u'chal', u'correct',
+                                      u'127.0.0.1'))
+                self.failIf(verifier('private', u'chal', u'wrong',
+                                     u'127.0.0.1'))
+            self.failIf(verifier('private', u'chal', None, u'127.0.0.1'))
+            self.assertRaises(RuntimeError, verifier, 'wrong', u'chal',
+                              u'correct', u'127.0.0.1')
+            verifier.close()
+        self.assertEqual(server.requests, 11)
+        self.assertEqual(server.connections, 1)
+
+    def test_reconnect(self):
+        with StubVerifyServer() as server:
+            verifier = recaptcha.RecaptchaVerifier(server.url)
+            self.assert_(verifier('private', u'c', u'correct', u'127.0.0.1'))
+            # the server went away, the pooled connection is dead
+            verifier._pool[0].sock.close()
+            self.assert_(verifier('private', u'c', u'correct', u'127.0.0.1'))
+            verifier.close()
+        self.assertEqual(server.connections, 2)
+
+    def test_no_resubmit(self):
+        with StubVerifyServer() as server:
+            for fail_open in False, True:
+                verifier = recaptcha.RecaptchaVerifier(server.url,
+                                                       fail_open=fail_open)
+                self.assert_(verifier('private', u'c', u'correct',
+                                      u'127.0.0.1'))
+                server.drop = True
+                # the request reached the server on the pooled connection,
+                # sending it again would reuse the captcha response
+                self.assertEqual(verifier('private', u'c', u'correct',
+                                          u'127.0.0.1'), fail_open)
+                server.drop = False
+                self.assertEqual(verifier._pool, [])
+        self.assertEqual(server.requests, 4)
+
+    def test_error_status(self):
+        with StubVerifyServer() as server:
+            server.status = 503
+            for fail_open in False, True:
+                verifier = recaptcha.RecaptchaVerifier(server.url,
+                                                       fail_open=fail_open)
+                self.assertEqual(verifier('private', u'c', u'wrong',
+                                          u'127.0.0.1'), fail_open)
+                self.assertEqual(verifier._pool, [])
+        self.assertEqual(server.requests, 2)
+
+    def test_timeout_policy(self):
+        with StubVerifyServer(delay=0.25) as server:
+            for fail_open in False, True:
+                verifier = recaptcha.RecaptchaVerifier(server.url,
+                                                       read_timeout=0.05,
+                                                       fail_open=fail_open)
+                start = time.time()
+                self.assertEqual(verifier('private', u'c', u'wrong',
+                                          u'127.0.0.1'), fail_open)
+                self.assert_(time.time() - start < 0.2)
+                self.assertEqual(verifier._pool, [])
+            # let the delayed handlers finish
+            time.sleep(server.delay)
+
+    def test_concurrency(self):
+        results = []
+        with StubVerifyServer(delay=0.05) as server:
+            verifier = recaptcha.RecaptchaVerifier(server.url, pool_size=4)
+
+            def worker():
+                for x in xrange(5):
+                    results.append(verifier('private', u'c', u'correct',
+                                            u'127.0.0.1'))
+            threads = [Thread(target=worker) for x in xrange(8)]
+            start = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.time() - start
+            verifier.close()
+        self.assertEqual(results, [True] * 40)
+        # the requests ran in parallel instead of 40 * 0.05 seconds
+        self.assert_(elapsed < 1.5, elapsed)
+        self.assert_(server.connections <= 8 + 4 * 5)
+
+    def test_form_integration(self):
+        with StubVerifyServer() as server:
+            class CaptchaForm(forms.FormBase):
+                captcha_protected = True
+                recaptcha_private_key = 'private'
+                recaptcha_verifier = recaptcha.RecaptchaVerifier(server.url)
+                name = forms.TextField()
+
+                def _get_remote_addr(self):
+                    return u'127.0.0.1'
+
+            form = CaptchaForm()
+            self.assert_(form.validate({
+                'recaptcha_challenge_field':    u'c',
+                'recaptcha_response_field':     u'correct'
+            }))
+            form = CaptchaForm()
+            self.failIf(form.validate({
+                'recaptcha_challenge_field':    u'c',
+                'recaptcha_response_field':     u'wrong'
+            }))
+            self.assertEqual(form.errors[None],
+                             [u'You entered an invalid captcha.'])
+            CaptchaForm.recaptcha_verifier.close()
+
+
+class BackgroundCaptchaTestCase(unittest.TestCase):
+
+    def make_form_class(self, server, delay=0):
+        class CaptchaForm(forms.FormBase):
+            captcha_protected = True
+            recaptcha_background = True
+            recaptcha_private_key = 'private'
+            recaptcha_verifier = recaptcha.RecaptchaVerifier(server.url)
+            name = forms.TextField(required=True)
+
+            def validate_name(self, value):
+                time.sleep(delay)
+
+            def _get_remote_addr(self):
+                return u'127.0.0.1'
+        return CaptchaForm
+
+    def test_overlaps_field_validation(self):
+        with StubVerifyServer(delay=0.2) as server:
+            form = self.make_form_class(server, delay=0.2)()
+            start = time.time()
+            self.assert_(form.validate({
+                'name':                         u'John',
+                'recaptcha_challenge_field':    u'c',
+                'recaptcha_response_field':     u'correct'
+            }))
+            self.assert_(time.time() - start < 0.35)
+            form.recaptcha_verifier.close()
+
+    def test_not_awaited_for_invalid_fields(self):
+        with StubVerifyServer(delay=0.2) as server:
+            form = self.make_form_class(server)()
+            form.validator_pool = utils.ThreadPool(1)
+            start = time.time()
+            self.failIf(form.validate({
+                'recaptcha_challenge_field':    u'c',
+                'recaptcha_response_field':     u'wrong'
+            }))
+            self.assert_(time.time() - start < 0.15)
+            self.assertEqual(form.errors.keys(), ['name'])
+            # wait for the check that still runs in the only worker
+            form.validator_pool.submit(time.time).result()
+            form.recaptcha_verifier.close()
+
+    def test_abandoned_checks_are_bounded(self):
+        calls = []
+        workers = set()
+
+        def slow_verify(*args):
+            calls.append(args)
+            workers.add(threading.current_thread())
+            time.sleep(0.1)
+            return False
+
+        class CaptchaForm(forms.FormBase):
+            captcha_protected = True
+            recaptcha_background = True
+            recaptcha_verifier = staticmethod(slow_verify)
+            validator_pool = utils.ThreadPool(2)
+            name = forms.TextField(required=True)
+
+            def _get_remote_addr(self):
+                return u'127.0.0.1'
+
+        before = set(threading.enumerate())
+        for x in xrange(20):
+            # the name is missing, the check is cancelled and not waited for
+            self.failIf(CaptchaForm().validate({
+                'recaptcha_challenge_field':    u'c%d' % x,
+                'recaptcha_response_field':     u'correct'
+            }))
+        # only the workers of the pool run checks
+        threads = set(threading.enumerate()) - before
+        self.assert_(workers <= threads)
+        self.assert_(len(threads) <= CaptchaForm.validator_pool.threads)
+        self.assertEqual(CaptchaForm.validator_pool.threads, 2)
+        # checks cancelled while they were queued never run
+        time.sleep(0.3)
+        self.assert_(len(calls) < 20)
+
+    def test_result_is_remembered(self):
+        with StubVerifyServer() as server:
+            for background in False, True:
+                form = self.make_form_class(server)()
+                form.recaptcha_background = background
+                data = {
+                    'name':                         u'John',
+                    'recaptcha_challenge_field':    u'c',
+                    'recaptcha_response_field':     u'wrong'
+                }
+                self.failIf(form.validate(data))
+                self.failIf(form.validate(data))
+                self.assertEqual(form.errors[None],
+                                 [u'You entered an invalid captcha.'])
+                form.recaptcha_verifier.close()
+        self.assertEqual(server.requests, 2)
+
+
+class RecaptchaHTMLTestCase(unittest.TestCase):
+
+    def test_cached_fragments(self):
+        class Translations(object):
+            def __init__(self, prefix):
+                self.prefix = prefix
+
+            def ugettext(self, string):
+                return self.prefix + string
+
+        html = recaptcha.get_recaptcha_html(u'key')
+        self.assert_(recaptcha.get_recaptcha_html(u'key') is html)
+        self.assert_('challenge?k=key"' in html)
+        self.assert_('"help_btn": "Help"' in html)
+
+        self.assert_(recaptcha.get_recaptcha_html(u'key', False) is not html)
+        with_error = recaptcha.get_recaptcha_html(u'key', error='wrong')
+        self.assert_('error=wrong' in with_error)
+
+        german = recaptcha.get_recaptcha_html(u'key',
+                                              translations=Translations('de'))
+        self.assert_('"help_btn": "deHelp"' in german)
+        self.assert_(recaptcha.get_recaptcha_html(
+            u'key', translations=Translations('de')) is german)
+        self.assert_('"help_btn": "frHelp"' in recaptcha.get_recaptcha_html(
+            u'key', translations=Translations('fr')))
+        self.assert_(len(recaptcha._html_cache) <=
+                     recaptcha._html_cache.capacity)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(RecaptchaVerifierTestCase))
+    suite.addTest(unittest.makeSuite(BackgroundCaptchaTestCase))
+    suite.addTest(unittest.makeSuite(RecaptchaHTMLTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
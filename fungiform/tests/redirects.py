@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+    fungiform.tests.redirects
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Unittests for the redirect helpers.
+
+    :copyright: (c) 2010 by the Fungiform Team.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+from fnmatch import fnmatch
+from fungiform import forms
+from fungiform.redirects import RedirectRules, get_redirect_target, \
+     get_url_context
+
+
+RULES = ['example.com', '*.example.com', 'www?.example.org',
+         'host[0-9].example.net', 'a.b', '*']
+
+HOSTS = ['example.com', 'www.example.com', 'a.b.example.com',
+         'example.org', 'www1.example.org', 'www12.example.org',
+         'host5.example.net', 'hostx.example.net', 'a.b', 'axb',
+         'example.com.evil.com', '', 'EXAMPLE.COM']
+
+
+def make_environ(referrer=None):
+    environ = {
+        'wsgi.url_scheme':  'http',
+        'HTTP_HOST':        'localhost',
+        'SCRIPT_NAME':      '',
+        'PATH_INFO':        '/login',
+        'QUERY_STRING':     ''
+    }
+    if referrer is not None:
+        environ['HTTP_REFERER'] = referrer
+    return environ
+
+
+class RedirectRulesTestCase(unittest.TestCase):
+
+    def test_matches_like_fnmatch(self):
+        for count in xrange(len(RULES)):
+            rules = RULES[:count]
+            compiled = RedirectRules(rules)
+            for host in HOSTS:
+                expected = any(fnmatch(host, rule) for rule in rules)
+                self.assertEqual(compiled.match(host), expected,
+                                 '%r against %r' % (host, rules))
+
+    def test_redirect_target(self):
+        for rules in [], ['*.example.com'], ['example.com']:
+            for allowed in rules, RedirectRules(rules):
+                for host in 'localhost', 'example.com', 'foo.example.com':
+                    url = 'http://%s/account' % host
+                    expected = get_redirect_target(make_environ(url),
+                                                   allowed_redirects=rules)
+                    self.assertEqual(get_redirect_target(make_environ(url),
+                                     allowed_redirects=allowed), expected)
+        rules = RedirectRules(['*.example.com'])
+        environ = make_environ('http://foo.example.com/account')
+        self.assertEqual(get_redirect_target(environ, allowed_redirects=rules),
+                         'http://foo.example.com/account')
+        environ = make_environ('http://example.com/account')
+        self.assertEqual(get_redirect_target(environ,
+                                             allowed_redirects=rules), None)
+
+    def test_compiled_on_form_class(self):
+        class MyForm(forms.FormBase):
+            allowed_redirect_rules = ['*.example.com']
+        rules = MyForm.allowed_redirect_rules
+        self.assert_(isinstance(rules, RedirectRules))
+        self.assertEqual(list(rules), ['*.example.com'])
+
+        class OtherForm(MyForm):
+            pass
+        self.assert_(OtherForm.allowed_redirect_rules is rules)
+
+
+class URLContextTestCase(unittest.TestCase):
+
+    def test_shared_per_environ(self):
+        environ = make_environ()
+        context = get_url_context(environ)
+        self.assert_(get_url_context(environ) is context)
+        self.assertEqual(context.url, 'http://localhost/login')
+        self.assertEqual(context.root_url, 'http://localhost/')
+        self.assertEqual(context.host, 'localhost')
+        environ['PATH_INFO'] = '/logout'
+        other = get_url_context(environ)
+        self.assert_(other is not context)
+        self.assertEqual(other.url, 'http://localhost/logout')
+
+    def test_invalid_targets(self):
+        environ = make_environ('http://localhost/edit?id=1&x=y')
+        self.assertEqual(get_redirect_target(environ, invalid_targets=
+                         ['/delete', '/edit?id=1']), None)
+        self.assertEqual(get_redirect_target(environ, invalid_targets=
+                         ['/delete', '/edit?id=2']),
+                         'http://localhost/edit?id=1&x=y')
+        environ = make_environ('/login')
+        self.assertEqual(get_redirect_target(environ), None)
+
+    def test_form_uses_context(self):
+        environ = make_environ('/account')
+
+        class MyForm(forms.FormBase):
+            def _get_wsgi_environ(self):
+                return environ
+        form = MyForm(action='/do', request_info=object())
+        self.assertEqual(form.action, 'http://localhost/do')
+        context = form._get_url_context()
+        self.assert_(context is get_url_context(environ))
+        self.assertEqual(form._get_request_url(), context.url)
+
+        # the invalid targets are parsed by the shared context
+        parsed = []
+        parse = context.parse
+        context.parse = lambda url: parsed.append(url) or parse(url)
+        form.raw_data = {}
+        form.add_invalid_redirect_target('/account')
+        self.assertEqual(form.redirect_target, None)
+        self.assert_('/account' in parsed)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(RedirectRulesTestCase))
+    suite.addTest(unittest.makeSuite(URLContextTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
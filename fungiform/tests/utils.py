@@ -9,7 +9,12 @@
     :license: BSD, see LICENSE for more details.
 """
 import unittest
-from fungiform import utils
+import warnings
+from datetime import datetime, date, timedelta, tzinfo
+from itertools import product
+from threading import current_thread
+from time import strptime
+from fungiform import forms, utils
 
 
 class WebObLikeDict(object):
@@ -28,6 +33,86 @@ class WerkzeugLikeDict(object):
         yield 'key2', ['awesome']
 
 
+class OrderedLists(list):
+    """Form data that yields the keys in a given order."""
+
+    def iterlists(self):
+        return iter(self)
+
+
+class FixedOffset(tzinfo):
+
+    def __init__(self, hours):
+        self.offset = timedelta(hours=hours)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+    def localize(self, dt):
+        return dt.replace(tzinfo=self)
+
+
+def sequential_parse_datetime(string, tzinfo=None, date_formats=None,
+                              time_formats=None):
+    """`parse_datetime` as it was before the formats were classified."""
+    def convert(format):
+        rv = datetime(*strptime(string, format)[:7])
+        if tzinfo:
+            rv = utils.to_utc(rv, tzinfo)
+        return rv.replace(microsecond=0)
+    try:
+        return convert(u'%Y-%m-%d %H:%M')
+    except ValueError:
+        pass
+    time_formats = time_formats or utils.TIME_FORMATS
+    for fmt in time_formats:
+        try:
+            val = convert(fmt)
+        except ValueError:
+            continue
+        return utils.to_utc(datetime.utcnow().replace(hour=val.hour,
+                            minute=val.minute, second=val.second,
+                            microsecond=0), tzinfo=tzinfo)
+    date_formats = date_formats or utils.DATE_FORMATS
+    for t_fmt in time_formats:
+        for d_fmt in date_formats:
+            for fmt in t_fmt + ' ' + d_fmt, d_fmt + ' ' + t_fmt:
+                try:
+                    return convert(fmt)
+                except ValueError:
+                    pass
+    raise ValueError('invalid date format')
+
+
+def sequential_parse_date(string, date_formats=None):
+    """`parse_date` as it was before the formats were classified."""
+    for fmt in [u'%Y-%m-%d'] + list(date_formats or utils.DATE_FORMATS):
+        try:
+            return date(*strptime(string, fmt)[:3])
+        except ValueError:
+            pass
+    raise ValueError('invalid date format')
+
+
+def date_inputs():
+    """Yields date, time and datetime strings of many shapes."""
+    dates = ['2010-11-12', '12/11/2010', '01/02/2010', '13/02/2010',
+             '2/3/10', '31/02/2010', '20101112', '121110', '12. 11. 2010',
+             '12.11.2010', '1.2.2010', '2010-1-2', '2010/11/12', '1/2/3',
+             '99999999', '1212', '']
+    times = ['10:30', '1:05', '10:30:15', '25:00', '10:30 PM', '1:05:09 am',
+             '12:00 pm', '10:30 xm', '10:30:61']
+    for value in dates + times:
+        yield value
+        yield ' ' + value
+        yield value + ' '
+    for d, t in product(dates[::2], times):
+        yield d + ' ' + t
+        yield t + '  ' + d
+    for value in u'now', u'today', u'foo', u'12 Nov 2010', u'\u0661/2/2010':
+        yield value
+
+
 class UtilsTestCase(unittest.TestCase):
 
     assertEq = unittest.TestCase.assertEqual
@@ -45,12 +130,41 @@ class UtilsTestCase(unittest.TestCase):
         })
         self.assertEqual(d['a_list'], ['foo', 'bar', 'meh', 'baz'])
 
+    def test_decode_keeps_submitted_lists(self):
+        values = ['foo', 'bar']
+        d = utils.decode_form_data({'a_list': values, 'a_list.0': 'baz'})
+        self.assertEqual(d['a_list'], ['foo', 'bar', 'baz'])
+        self.assertEqual(values, ['foo', 'bar'])
+
+    def test_decode_mixed_keys(self):
+        # the result must not depend on the order of the keys
+        for keys in ['0.x', 'name'], ['name', '0.x']:
+            d = utils.decode_form_data(OrderedLists(
+                (key, ['foo']) for key in keys))
+            self.assertEqual(d, {0: {'x': 'foo'}, 'name': 'foo'})
+
     def test_decode_form_data_multidicts(self):
         for dcls in WebObLikeDict, WerkzeugLikeDict:
             d = utils.decode_form_data(dcls())
             self.assertEqual(d['key1'], ['value1', 'value2', 'value3'])
             self.assertEqual(d['key2'], 'awesome')
 
+    def test_nan_is_in_range(self):
+        numbers = [float('nan'), -1.0, 2.0] * utils.NUMPY_COLUMN_THRESHOLD
+        expected = (range(1, len(numbers), 3), range(2, len(numbers), 3))
+        for with_numpy in True, False:
+            old_numpy = utils.numpy
+            if not with_numpy:
+                utils.numpy = None
+            old_filters = warnings.filters[:]
+            warnings.simplefilter('error')
+            try:
+                result = utils._find_out_of_range(numbers, 0, 1)
+            finally:
+                warnings.filters[:] = old_filters
+                utils.numpy = old_numpy
+            self.assertEqual(result, expected)
+
     def test_escape(self):
         s1 = ('This string contains "<tags>" & "double-quotes", '
               'and single quotes "\'".')
@@ -101,6 +215,126 @@ class UtilsTestCase(unittest.TestCase):
         self.assertEqual((an_object.foo, an_object.bar), ('Foo', 'Bar'))
         self.assertEqual(an_object.__dict__, dic1)
 
+    def assertSameOutcome(self, func, expected_func, *args, **kwargs):
+        try:
+            expected = expected_func(*args, **kwargs)
+        except Exception, exc:
+            self.assertRaises(type(exc), func, *args, **kwargs)
+            return
+        result = func(*args, **kwargs)
+        # times are parsed for the current day
+        if isinstance(result, datetime) and \
+           result.date() != expected.date() and \
+           abs(result - expected) < timedelta(days=1):
+            expected += result.date() - expected.date()
+        self.assertEqual(result, expected, '%r %r' % (args, kwargs))
+
+    def test_parse_date_like_sequential(self):
+        formats = [None, ['%d %b %Y', '%m/%d/%Y'], ['%Y%m%d%%'], ['%d.%m.%y']]
+        for date_formats in formats:
+            for value in date_inputs():
+                if value.lower() == 'today':
+                    continue
+                # the second time the result comes from the cache
+                for attempt in 0, 1:
+                    self.assertSameOutcome(utils.parse_date,
+                                           sequential_parse_date,
+                                           value, date_formats)
+
+    def test_parse_datetime_like_sequential(self):
+        options = [{}, {'tzinfo': FixedOffset(2)},
+                   {'date_formats': ['%d %b %Y', '%d.%m.%y']},
+                   {'time_formats': ['%H.%M', '%I%p']}]
+        for kwargs in options:
+            for value in date_inputs():
+                if value.lower() == 'now':
+                    continue
+                for attempt in 0, 1:
+                    self.assertSameOutcome(utils.parse_datetime,
+                                           sequential_parse_datetime,
+                                           value, **kwargs)
+
+    def test_set_fields_bulk(self):
+        Object = type('Object', (), {})
+        objects = []
+        for idx in xrange(3):
+            obj = Object()
+            obj.id, obj.foo, obj.bar = idx, 'Foo', 'Bar'
+            objects.append(obj)
+        rows = [{'foo': 'Foo', 'bar': 'Bar'}, {'foo': 'Foo', 'bar': 'Baz'},
+                {'foo': 'Moo', 'bar': 'Baz'}]
+        initial = [{'foo': 'Foo', 'bar': 'Bar'}] * 3
+        expected = [(1, {'bar': 'Baz'}), (2, {'foo': 'Moo', 'bar': 'Baz'})]
+        self.assertEqual(utils.set_fields_bulk(initial, rows), expected)
+        self.assertEqual(utils.set_fields_bulk(objects, rows, 'foo',
+                                               apply=False),
+                         [(2, {'foo': 'Moo'})])
+        self.assertEqual(objects[2].foo, 'Foo')
+        self.assertEqual(utils.set_fields_bulk(objects, rows,
+                         key=lambda x: x.id + 10),
+                         [(11, {'bar': 'Baz'}),
+                          (12, {'foo': 'Moo', 'bar': 'Baz'})])
+        self.assertEqual([(x.foo, x.bar) for x in objects],
+                         [('Foo', 'Bar'), ('Foo', 'Baz'), ('Moo', 'Baz')])
+        self.assertEqual(objects[0].__dict__, {'id': 0, 'foo': 'Foo',
+                                               'bar': 'Bar'})
+        self.assertEqual(utils.set_fields_bulk(objects, rows), [])
+        self.assertRaises(ValueError, utils.set_fields_bulk, objects, [])
+        self.assertRaises(TypeError, utils.set_fields_bulk, objects, rows,
+                          kye=id)
+
+    def test_set_fields_bulk_primitives(self):
+        field = forms.Multiple(forms.Mapping(id=forms.IntegerField(),
+                                             qty=forms.IntegerField()))
+        rows = field([{'id': u'1', 'qty': u'2'}, {'id': u'2', 'qty': u'5'}])
+        initial = field.to_primitive([{'id': 1, 'qty': 2},
+                                      {'id': 2, 'qty': 3}])
+        self.assertEqual(initial[0], {'id': u'1', 'qty': u'2'})
+        self.assertEqual(utils.set_fields_bulk(initial, rows,
+                                               field=field.field),
+                         [(1, {'qty': 5})])
+        self.assertEqual(utils.set_fields_bulk(initial, rows, 'qty',
+                                               field=field.field),
+                         [(1, {'qty': 5})])
+        # without the field Python values are compared with the strings
+        self.assertEqual(len(utils.set_fields_bulk(initial, rows)), 2)
+
+    def test_lru_cache_ttl(self):
+        cache = utils.LRUCache(2, ttl=10)
+        cache.set('a', 1, now=100)
+        cache.set('b', 2, now=105)
+        self.assertEqual(cache.get('a', now=109), 1)
+        self.assertEqual(cache.get('a', now=110), None)
+        self.assertEqual(len(cache), 1)
+        cache.set('c', 3, now=110)
+        cache.set('d', 4, now=110)
+        self.assertEqual(cache.get('b', now=111), None)
+        self.assertEqual(cache.get('c', now=111), 3)
+
+    def test_thread_pool(self):
+        pool = utils.ThreadPool(2)
+        results = [pool.submit(divmod, 7, x) for x in (1, 2, 0, 3)]
+        self.assertEqual(results[0].result(), (7, 0))
+        self.assertRaises(ZeroDivisionError, results[2].result)
+        self.assertEqual(results[3].result(), (2, 1))
+        self.assert_(results[1].done())
+        self.assertEqual(pool.threads, 2)
+
+    def test_nested_thread_pool_calls(self):
+        pool = utils.ThreadPool(1)
+
+        def outer():
+            inner = pool.submit(current_thread)
+            return current_thread(), inner.result()
+        try:
+            outer_thread, inner_thread = pool.submit(outer).result(5)
+        except utils.PoolTimeout:
+            self.fail('nested call deadlocked')
+        self.assert_(outer_thread is inner_thread)
+        self.assert_(outer_thread is not current_thread())
+        self.assertEqual(pool.threads, 1)
+        self.assert_(pool.submit(current_thread).result() is outer_thread)
+
 
 def suite():
     suite = unittest.TestSuite()
@@ -115,6 +115,33 @@ class WidgetTestCase(unittest.TestCase):
             u'name="addresses.42.street">',
             form.as_widget()['addresses'][42]['street']())
 
+    def test_input_group_lazy_subwidgets(self):
+        class MyForm(forms.FormBase):
+            choice = forms.ChoiceField(choices=[(x, 'Choice %d' % x)
+                                                for x in xrange(100)],
+                                       widget=widgets.RadioButtonGroup)
+        form = MyForm()
+        form.validate({'choice': '42'})
+        widget = form.as_widget()['choice']
+        self.assertEqual(widget.errors, [])
+        self.assertEqual(widget._subwidgets, {})
+
+        member = widget[42]
+        self.assertEqual(widget._subwidgets.keys(), [42])
+        self.assert_(widget[42] is member)
+        self.assertEqual(member.id, 'f_choice_42')
+        self.assert_(member.checked)
+        self.assert_(not widget[41].checked)
+        self.assertEqual(u'<label for="f_choice_42">Choice 42</label>',
+                         member.label())
+        self.assertRaises(KeyError, widget.__getitem__, 100)
+
+        members = list(widget)
+        self.assertEqual(len(members), 100)
+        self.assert_(members[42] is member)
+        self.assertEqual([x.value for x in widget.choices],
+                         [unicode(x) for x in xrange(100)])
+
 
 def suite():
     suite = unittest.TestSuite()
@@ -9,11 +9,19 @@
     :license: BSD, see LICENSE for more details.
 """
 import re
-import urllib
+import sys
 from copy import deepcopy
 from itertools import izip, imap
 from datetime import datetime, date
-from time import strptime
+from Queue import Queue
+from threading import Event, Lock, Thread, local
+from time import strptime, time
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from fungiform.redirects import get_current_url, get_host
 
 DATE_FORMATS = ['%m/%d/%Y', '%d/%m/%Y', '%Y%m%d', '%d. %m. %Y',
                 '%m/%d/%y', '%d/%m/%y', '%d%m%y', '%m%d%y', '%y%m%d']
@@ -21,39 +29,6 @@ TIME_FORMATS = ['%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M:%S %p']
 _missing = object()
 
 
-def get_current_url(environ):
-    """A handy helper function that recreates the full URL for the current
-    request.
-
-    :param environ: the WSGI environment to get the current URL from.
-    """
-    tmp = [environ['wsgi.url_scheme'], '://', get_host(environ)]
-    cat = tmp.append
-    cat(urllib.quote(environ.get('SCRIPT_NAME', '').rstrip('/')))
-    cat(urllib.quote('/' + environ.get('PATH_INFO', '').lstrip('/')))
-    qs = environ.get('QUERY_STRING')
-    if qs:
-        cat('?' + qs)
-    return ''.join(tmp)
-
-
-def get_host(environ):
-    """Return the real host for the given WSGI environment.  This takes care
-    of the `X-Forwarded-Host` header.
-
-    :param environ: the WSGI environment to get the host of.
-    """
-    if 'HTTP_X_FORWARDED_HOST' in environ:
-        return environ['HTTP_X_FORWARDED_HOST']
-    elif 'HTTP_HOST' in environ:
-        return environ['HTTP_HOST']
-    result = environ['SERVER_NAME']
-    if (environ['wsgi.url_scheme'], environ['SERVER_PORT']) not \
-       in (('https', '443'), ('http', '80')):
-        result += ':' + environ['SERVER_PORT']
-    return result
-
-
 def _force_list(value):
     """If the value is not a list, make it one."""
     if value is None:
@@ -179,6 +154,67 @@ def set_fields(obj, data, *fields):
             setattr(obj, field, value)
 
 
+def set_fields_bulk(objects, rows, *fields, **options):
+    """Like `set_fields` for many objects at once.  The rows are the
+    validated data for the objects at the same positions, for example the
+    value of a `Multiple` of `Mapping` fields.  If no fields are given all
+    keys of a row are compared.
+
+    Only the changed attributes are set.  The return value is a list of
+    ``(key, changed_fields)`` tuples for the objects that changed, where
+    the key is the position of the object or the return value of the
+    `key` function if one is passed:
+
+    >>> class User(object):
+    ...     def __init__(self, id, name):
+    ...         self.id = id
+    ...         self.name = name
+    >>> users = [User(1, 'John'), User(2, 'Jane')]
+    >>> set_fields_bulk(users, [{'name': 'John'}, {'name': 'Mary'}],
+    ...                 key=lambda x: x.id)
+    [(2, {'name': 'Mary'})]
+    >>> users[1].name
+    'Mary'
+
+    Instead of objects, dicts with the initial data can be passed.  Those
+    are compared but not modified.  The same happens for objects if
+    `apply` is set to `False`.  The dicts must hold Python values unless
+    the field of the rows (like the `Mapping` in the `Multiple`) is passed
+    as `field`.  Then the rows are converted with its `to_primitive`
+    method and compared with dicts of primitive values, like the initial
+    data of a form.  The changed fields still hold the Python values.
+    """
+    key = options.pop('key', None)
+    apply = options.pop('apply', True)
+    row_field = options.pop('field', None)
+    if options:
+        raise TypeError('unexpected keyword argument %r' % options.keys()[0])
+    if len(objects) != len(rows):
+        raise ValueError('got %d objects but %d rows' % (len(objects),
+                                                         len(rows)))
+    result = []
+    for idx, (obj, row) in enumerate(izip(objects, rows)):
+        is_dict = isinstance(obj, dict)
+        compared = row
+        if is_dict and row_field is not None:
+            compared = row_field.to_primitive(row)
+        changed = {}
+        for field in fields or row:
+            value = compared[field]
+            if (obj.get(field) if is_dict else getattr(obj, field)) != value:
+                changed[field] = row[field]
+        if changed:
+            if apply and not is_dict:
+                for field, value in changed.iteritems():
+                    setattr(obj, field, value)
+            result.append((idx if key is None else key(obj), changed))
+    return result
+
+
+# keys with more parts are ignored by `decode_form_data`
+_max_key_depth = 100
+
+
 def _iter_key_grouped(iterable):
     """A helper that groups an ``(key, value)`` iterable by key and
     accumultates the values in a list.  Used to support webob like dicts in
@@ -218,6 +254,11 @@ def decode_form_data(data):
     >>> decode_form_data({'foo': ['23', '42']})
     {'foo': ['23', '42']}
 
+    If indices and names are mixed the level is a dict:
+
+    >>> decode_form_data({'foo.0': 'bar', 'foo.baz': '42'})
+    {'foo': {0: 'bar', 'baz': '42'}}
+
     _missing items in lists are ignored for convenience reasons:
 
     >>> decode_form_data({'foo.42': 'a', 'foo.82': 'b'})
@@ -243,6 +284,12 @@ def decode_form_data(data):
     >>> decode_form_data(MultiDict({"foo": ['1'], "foo.0": '2', "foo.1": '3'}))
     {'foo': ['1', '2', '3']}
 
+    Keys nested deeper than 100 levels are ignored.  No form nests its
+    fields that deep and the decoder would run out of stack:
+
+    >>> decode_form_data({'foo': 'bar', '.' * 1000: 'baz'})
+    {'foo': 'bar'}
+
     This function will never raise exceptions except for argument errors
     but the recovery behavior for invalid form data is undefined.
     """
@@ -268,7 +315,7 @@ def decode_form_data(data):
 
     def _enter_container(container, key):
         if key not in container:
-            return container.setdefault(key, {list_marker: False})
+            return container.setdefault(key, {list_marker: None})
         return container[key]
 
     def _convert(container):
@@ -277,8 +324,9 @@ def decode_form_data(data):
             values = container.pop(value_marker)
             if container.pop(list_marker):
                 force_list = True
-                values.extend(_convert(x[1]) for x in
-                              sorted(container.items()))
+                # the lists of the submitted data are not modified
+                values = values + [_convert(x[1]) for x in
+                                   sorted(container.items())]
             if not force_list and len(values) == 1:
                 values = values[0]
             return values
@@ -286,16 +334,20 @@ def decode_form_data(data):
             return [_convert(x[1]) for x in sorted(container.items())]
         return dict((k, _convert(v)) for k, v in container.iteritems())
 
-    result = {list_marker: False}
+    result = {list_marker: None}
     for key, values in listiter:
         parts = _split_key(key)
-        if not parts:
+        if not parts or len(parts) > _max_key_depth:
             continue
         container = result
         for part in parts:
             last_container = container
             container = _enter_container(container, part)
-            last_container[list_marker] = isinstance(part, (int, long))
+            # a level is a list if all its keys are indices
+            if not isinstance(part, (int, long)):
+                last_container[list_marker] = False
+            elif last_container[list_marker] is None:
+                last_container[list_marker] = True
         container[value_marker] = values
 
     return _convert(result)
@@ -718,6 +770,197 @@ class OrderedDict(dict):
     __iter__ = iterkeys
 
 
+class LRUCache(object):
+    """A simple thread safe cache that holds at most `capacity` items and
+    drops the least recently used item if it gets full.  If `ttl` is set,
+    items are dropped when they are looked up after `ttl` seconds.
+
+    >>> cache = LRUCache(2)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a')
+    1
+    >>> cache['c'] = 3
+    >>> 'b' in cache, 'a' in cache, len(cache)
+    (False, True, 2)
+    """
+
+    def __init__(self, capacity, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._mapping = {}
+        # the items are kept in a circular doubly linked list of
+        # ``[prev, next, key, value, expires]`` lists, the most recently
+        # used item is the one right before the root.
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._mapping)
+
+    def __contains__(self, key):
+        return key in self._mapping
+
+    def get(self, key, default=None, now=None):
+        """Return the value for the key and mark it as recently used."""
+        self._lock.acquire()
+        try:
+            link = self._mapping.get(key)
+            if link is None:
+                return default
+            link_prev, link_next = link[0], link[1]
+            link_prev[1] = link_next
+            link_next[0] = link_prev
+            if link[4] is not None:
+                if now is None:
+                    now = time()
+                if link[4] <= now:
+                    del self._mapping[key]
+                    return default
+            root = self._root
+            last = root[0]
+            last[1] = root[0] = link
+            link[0] = last
+            link[1] = root
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value, now=None):
+        """Sets the value for the key and marks it as recently used."""
+        expires = None
+        if self.ttl is not None:
+            if now is None:
+                now = time()
+            expires = now + self.ttl
+        self._lock.acquire()
+        try:
+            mapping = self._mapping
+            root = self._root
+            link = mapping.pop(key, None)
+            if link is not None:
+                link[0][1] = link[1]
+                link[1][0] = link[0]
+            elif len(mapping) >= self.capacity:
+                oldest = root[1]
+                oldest[0][1] = oldest[1]
+                oldest[1][0] = oldest[0]
+                del mapping[oldest[2]]
+            last = root[0]
+            last[1] = root[0] = mapping[key] = [last, root, key, value,
+                                                expires]
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def clear(self):
+        """Removes all items."""
+        self._lock.acquire()
+        try:
+            self._mapping.clear()
+            self._root[:] = [self._root, self._root, None, None, None]
+        finally:
+            self._lock.release()
+
+    def __repr__(self):
+        return '<%s %d/%d>' % (self.__class__.__name__, len(self),
+                               self.capacity)
+
+
+class PoolTimeout(Exception):
+    """Raised by `PoolResult.result` if the timeout passed."""
+
+
+class PoolResult(object):
+    """The result of a function submitted to a `ThreadPool`.  Works like
+    a future: `result` waits for the function and returns its return value
+    or reraises its exception.
+    """
+
+    def __init__(self):
+        self._done = Event()
+        self._value = None
+        self._exc_info = None
+
+    def done(self):
+        return self._done.isSet()
+
+    def result(self, timeout=None):
+        """Waits at most `timeout` seconds (forever if `None`) and raises
+        a `PoolTimeout` if the function is not done by then.
+        """
+        if not self._done.wait(timeout):
+            raise PoolTimeout()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+
+class ThreadPool(object):
+    """A minimal thread pool with the `submit` method of a
+    `concurrent.futures` executor.  At most `workers` daemon threads are
+    started, the first time they are needed.  Functions submitted from
+    a worker thread of the pool are called right away in that thread, so
+    that nested calls can't wait for a free worker forever.
+
+    >>> pool = ThreadPool(2)
+    >>> pool.submit(pow, 2, 10).result()
+    1024
+    """
+
+    def __init__(self, workers=8):
+        self.workers = workers
+        self._queue = Queue()
+        self._threads = []
+        self._lock = Lock()
+        self._local = local()
+
+    def submit(self, func, *args, **kwargs):
+        """Calls the function in a worker thread and returns a
+        `PoolResult`.
+        """
+        rv = PoolResult()
+        if getattr(self._local, 'worker', False):
+            self._call(rv, func, args, kwargs)
+            return rv
+        self._queue.put((rv, func, args, kwargs))
+        if len(self._threads) < self.workers:
+            self._lock.acquire()
+            try:
+                if len(self._threads) < self.workers:
+                    thread = Thread(target=self._work)
+                    thread.setDaemon(True)
+                    thread.start()
+                    self._threads.append(thread)
+            finally:
+                self._lock.release()
+        return rv
+
+    def _call(self, rv, func, args, kwargs):
+        try:
+            rv._value = func(*args, **kwargs)
+        except:
+            rv._exc_info = sys.exc_info()
+        rv._done.set()
+
+    @property
+    def threads(self):
+        """The number of worker threads that were started."""
+        return len(self._threads)
+
+    def _work(self):
+        self._local.worker = True
+        while 1:
+            self._call(*self._queue.get())
+
+    def __repr__(self):
+        return '<%s %d/%d>' % (self.__class__.__name__, self.threads,
+                               self.workers)
+
+
 # Date and Time
 
 try:
@@ -754,12 +997,17 @@ else:
             datetime = datetime.replace(tzinfo=UTC)
         return tzinfo.normalize(datetime.astimezone(tzinfo))
 
+    _timezones = {}
+
     def get_timezone(tzinfo=None):
         """Return the timezone for the given identifier."""
         if tzinfo is None:
             return UTC
         if isinstance(tzinfo, basestring):
-            return timezone(tzinfo)
+            rv = _timezones.get(tzinfo)
+            if rv is None:
+                rv = _timezones[tzinfo] = timezone(tzinfo)
+            return rv
         # Return the object itself: it's probably a tzinfo object
         return tzinfo
 
@@ -789,6 +1037,109 @@ def format_system_date(date=None):
     return u'%d-%02d-%02d' % (date.year, date.month, date.day)
 
 
+# The date parsers classify the input by its shape (the string with all
+# digits replaced by zeros) and only try the formats that can match that
+# shape.  Formats with directives other than the numeric ones and ``%p``
+# are always tried.
+_digit_re = re.compile(r'\d')
+_shape_re = re.compile(r'[\d\s]+')
+_directive_digits = {'d': (1, 2), 'm': (1, 2), 'y': (2, 2), 'Y': (4, 4),
+                     'H': (1, 2), 'I': (1, 2), 'M': (1, 2), 'S': (1, 2)}
+
+
+def _get_input_shape(shape):
+    """Returns the number of digits and the sorted lowercase characters
+    other than digits and whitespace of a shape.
+    """
+    return (shape.count('0'),
+            ''.join(sorted(_shape_re.sub('', shape.lower()))))
+
+
+def _get_format_shape(format):
+    """Returns ``(min_digits, max_digits, literals, has_ampm)`` for a
+    `strptime` format or `None` if the format can't be classified.
+    """
+    min_digits = max_digits = 0
+    literals = []
+    has_ampm = False
+    chars = iter(format)
+    for char in chars:
+        if char == '%':
+            directive = next(chars, None)
+            if directive == '%':
+                literals.append('%')
+            elif directive == 'p':
+                has_ampm = True
+            elif directive in _directive_digits:
+                low, high = _directive_digits[directive]
+                min_digits += low
+                max_digits += high
+            else:
+                return None
+        elif char in '0123456789':
+            min_digits += 1
+            max_digits += 1
+        elif char not in ' \t\n\r\f\v':
+            literals.append(char.lower())
+    return min_digits, max_digits, ''.join(sorted(literals)), has_ampm
+
+
+def _shape_matches(format_shape, input_shape):
+    """Checks if a string of the input shape could be parsed with a format
+    of the given shape.  The AM/PM markers depend on the locale so formats
+    with ``%p`` only require their literals to be in the string.
+    """
+    if format_shape is None:
+        return True
+    min_digits, max_digits, literals, has_ampm = format_shape
+    digits, chars = input_shape
+    if not min_digits <= digits <= max_digits:
+        return False
+    if not has_ampm:
+        return chars == literals
+    for char in set(literals):
+        if chars.count(char) < literals.count(char):
+            return False
+    return True
+
+
+class _DateParser(object):
+    """Parses strings with a list of ``(format, extra)`` tuples in order.
+    The formats to try are cached by the shape of the input, the results
+    are cached by the input.
+    """
+
+    def __init__(self, formats):
+        self.formats = [(format, extra, _get_format_shape(format))
+                        for format, extra in formats]
+        self.results = LRUCache(1024)
+        self._candidates = LRUCache(256)
+
+    def get_candidates(self, string):
+        """Returns the ``(format, extra)`` tuples that could match."""
+        shape = _digit_re.sub('0', string)
+        rv = self._candidates.get(shape)
+        if rv is None:
+            input_shape = _get_input_shape(shape)
+            rv = [(format, extra) for format, extra, format_shape
+                  in self.formats if _shape_matches(format_shape, input_shape)]
+            self._candidates[shape] = rv
+        return rv
+
+
+_date_parsers = LRUCache(64)
+
+
+def _get_date_parser(key, get_formats):
+    """Returns the parser for the formats, fields with the same formats
+    share a parser.
+    """
+    rv = _date_parsers.get(key)
+    if rv is None:
+        rv = _date_parsers[key] = _DateParser(get_formats())
+    return rv
+
+
 def parse_datetime(string, tzinfo=None, date_formats=None, time_formats=None):
     """Parses a string into a datetime object.  Per default a conversion
     from the local timezone to UTC is performed but returned as naive
@@ -810,41 +1161,55 @@ def parse_datetime(string, tzinfo=None, date_formats=None, time_formats=None):
             rv = to_utc(rv, tzinfo)
         return rv.replace(microsecond=0)
 
-    # first of all try the following format because this is the format
-    # Texpress will output by default for any date time string in the
-    # administration panel.
-    try:
-        return convert(u'%Y-%m-%d %H:%M')
-    except ValueError:
-        pass
-
     if not time_formats:
         time_formats = TIME_FORMATS
-    # no go with time only, and current day
-    for fmt in time_formats:
-        try:
-            val = convert(fmt)
-        except ValueError:
-            continue
-        return to_utc(datetime.utcnow().replace(hour=val.hour,
-                      minute=val.minute, second=val.second, microsecond=0),
-                      tzinfo=tzinfo)
-
-    # now try various types of date + time strings
-    def combined():
+    if not date_formats:
+        date_formats = DATE_FORMATS
+    time_formats = tuple(time_formats)
+    date_formats = tuple(date_formats)
+
+    def get_formats():
+        # first of all try the following format because this is the format
+        # Texpress will output by default for any date time string in the
+        # administration panel.
+        yield u'%Y-%m-%d %H:%M', False
+        # no go with time only, and current day
+        for fmt in time_formats:
+            yield fmt, True
+        # now try various types of date + time strings
         for t_fmt in time_formats:
             for d_fmt in date_formats:
-                yield t_fmt + ' ' + d_fmt
-                yield d_fmt + ' ' + t_fmt
+                yield t_fmt + ' ' + d_fmt, False
+                yield d_fmt + ' ' + t_fmt, False
 
-    if not date_formats:
-        date_formats = DATE_FORMATS
-    for fmt in combined():
+    parser = _get_date_parser(('datetime', date_formats, time_formats),
+                              get_formats)
+    cache_key = (string, tzinfo)
+    try:
+        rv = parser.results.get(cache_key)
+    except TypeError:
+        rv = cache_key = None
+    if rv is not None:
+        if rv is _missing:
+            raise ValueError('invalid date format')
+        return rv
+
+    for fmt, time_only in parser.get_candidates(string):
         try:
-            return convert(fmt)
+            val = convert(fmt)
         except ValueError:
-            pass
-
+            continue
+        # times are for the current day so they are not cached
+        if time_only:
+            return to_utc(datetime.utcnow().replace(hour=val.hour,
+                          minute=val.minute, second=val.second,
+                          microsecond=0), tzinfo=tzinfo)
+        if cache_key is not None:
+            parser.results[cache_key] = val
+        return val
+
+    if cache_key is not None:
+        parser.results[cache_key] = _missing
     raise ValueError('invalid date format')
 
 
@@ -854,21 +1219,149 @@ def parse_date(string, date_formats=None):
     if string is None or string.lower() in ('today',):
         return date.today()
 
-    def convert(format):
-        """Helper that parses the string."""
-        return date(*strptime(string, format)[:3])
+    date_formats = tuple(date_formats or DATE_FORMATS)
+
+    def get_formats():
+        # first of all try the ISO 8601 format, then the others.
+        return [(fmt, None) for fmt in (u'%Y-%m-%d',) + date_formats]
+
+    parser = _get_date_parser(('date', date_formats), get_formats)
+    rv = parser.results.get(string)
+    if rv is not None:
+        if rv is _missing:
+            raise ValueError('invalid date format')
+        return rv
+
+    for fmt, _ in parser.get_candidates(string):
+        try:
+            rv = date(*strptime(string, fmt)[:3])
+        except ValueError:
+            continue
+        parser.results[string] = rv
+        return rv
+
+    parser.results[string] = _missing
+    raise ValueError('invalid date format')
+
+
+# Columns
+#
+# Helpers for fields that convert a whole column of values at once.  If
+# NumPy is available it's used for the range checks and for parsing ISO
+# dates, otherwise the same is done in pure Python.
+
+# columns smaller than this are not worth creating arrays for
+NUMPY_COLUMN_THRESHOLD = 64
+_int64_bounds = (-2 ** 63, 2 ** 63 - 1)
+_iso_date_re = re.compile(r'(\d{4})-(\d\d)-(\d\d)\Z')
+_iso_datetime_re = re.compile(r'(\d{4})-(\d\d)-(\d\d)\s+(\d\d):(\d\d)\Z')
 
-    # first of all try the ISO 8601 format.
+
+def _convert_numbers(strings, number_type):
+    """Converts a list of strings with `number_type` (`int` or `float`).
+    Returns the numbers and a set of the indices of the strings that are
+    not numbers.  The number for those is `None`.
+    """
     try:
-        return convert(u'%Y-%m-%d')
+        return map(number_type, strings), set()
     except ValueError:
         pass
+    numbers = []
+    invalid = set()
+    for idx, string in enumerate(strings):
+        try:
+            numbers.append(number_type(string))
+        except ValueError:
+            numbers.append(None)
+            invalid.add(idx)
+    return numbers, invalid
 
-    # now try various types of date
-    for fmt in date_formats or DATE_FORMATS:
+
+def _numpy_bound_ok(kind, bound):
+    """Checks if comparing an array of the given kind with the bound
+    gives the same result as comparing the Python numbers.
+    """
+    if bound is None:
+        return True
+    if isinstance(bound, bool) or not isinstance(bound, (int, long, float)):
+        return False
+    if kind == 'i':
+        return isinstance(bound, (int, long)) and \
+               _int64_bounds[0] <= bound <= _int64_bounds[1]
+    return isinstance(bound, float) or abs(bound) <= 2 ** 53
+
+
+def _find_out_of_range(numbers, min_value=None, max_value=None, skip=()):
+    """Returns the indices of the numbers that are smaller than `min_value`
+    and of the ones that are bigger than `max_value`.  The numbers must be
+    all of the same type, indices in `skip` are ignored.  NaN is never out
+    of range because it compares false with every bound, just like in
+    `FloatField.convert`.
+    """
+    if min_value is None and max_value is None:
+        return [], []
+    if numpy is not None and len(numbers) >= NUMPY_COLUMN_THRESHOLD:
+        if skip:
+            placeholder = min_value if min_value is not None else max_value
+            numbers = [placeholder if idx in skip else number
+                       for idx, number in enumerate(numbers)]
+        array = numpy.array(numbers)
+        if array.dtype.kind in 'if' and \
+           _numpy_bound_ok(array.dtype.kind, min_value) and \
+           _numpy_bound_ok(array.dtype.kind, max_value):
+            too_small = too_big = []
+            # comparing NaN warns about an invalid value
+            old_state = numpy.seterr(invalid='ignore')
+            try:
+                if min_value is not None:
+                    too_small = numpy.flatnonzero(array < min_value).tolist()
+                if max_value is not None:
+                    too_big = numpy.flatnonzero(array > max_value).tolist()
+            finally:
+                numpy.seterr(**old_state)
+            if skip:
+                too_small = [idx for idx in too_small if idx not in skip]
+                too_big = [idx for idx in too_big if idx not in skip]
+            return too_small, too_big
+    too_small = []
+    too_big = []
+    for idx, number in enumerate(numbers):
+        if idx in skip:
+            continue
+        if min_value is not None and number < min_value:
+            too_small.append(idx)
+        if max_value is not None and number > max_value:
+            too_big.append(idx)
+    return too_small, too_big
+
+
+def _parse_iso_column(strings, with_time=False):
+    """Parses a list of strings in the ISO format ``YYYY-MM-DD`` (or
+    ``YYYY-MM-DD HH:MM`` if `with_time` is true).  Returns a list of date
+    or naive datetime objects with `None` for strings in other formats or
+    with invalid values.  Those strings have to be parsed the regular way.
+    """
+    regex = with_time and _iso_datetime_re or _iso_date_re
+    matches = map(regex.match, strings)
+    # NumPy can't represent the year zero as date, strptime doesn't fail
+    # for it but the date constructor does.
+    if numpy is not None and not with_time and \
+       len(strings) >= NUMPY_COLUMN_THRESHOLD and \
+       all(match and match.group(1) != '0000' for match in matches):
         try:
-            return convert(fmt)
+            return numpy.array(strings, dtype='datetime64[D]').tolist()
         except ValueError:
             pass
-
-    raise ValueError('invalid date format')
+    result = []
+    for match in matches:
+        value = None
+        if match is not None:
+            try:
+                if with_time:
+                    value = datetime(*map(int, match.groups()))
+                else:
+                    value = date(*map(int, match.groups()))
+            except ValueError:
+                pass
+        result.append(value)
+    return result
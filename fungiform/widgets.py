@@ -9,6 +9,7 @@
     :license: BSD, see LICENSE for more details.
 """
 from itertools import chain
+from time import time
 
 from fungiform.utils import make_name, _force_dict, _make_widget,\
                             _value_matches_choice, _force_list,\
@@ -45,9 +46,42 @@ def _is_choice_selected(field, value, choice):
     return _value_matches_choice(value, choice)
 
 
+def _profiled(render):
+    """Wraps a render method so that it's recorded by the profiler of the
+    form.  Render methods of subclasses that call the one of their parent
+    class are recorded once.
+    """
+    def render_profiled(self, *args, **kwargs):
+        form = getattr(self, '_form', None)
+        profiler = form is not None and form.profiler or None
+        if profiler is None or profiler.is_running(self):
+            return render(self, *args, **kwargs)
+        depth = profiler.enter('widget', self.__class__.__name__, self)
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            profiler.leave(depth)
+    render_profiled.__name__ = render.__name__
+    render_profiled.__doc__ = render.__doc__
+    return render_profiled
+
+
+class WidgetMeta(type):
+    """Meta class for widgets.  Wraps the render methods for the profiler
+    of the form.
+    """
+
+    def __new__(cls, name, bases, d):
+        if 'render' in d:
+            d['render'] = _profiled(d['render'])
+        return type.__new__(cls, name, bases, d)
+
+
 class _Renderable(object):
     """Mixin for renderable HTML objects."""
 
+    __slots__ = ()
+
     def render(self):
         return u''
 
@@ -142,6 +176,13 @@ class Widget(_Renderable):
         like `errors` but also contains the errors of child widgets.
     """
 
+    __metaclass__ = WidgetMeta
+    # the slots of all builtin widgets.  Python can't combine two bases
+    # that both add slots, so the subclasses don't add their own.
+    __slots__ = ('_form', '_field', '_value', '_all_errors', 'name',
+                 '_parent', '_label_text', '_subwidgets', '_choice_labels',
+                 '_captcha')
+
     disable_dt = False
 
     def __init__(self, field, name, value, all_errors):
@@ -262,6 +303,8 @@ class Widget(_Renderable):
 class Label(_Renderable):
     """Holds a label."""
 
+    __slots__ = ('_field', 'text', 'linked_to')
+
     def __init__(self, field, text, linked_to=None):
         self._field = field
         self.text = text
@@ -278,6 +321,8 @@ class InternalWidget(Widget):
     form fields but belong to others.
     """
 
+    __slots__ = ()
+
     def __init__(self, parent):
         self._parent = parent
 
@@ -287,6 +332,7 @@ class InternalWidget(Widget):
 
 class Input(Widget):
     """A widget that is a HTML input field."""
+    __slots__ = ()
     hide_value = False
     type = None
 
@@ -302,23 +348,28 @@ class Input(Widget):
 
 class TextInput(Input):
     """A widget that holds text."""
+    __slots__ = ()
     type = 'text'
 
 
 class PasswordInput(TextInput):
     """A widget that holds a password."""
+    __slots__ = ()
     type = 'password'
     hide_value = True
 
 
 class HiddenInput(Input):
     """A hidden input field for text."""
+    __slots__ = ()
     type = 'hidden'
 
 
 class Textarea(Widget):
     """Displays a textarea."""
 
+    __slots__ = ()
+
     @property
     def default_display_errors(self):
         """A textarea is often used with multiple, it makes sense to
@@ -341,6 +392,8 @@ class Textarea(Widget):
 class Checkbox(Widget):
     """A simple checkbox."""
 
+    __slots__ = ()
+
     @property
     def checked(self):
         return self.value != u'False'
@@ -385,6 +438,8 @@ class Checkbox(Widget):
 class SelectBox(Widget):
     """A select box."""
 
+    __slots__ = ()
+
     def _attr_setdefault(self, attrs):
         Widget._attr_setdefault(self, attrs)
         attrs.setdefault('multiple', self._field.multiple_choices)
@@ -407,14 +462,21 @@ class SelectBox(Widget):
 class _InputGroupMember(InternalWidget):
     """A widget that is a single radio button."""
 
-    # override the label descriptor
-    label = None
+    __slots__ = ()
+
     inline_label = True
 
     def __init__(self, parent, value, label):
         InternalWidget.__init__(self, parent)
-        self.value = unicode(value)
-        self.label = Label(self._parent._field, label, self.id)
+        self._value = unicode(value)
+        self._label_text = label
+
+    value = property(lambda x: x._value)
+
+    @property
+    def label(self):
+        """The label for the group member."""
+        return Label(self._parent._field, self._label_text, self.id)
 
     @property
     def name(self):
@@ -438,32 +500,61 @@ class _InputGroupMember(InternalWidget):
 
 class RadioButton(_InputGroupMember):
     """A radio button in an input group."""
+    __slots__ = ()
     type = 'radio'
 
 
 class GroupCheckbox(_InputGroupMember):
     """A checkbox in an input group."""
+    __slots__ = ()
     type = 'checkbox'
 
 
 class _InputGroup(Widget):
+    """Baseclass for radio button and checkbox groups.  The subwidgets for
+    the choices are created on first access and cached afterwards, so a
+    template that only renders some members of a big group does not pay for
+    the others.
+    """
+
+    __slots__ = ()
 
     def __init__(self, field, name, value, all_errors):
         Widget.__init__(self, field, name, value, all_errors)
-        self.choices = []
         self._subwidgets = {}
-        for value, label in _iter_choices(self._field.choices):
-            widget = self.subwidget(self, value, label)
-            self.choices.append(widget)
-            self._subwidgets[value] = widget
+        self._choice_labels = None
+
+    def _get_subwidget(self, value, label):
+        subwidget = self._subwidgets.get(value)
+        if subwidget is None:
+            subwidget = self.subwidget(self, value, label)
+            self._subwidgets[value] = subwidget
+        return subwidget
 
     def __getitem__(self, value):
         """Return a subwidget."""
-        return self._subwidgets[value]
+        subwidget = self._subwidgets.get(value)
+        if subwidget is None:
+            if self._choice_labels is None:
+                self._choice_labels = dict(_iter_choices(self._field.choices))
+            # this could raise a KeyError we pass through
+            subwidget = self._get_subwidget(value, self._choice_labels[value])
+        return subwidget
+
+    def __iter__(self):
+        for value, label in _iter_choices(self._field.choices):
+            yield self._get_subwidget(value, label)
+
+    @property
+    def choices(self):
+        """A list of all subwidgets.  Iterating over the widget itself
+        yields the same subwidgets but creates them one after another.
+        """
+        return list(self)
 
     def _as_list(self, list_type, attrs):
         _ = self._field.form._get_translations().ugettext
-        if attrs.pop('hide_empty', False) and not self.choices:
+        if attrs.pop('hide_empty', False) and not self._field.choices:
             return u''
         self._attr_setdefault(attrs)
         empty_msg = attrs.pop('empty_msg', None)
@@ -475,7 +566,7 @@ class _InputGroup(Widget):
         choices = [Markup(u'<li>%s %s</li>') % (
             choice(),
             label and choice.label() or u''
-        ) for choice in self.choices]
+        ) for choice in self]
         if not choices:
             if empty_msg is None:
                 empty_msg = _('No choices.')
@@ -494,11 +585,11 @@ class _InputGroup(Widget):
 
     def as_table(self, **attrs):
         """Render the radio buttons widget as <table>"""
+        html = self._field.form.html_builder
         self._attr_setdefault(attrs)
-        return Markup(list_type(*[u'<tr><td>%s</td><td>%s</td></tr>' % (
-            choice,
-            choice.label
-        ) for choice in self.choices], **attrs))
+        return Markup(html.table(*[Markup(u'<tr><td>%s</td><td>%s</td></tr>')
+                                   % (choice(), choice.label())
+                                   for choice in self], **attrs))
 
     def render(self, **attrs):
         return self.as_ul(**attrs)
@@ -506,17 +597,21 @@ class _InputGroup(Widget):
 
 class RadioButtonGroup(_InputGroup):
     """A group of radio buttons."""
+    __slots__ = ()
     subwidget = RadioButton
 
 
 class CheckboxGroup(_InputGroup):
     """A group of checkboxes."""
+    __slots__ = ()
     subwidget = GroupCheckbox
 
 
 class MappingWidget(Widget):
     """Special widget for dict-like fields."""
 
+    __slots__ = ()
+
     def __init__(self, field, name, value, all_errors):
         Widget.__init__(self, field, name, _force_dict(value), all_errors)
         self._subwidgets = {}
@@ -548,6 +643,8 @@ class MappingWidget(Widget):
 class FormWidget(MappingWidget):
     """A widget for forms."""
 
+    __slots__ = ()
+
     def get_hidden_fields(self):
         """This method is called by the `hidden_fields` property to return
         a list of (key, value) pairs for the special hidden fields.
@@ -601,6 +698,7 @@ class FormWidget(MappingWidget):
         return html.div(html.input(type='submit', value=label), **attrs)
 
     def render(self, method=None, **attrs):
+        start = time()
         html = self._field.form.html_builder
         self._attr_setdefault(attrs)
         with_errors = attrs.pop('with_errors', False)
@@ -624,8 +722,10 @@ class FormWidget(MappingWidget):
 
         if with_errors:
             body = self.default_display_errors() + body
-        return html.form(body, action=self._field.form.action,
-                         method=method, **attrs)
+        rv = html.form(body, action=self._field.form.action,
+                       method=method, **attrs)
+        self._field.form.on_render(time() - start)
+        return rv
 
     def __call__(self, *args, **attrs):
         attrs.setdefault('with_errors', True)
@@ -635,6 +735,8 @@ class FormWidget(MappingWidget):
 class ListWidget(Widget):
     """Special widget for list-like fields."""
 
+    __slots__ = ()
+
     def __init__(self, field, name, value, all_errors):
         Widget.__init__(self, field, name, _force_list(value), all_errors)
         self._subwidgets = {}
@@ -696,6 +798,8 @@ class ListWidget(Widget):
 class ErrorList(_Renderable, list):
     """The class that is used to display the errors."""
 
+    __slots__ = ('_form',)
+
     def __init__(self, form, *args):
         self._form = form
         super(ErrorList, self).__init__(*args)